@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from datetime import datetime, timezone
 import hashlib
 from pathlib import Path, PureWindowsPath
@@ -7,9 +7,13 @@ from semantic_bridge import infer_intent
 from ethical_resonator import adjust_reflection
 from quantum_tunneling import quantum_tunnel
 from multi_modal_engine import coherence_bridge
+from keyword_matcher import register_keywords, scan_keywords
 from dotenv import load_dotenv
 import os
-import requests  # 改为导入 requests
+from gpt_bridge import BRIDGE, BridgeError
+from oracle_logging import get_logger
+
+log = get_logger("app")
 
 # === Load environment variables ===
 load_dotenv()
@@ -23,73 +27,36 @@ SUPABASE_MSG_TABLE = os.getenv("SUPABASE_MSG_TABLE", "messages")
 def gpt_bridge_layer(question: str) -> str:
     """
     Emotional temperature bridge: direct OpenAI API call to avoid SDK issues.
+    Served by the pooled bridge client (response cache for short prompts,
+    coalescing of identical in-flight prompts, circuit breaker).
     Environment variables:
       - OPENAI_API_KEY required
       - OPENAI_MODEL optional, default gpt-4o-mini
       - OPENAI_PROXY_URL optional, e.g., http://127.0.0.1:7890
     """
-    api_key = os.getenv("OPENAI_API_KEY", "").strip()
-    if not api_key:
-        return "[Bridge Layer Error: missing OPENAI_API_KEY]"
-
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini").strip()
-    url = "https://api.openai.com/v1/chat/completions"
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-
-    # Light empathy + no illegal/harmful advice
-    system_prompt = (
-        "You are a kind, grounded assistant. Speak briefly, warm and clear. "
-        "Acknowledge feelings first, then give 1-2 concrete, safe suggestions. "
-        "Never provide illegal, medical, or financial instructions."
-    )
-
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": question}
-        ],
-        "temperature": 0.7,
-        "max_tokens": 220,
-        "n": 1
-    }
-
-    proxies = None
-    proxy_url = os.getenv("OPENAI_PROXY_URL", "").strip()
-    if proxy_url:
-        proxies = {"http": proxy_url, "https": proxy_url}
-
-    try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=20, proxies=proxies)
-        if resp.status_code != 200:
-            return f"[Bridge Layer Error: HTTP {resp.status_code} {resp.text[:180]}]"
-        data = resp.json()
-        return data["choices"][0]["message"]["content"].strip()
-    except Exception as e:
-        return f"[Bridge Layer Error: {e}]"
+    with stage_timer("gpt_bridge_layer"):
+        return BRIDGE.ask(question)
 
 # === Smart Temperature Bridge: Distinguish daily chat vs academic questions ===
+register_keywords("bridge.academic", [
+    "philosophy","ethics","logic","reasoning","theory","analysis","research",
+    "study","academic","scholar","thesis","hypothesis","proof","premise","paradox","axiom","consistency","soundness","validity",
+    "哲学","伦理","逻辑","推理","理论","分析","研究","学术","论证","悖论","公理"
+])
+register_keywords("bridge.daily", [
+    "hello","hi","hey","how are you","what's up","thank you","help","advice",
+    "sad","down","lonely","anxious","angry","tired","burned out","stressed",
+    "你好","嗨","谢谢","早上好","难过","沮丧","焦虑","生气","累","怎么办","建议"
+])
+register_keywords("bridge.knowledge_pattern", ["+", "=", "define", "who is", "what is", "为什么", "是谁"])
+
 def should_use_bridge_layer(question):
     """Determine whether to use temperature bridge processing"""
     q = question.lower().strip()
+    hits = scan_keywords(q)
 
-    academic_kw = [
-        "philosophy","ethics","logic","reasoning","theory","analysis","research",
-        "study","academic","scholar","thesis","hypothesis","proof","premise","paradox","axiom","consistency","soundness","validity",
-        "哲学","伦理","逻辑","推理","理论","分析","研究","学术","论证","悖论","公理"
-    ]
-    daily_kw = [
-        "hello","hi","hey","how are you","what's up","thank you","help","advice",
-        "sad","down","lonely","anxious","angry","tired","burned out","stressed",
-        "你好","嗨","谢谢","早上好","难过","沮丧","焦虑","生气","累","怎么办","建议"
-    ]
-
-    is_academic = any(k in q for k in academic_kw)
-    is_daily = any(k in q for k in daily_kw)
+    is_academic = hits.has("bridge.academic")
+    is_daily = hits.has("bridge.daily")
     is_very_short = len(q.split()) <= 3
 
     if is_academic:
@@ -97,21 +64,21 @@ def should_use_bridge_layer(question):
     if is_daily:
         return True
     # Only allow very short sentences without math/knowledge patterns
-    if is_very_short and not any(c in q for c in ["+", "=", "define", "who is", "what is", "为什么", "是谁"]):
+    if is_very_short and not hits.has("bridge.knowledge_pattern"):
         return True
     return False
 
 # ---- UTF-8 Encoding Fix ----
 import sys
-import io
 import time
 import json
+import random
 import os
 
-# Force UTF-8 standard input/output streams
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-sys.stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+# Force UTF-8 standard input/output streams (in place, keeping the original buffering)
+for _stream in (sys.stdout, sys.stdin, sys.stderr):
+    if hasattr(_stream, "reconfigure"):
+        _stream.reconfigure(encoding="utf-8")
 
 # ---- Modern Version Compatibility Fix ----
 import types
@@ -158,9 +125,9 @@ def load_sensitivity_config():
     if os.path.exists(config_path):
         with open(config_path, "r", encoding="utf-8") as f:
             config = json.load(f)
-            print(f"🧠 Loaded sensitivity config → {config['mode']}")
+            log.info("🧠 Loaded sensitivity config → %s", config['mode'])
             return config
-    print("⚠️ No sensitivity_config.json found, using defaults.")
+    log.warning("⚠️ No sensitivity_config.json found, using defaults.")
     return {
         "mode": "default",
         "determinacy_threshold": 0.75,
@@ -169,50 +136,89 @@ def load_sensitivity_config():
     }
 
 SENSITIVITY_CONFIG = load_sensitivity_config()
+SENSITIVITY_VERSION = hashlib.sha256(
+    json.dumps(SENSITIVITY_CONFIG, sort_keys=True, ensure_ascii=False).encode("utf-8")
+).hexdigest()[:12]
 
 # ---- End Compatibility Fix ----
 
 # Import modules - Force cloud version with detailed debugging
 try:
-    from audit_storage import save_record, get_audit_records, get_audit_record_by_hash, get_latest_hash, save_message, get_messages, like_message, save_philosophical_belief, detect_philosophical_contradiction, get_philosophical_beliefs
-    print("✅ Using Supabase audit storage")
-    print(f"🔧 Debug - save_record: {save_record}")
-    print(f"🔧 Debug - get_audit_records: {get_audit_records}")
+    from audit_storage import save_record, get_audit_records, get_audit_record_by_hash, get_audit_records_by_hashes, query_audit_records, get_latest_hash, sync_chain_head, commit_audit_record, get_receipt_status, save_message, get_messages, get_messages_page, like_message, save_philosophical_belief, detect_philosophical_contradiction, get_philosophical_beliefs, warm_stance_index
+    from audit_stats import get_audit_stats
+    from chain_verifier import CHAIN_VERIFIER, AUDIT_PUBLIC_KEY, check_record_hash, start_self_audit
+    log.info("✅ Using Supabase audit storage")
 except ImportError as e:
-    print(f"❌ audit_storage import failed: {e}")
+    log.error("❌ audit_storage import failed: %s", e)
     # Create placeholder functions
     def save_record(*args, **kwargs):
-        print("❌ Using placeholder save function")
+        log.error("❌ Using placeholder save function")
         return False
     def get_audit_records(limit=10):
         return {"count": 0, "records": []}
     def get_audit_record_by_hash(h):
         return None
+    def get_audit_records_by_hashes(hashes):
+        return {}
+    def query_audit_records(limit=10, cursor=None, **filters):
+        return [], None
     def get_latest_hash():
         return ""
+    def sync_chain_head():
+        return False
+    def commit_audit_record(fields, hash_payload, wait=0, attempts=1):
+        return {"status": "failed", "hash": None, "prev_hash": None, "receipt": None}
+    def get_receipt_status(receipt):
+        return None
     def save_message(content, author="Anonymous"):
-        print("❌ Using placeholder save_message function")
+        log.error("❌ Using placeholder save_message function")
         return False
     def get_messages(limit=50):
         return []
+    def get_messages_page(limit=50):
+        return [], None
     def like_message(message_id):
         return 0
     def save_philosophical_belief(question, answer, tags=None):
-        print("❌ Using placeholder save_philosophical_belief function")
+        log.error("❌ Using placeholder save_philosophical_belief function")
         return False
     def detect_philosophical_contradiction(question, answer):
         return []
     def get_philosophical_beliefs(limit=50):
         return []
-    print("⚠️ Using placeholder storage functions")
+    def warm_stance_index():
+        return None
+    def get_audit_stats():
+        return None
+    CHAIN_VERIFIER = None
+    AUDIT_PUBLIC_KEY = None
+    def check_record_hash(row):
+        return None
+    def start_self_audit():
+        return None
+    log.warning("⚠️ Using placeholder storage functions")
 
-from logic_core import score_question, craft_answer
+from logic_core import score_question, craft_answer, random_determinacy
 from bilingual_bridge import auto_translate
-from risk_rules import emergency_ethics_shortcut
+from risk_rules import emergency_ethics_shortcut, policy_check
+from pipeline import submit_stage, run_background, collect, CONSISTENCY_WAIT
+from result_cache import cached_stage, STAGE_CACHE
+from rule_engine import RULES
+from merkle import verify_inclusion
+from metrics import stage_timer, REQUEST_SECONDS, BRIDGE_FALLBACKS, REGISTRY, CONTENT_TYPE, render_metrics, uptime_seconds
 
 app = Flask(__name__)
 app.config['JSON_AS_ASCII'] = False  # Allow Chinese output
 
+# Seed the in-process chain head once; later requests never fetch it again
+run_background(sync_chain_head)
+run_background(warm_stance_index)
+
+# === M2.6 Self-audit: incremental chain verification every 12h (every worker
+# process starts the loop; a file lock lets only one of them verify at a time)
+if os.getenv("ENABLE_SELF_AUDIT") == "True":
+    start_self_audit()
+
 # CORS configuration
 CORS(app, origins=["https://oracle-philosophy-frontend-hnup.vercel.app", "http://localhost:3000"])
 
@@ -228,6 +234,10 @@ def _mk_hash(s: str) -> str:
 def get_previous_hash():
     return get_latest_hash() or ""
 
+def _stage_version() -> str:
+    """Cache version for pure stages: sensitivity config + rule sets"""
+    return f"{SENSITIVITY_VERSION}:{RULES.version}"
+
 @app.route("/reload_cn_questions", methods=["POST"])
 def reload_cn_questions():
     from pathlib import Path, PureWindowsPath
@@ -240,7 +250,7 @@ def reload_cn_questions():
     with open(path, "r", encoding="utf-8") as f:
         questions = json.load(f)
     
-    print(f"🧠 Loaded {len(questions)} questions")
+    log.info("🧠 Loaded %d questions", len(questions))
     return {"status": "ok", "loaded": len(questions)}, 200
 
 @app.route("/health", methods=["GET"])
@@ -249,18 +259,38 @@ def health():
 
 # ===== Frontend API Routes =====
 
+def _audit_query(default_limit):
+    """
+    Shared query string for audit list routes:
+    limit, cursor, kind, language, risk_tag, since, until, fields
+    """
+    args = request.args
+    return query_audit_records(
+        limit=int(args.get("limit", default_limit)),
+        cursor=args.get("cursor") or None,
+        kind=args.get("kind") or None,
+        language=args.get("language") or None,
+        risk_tag=args.get("risk_tag") or None,
+        since=args.get("since") or None,
+        until=args.get("until") or None,
+        fields=args.get("fields") or None,
+    )
+
 @app.route("/api/audit/chain", methods=["GET"])
 def audit_chain():
-    """Return audit chain data - 100% working"""
+    """Return audit chain data, newest first; pass next_cursor back as ?cursor= for the next page"""
     try:
-        records = get_audit_records(limit=100)
-        print(f"🔍 Audit chain query returned: {records}")
+        records, next_cursor = _audit_query(100)
+        log.debug("🔍 Audit chain query returned %d records", len(records))
         return jsonify({
-            "records": records.get("records", []) if isinstance(records, dict) else records,
-            "count": records.get("count", 0) if isinstance(records, dict) else len(records)
+            "records": records,
+            "count": len(records),
+            "next_cursor": next_cursor
         })
+    except ValueError as e:
+        return jsonify({"records": [], "count": 0, "error": str(e)}), 400
     except Exception as e:
-        print(f"❌ Audit chain query error: {e}")
+        log.error("❌ Audit chain query error: %s", e)
         return jsonify({
             "records": [],
             "count": 0,
@@ -277,13 +307,19 @@ def messages():
     """Message board interface"""
     if request.method == "GET":
         try:
-            messages_data = get_messages(limit=50)
-            return jsonify({
+            messages_data, etag = get_messages_page(limit=50)
+            response = jsonify({
                 "messages": messages_data,
                 "count": len(messages_data)
             })
+            if etag:
+                # Browsers revalidate every poll; an unchanged page comes back as 304
+                response.set_etag(etag)
+                response.headers["Cache-Control"] = "no-cache"
+                response = response.make_conditional(request)
+            return response
         except Exception as e:
-            print(f"❌ Messages fetch error: {e}")
+            log.error("❌ Messages fetch error: %s", e)
             return jsonify({"messages": [], "count": 0, "error": str(e)})
     else:
         try:
@@ -301,19 +337,32 @@ def messages():
                 return jsonify({"success": False, "error": "Failed to save message"}), 500
                 
         except Exception as e:
-            print(f"❌ Message post error: {e}")
+            log.error("❌ Message post error: %s", e)
             return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route("/api/verify/<hash_value>", methods=["GET"])
 def verify_hash(hash_value):
-    """Verify hash interface"""
+    """
+    Verify hash interface. hash_valid: the record hash recomputes from its
+    stored preimage (None without one); chain_valid: the record has a Merkle
+    inclusion proof against the latest signed root (None while not yet in it).
+    """
     try:
         record = get_audit_record_by_hash(hash_value)
         if record:
+            proof = CHAIN_VERIFIER.inclusion_proof(hash_value) if CHAIN_VERIFIER is not None else None
+            chain_valid = None
+            if proof:
+                chain_valid = verify_inclusion(hash_value, proof["leaf_index"], proof["tree_size"],
+                                               proof["audit_path"], proof["signed_root"]["root"])
+            elif CHAIN_VERIFIER is not None:
+                CHAIN_VERIFIER.catch_up()
             return jsonify({
                 "verified": True,
                 "record": record,
-                "chain_valid": True
+                "hash_valid": check_record_hash(record),
+                "chain_valid": chain_valid,
+                "proof": proof
             })
         else:
             return jsonify({
@@ -338,7 +387,7 @@ def like_message_route(message_id):
         likes_count = like_message(message_id)
         return jsonify({"likes": likes_count, "success": True})
     except Exception as e:
-        print(f"❌ Like message error: {e}")
+        log.error("❌ Like message error: %s", e)
         return jsonify({"likes": 0, "success": False, "error": str(e)})
 
 # ===== Verification API Routes =====
@@ -371,12 +420,14 @@ def api_verify_chain():
     """
     try:
         body = request.get_json(force=True) or []
+        # One bulk lookup for the whole chain instead of a round trip per link
+        records = get_audit_records_by_hashes([item.get("hash", "") for item in body])
         results = []
         all_ok = True
         for item in body:
             h = item.get("hash", "")
             ph = item.get("prev_hash", "")
-            rec = get_audit_record_by_hash(h)
+            rec = records.get(h)
             if not rec:
                 results.append({"hash": h, "ok": False, "reason": "not found"})
                 all_ok = False
@@ -395,6 +446,77 @@ def api_verify_chain():
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
+@app.route("/api/audit/integrity", methods=["GET"])
+def audit_integrity():
+    """Latest M2.6 self-audit report (linkage, recomputed hashes, Merkle root)"""
+    report = CHAIN_VERIFIER.last_report() if CHAIN_VERIFIER is not None else None
+    if not report:
+        return jsonify({"ok": None, "message": "No chain verification has run yet"}), 404
+    return jsonify(report), 200
+
+@app.route("/api/audit/proof/<hash_value>", methods=["GET"])
+def audit_inclusion_proof(hash_value):
+    """
+    Merkle inclusion proof for one record: leaf_index, tree_size, audit_path
+    and the signed root they hash up to (check with merkle.verify_inclusion)
+    """
+    if CHAIN_VERIFIER is None:
+        return jsonify({"ok": False, "error": "Audit storage unavailable"}), 503
+    try:
+        proof = CHAIN_VERIFIER.inclusion_proof(hash_value)
+    except Exception as e:
+        log.error("❌ Inclusion proof error: %s", e)
+        return jsonify({"ok": False, "error": str(e)}), 500
+    if not proof:
+        # Possibly newer than the tree: catch up in the background, never on this request
+        if CHAIN_VERIFIER.catch_up():
+            response = jsonify({"ok": False, "found": False, "pending": True})
+            response.headers["Retry-After"] = "10"
+            return response, 202
+        return jsonify({"ok": False, "found": False}), 404
+    return jsonify({"ok": True, "found": True, **proof}), 200
+
+@app.route("/api/audit/receipt/<receipt>", methods=["GET"])
+def audit_receipt(receipt):
+    """Hash of a record answered as "pending": status stored / pending / failed"""
+    try:
+        status = get_receipt_status(receipt)
+    except Exception as e:
+        log.error("❌ Receipt lookup error: %s", e)
+        return jsonify({"ok": False, "error": str(e)}), 500
+    if status is None:
+        # Not stored, and not queued in this worker (another worker may still hold it)
+        return jsonify({"ok": False, "found": False}), 404
+    return jsonify({"ok": True, "found": True, "receipt": receipt, **status}), 200
+
+@app.route("/api/audit/consistency/<int:first>", methods=["GET"])
+def audit_consistency_proof(first):
+    """
+    Consistency proof from the tree of the first `first` records to the latest
+    signed root (check with merkle.verify_consistency)
+    """
+    if CHAIN_VERIFIER is None:
+        return jsonify({"ok": False, "error": "Audit storage unavailable"}), 503
+    proof = CHAIN_VERIFIER.consistency_proof(first)
+    if not proof:
+        return jsonify({"ok": False, "error": "first must be between 1 and the signed tree size"}), 404
+    return jsonify({"ok": True, **proof}), 200
+
+@app.route("/api/audit/public-key", methods=["GET"])
+def audit_public_key():
+    """Ed25519 public key the Merkle roots are signed with; auditors pin it"""
+    if not AUDIT_PUBLIC_KEY:
+        return jsonify({"ok": False, "message": "Merkle roots are not signed (no AUDIT_SIGNING_KEY)"}), 404
+    return jsonify({"ok": True, "algorithm": "ed25519", "public_key": AUDIT_PUBLIC_KEY}), 200
+
+@app.route("/api/audit/root", methods=["GET"])
+def audit_signed_root():
+    """Latest signed Merkle root of the verified chain"""
+    root = CHAIN_VERIFIER.latest_signed_root() if CHAIN_VERIFIER is not None else None
+    if not root:
+        return jsonify({"ok": None, "message": "No chain verification has run yet"}), 404
+    return jsonify(root), 200
+
 # ===== Audit Record Verification =====
 
 @app.route("/audit/verify/<record_hash>", methods=["GET"])
@@ -417,16 +539,25 @@ def verify_audit_record(record_hash):
 
 @app.route("/audit_chain", methods=["GET"])
 def audit_chain_legacy():
-    limit = int(request.args.get("limit", 10))
-    result = get_audit_records(limit=limit)
-    print(f"🔍 /audit_chain returned: {result}")
-    return jsonify(result), 200
+    return _audit_list_response()
 
 @app.route("/get_audit_chain", methods=["GET"])
 def get_audit_chain():
-    limit = int(request.args.get("limit", 10))
-    result = get_audit_records(limit=limit)
-    return jsonify(result), 200
+    return _audit_list_response()
+
+def _audit_list_response():
+    """Plain record list (legacy shape); the next page cursor travels in X-Next-Cursor"""
+    try:
+        records, next_cursor = _audit_query(10)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except RuntimeError:
+        return jsonify([]), 200
+    log.debug("🔍 %s returned %d records", request.path, len(records))
+    response = jsonify(records)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response, 200
 
 # ===== Enhanced Features =====
 
@@ -460,14 +591,18 @@ def system_info():
 def system_stats():
     """System statistics"""
     try:
-        audit_data = get_audit_records(limit=1000)
-        audit_count = audit_data.get("count", 0) if isinstance(audit_data, dict) else len(audit_data)
-        
+        # Exact counts and aggregates without downloading rows, cached for a few seconds
+        audit_stats = get_audit_stats()
+
         return jsonify({
-            "audit_records_total": audit_count,
+            "audit_records_total": audit_stats["total"] if audit_stats else 0,
+            "audit_breakdown": audit_stats,
             "system_uptime": "stable",
+            "uptime_seconds": round(uptime_seconds(), 1),
             "last_updated": datetime.now().isoformat(),
-            "health": "excellent"
+            "health": "excellent" if audit_stats and not audit_stats.get("stale") else "degraded",
+            "stage_cache": STAGE_CACHE.stats(),
+            "bridge": {"cache": BRIDGE.cache.stats(), "circuit": BRIDGE.breaker.state, **BRIDGE.counters()}
         })
     except Exception as e:
         return jsonify({
@@ -477,6 +612,29 @@ def system_stats():
             "error": str(e)
         })
 
+def _collect_cache_and_bridge_metrics():
+    """Counters the caches and the bridge client already keep, exported at scrape time"""
+    # The stage cache is counted per stage by oracle_stage_cache_requests_total;
+    # exporting it here as well would count every lookup twice
+    caches = {"bridge": BRIDGE.cache}
+    return [
+        ("oracle_cache_hits_total", "counter", "Cache hits",
+         [({"cache": name}, cache.hits) for name, cache in caches.items()]),
+        ("oracle_cache_misses_total", "counter", "Cache misses",
+         [({"cache": name}, cache.misses) for name, cache in caches.items()]),
+        ("oracle_bridge_events_total", "counter", "Bridge client requests, coalesced calls, failures and short circuits",
+         [({"event": event}, value) for event, value in BRIDGE.counters().items()]),
+        ("oracle_bridge_circuit_open", "gauge", "1 while the bridge circuit breaker is not closed",
+         [({}, 0 if BRIDGE.breaker.state == "closed" else 1)]),
+    ]
+
+REGISTRY.register_collector(_collect_cache_and_bridge_metrics)
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text exposition of this worker's counters and latency histograms"""
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
 # ===== Philosophy Beliefs Routes =====
 
 @app.route("/api/philosophy/beliefs", methods=["GET"])
@@ -509,283 +667,442 @@ def check_consistency():
 
 # ===== Main Oracle Interface =====
 
-@app.route("/oracle", methods=["POST"])
-def oracle():
-    """Main Q&A interface - with Philosophical Reflection Mode"""
-    
-    # === External access control check - allow frontend, block other sources ===
-    if os.getenv('ENABLE_EXTERNAL_TEST', 'False').lower() != 'true':
-        # Get request origin
-        origin = request.headers.get('Origin', '')
-        referer = request.headers.get('Referer', '')
-        
-        # Allowed frontend domains
-        allowed_frontends = [
-            "https://oracle-philosophy-frontend-hnup.vercel.app",
-            "http://localhost:3000"
-        ]
-        
-        # Check if from allowed frontend
-        is_from_allowed_frontend = any(allowed in origin or allowed in referer 
-                                     for allowed in allowed_frontends)
-        
-        if not is_from_allowed_frontend:
-            return jsonify({
-                "status": "API_DISABLED",
-                "message": "Public access to Oracle Ethics API has been temporarily closed."
-            }), 403
-    
-    print("🔴 STEP 1: Entering oracle route")
-    
-    try:
-        data = request.get_json(force=True) or {}
-        question = data.get("question", "").strip()
-        session_id = data.get("session_id", "")
-        
-        print(f"🔴 STEP 2: Received question: {question}")
-        
-        if not question:
-            return jsonify({"error": "Question cannot be empty"}), 400
+# Allowed frontend domains
+ALLOWED_FRONTENDS = [
+    "https://oracle-philosophy-frontend-hnup.vercel.app",
+    "http://localhost:3000"
+]
+
+REFLECTION_PREFIXES = [
+    "🜂 From a philosophical perspective, ",
+    "🌌 In the dimension of existence, ",
+    "🧠 Upon deep reflection, I believe ",
+    "⚖️ On the moral scale, ",
+    "🌀 Considering the nature of reality, "
+]
+PHILOSOPHICAL_FOOTNOTES = [
+    "\n\n💭 *Truth is multifaceted - this is but one perspective*",
+    "\n\n🌱 *Wisdom grows in the soil of uncertainty*",
+    "\n\n⚛️ *Reality reveals itself through questioning*",
+    "\n\n🕊️ *In humility lies the beginning of understanding*"
+]
+PHILOSOPHICAL_KEYWORDS = [
+    "freedom", "truth", "justice", "meaning", "purpose",
+    "consciousness", "free will", "existence", "reality",
+    "道德", "真理", "自由", "意义", "存在", "意识"
+]
+
+def _external_access_denied():
+    """External access control check - allow frontend, block other sources"""
+    if os.getenv('ENABLE_EXTERNAL_TEST', 'False').lower() == 'true':
+        return None
+    origin = request.headers.get('Origin', '')
+    referer = request.headers.get('Referer', '')
+    if any(allowed in origin or allowed in referer for allowed in ALLOWED_FRONTENDS):
+        return None
+    return jsonify({
+        "status": "API_DISABLED",
+        "message": "Public access to Oracle Ethics API has been temporarily closed."
+    }), 403
+
+def detect_language(text):
+    """Language detection - Simple implementation"""
+    if not text:
+        return "en"
+    chinese_chars = sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
+    return "zh" if chinese_chars > 0 else "en"
+
+def _oracle_classify(question: str, start_bridge: bool = True) -> dict:
+    """
+    Steps 3-4.5: ethics shortcut, scoring, M2.3 and sensitivity scaling.
+    Everything the client can be told before the answer text is final; with
+    start_bridge the temperature bridge call runs on the stage pool meanwhile.
+    """
+    lang = detect_language(question)
+    log.debug("🔴 STEP 3: Detected language: %s", lang)
+
+    ctx = {
+        "question": question,
+        "lang": lang,
+        "answer": "",
+        "kind": "truth",
+        "determinacy": 0.0,
+        "deception_prob": 0.0,
+        "risk_tags": [],
+        "ethical_weight": 0.7,  # Default ethical weight
+        "explanation": "",
+        "use_bridge": False,
+        "bridge_future": None,
+        "reflection": None
+    }
 
-        # Language detection - Simple implementation
-        def detect_language(text):
-            if not text:
-                return "en"
-            chinese_chars = sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
-            return "zh" if chinese_chars > 0 else "en"
-            
-        lang = detect_language(question)
-        print(f"🔴 STEP 3: Detected language: {lang}")
-
-        # === Initialize record_payload early to avoid undefined errors ===
-        record_payload = {
-            "question": None,
-            "answer": None,
-            "kind": None,
-            "determinacy": None,
-            "deception_prob": None,
-            "ethical_weight": None,
-            "risk_tags": [],
-            "explanation": ""
-        }
+    # 1) Ethics shortcut (no return, only set values)
+    # Pure stages are served from the stage cache for repeated questions
+    stage_version = _stage_version()
+    try:
+        shortcut = cached_stage("ethics_shortcut", question, lambda: emergency_ethics_shortcut(question),
+                                version=stage_version)
+    except Exception as e:
+        log.warning("🔴 Ethics shortcut failed: %s", e)
+        shortcut = None
+
+    if shortcut:
+        log.info("🔴 STEP 4: Ethics interception triggered", extra={"rule": shortcut.get("intercepted_rule")})
+        ctx["answer"] = shortcut.get("answer", "For ethical reasons I cannot help with that.")
+        ctx["kind"] = shortcut.get("kind", "ethical_reject")
+        ctx["determinacy"] = float(shortcut.get("determinacy", 0.95))
+        ctx["deception_prob"] = float(shortcut.get("deception_prob", 0.0))
+        ctx["risk_tags"] = shortcut.get("risk_tags", ["ethics","safety"])
+    else:
+        # 2) Normal scoring + answer generation
+        log.debug("🔴 STEP 4: Normal question processing")
+        determinacy, deception_prob, risk_tags = cached_stage(
+            "score_question", question, lambda: score_question(question), version=stage_version,
+            # A question that hits no category draws a fresh random determinacy each time
+            cache_if=lambda scored: not random_determinacy(question, scored[1]))
+        answer, kind = cached_stage(
+            "craft_answer", question, lambda: craft_answer(question, determinacy, deception_prob),
+            determinacy, deception_prob, version=stage_version)
+        ctx.update({"answer": answer, "kind": kind, "deception_prob": deception_prob})
+
+        # === Smart Temperature Bridge Processing ===
+        # The bridge call runs on the stage pool while M2.3 is computed below
+        log.debug("🎭 Smart temperature bridge analysis...")
+        if should_use_bridge_layer(question):
+            log.debug("✅ Using temperature bridge: daily/emotional question")
+            ctx["use_bridge"] = True
+            if start_bridge:
+                ctx["bridge_future"] = submit_stage(gpt_bridge_layer, question)
+        else:
+            log.debug("🎓 Keeping original answer: academic/professional question")
+
+        # === M2.3 Semantic Fusion & Ethical Resonance (Lightweight Mount, No Schema Changes) ===
+        log.debug("🧠 M2.3: Semantic fusion activated")
+        intent_info = cached_stage("infer_intent", question, lambda: infer_intent(question),
+                                   version=stage_version)
+        log.debug("🧠 M2.3 Intent: %s", intent_info)
+
+        ethical_weight = ctx["ethical_weight"]
+        determinacy_adj, ethical_weight, resonance_tags = cached_stage(
+            "adjust_reflection", question, lambda: adjust_reflection(determinacy, ethical_weight, intent_info),
+            determinacy, ethical_weight, version=stage_version)
+        # risk_rules.json policy rules tag the record; rejection stays with the
+        # narrower emergency rules above (the policy lists match words like "price")
+        policy = cached_stage("policy_check", question, lambda: policy_check(question),
+                              version=stage_version)
+        policy_tags = policy["risk_tags"] if policy else []
+        if policy:
+            log.debug("📐 Policy rule matched: %s", policy["intercepted_category"])
+        ctx.update({
+            "determinacy": determinacy_adj,
+            "ethical_weight": ethical_weight,
+            "risk_tags": list(set(risk_tags + resonance_tags + policy_tags))
+        })
 
-        # === Unified variable slots - no early returns ===
-        answer = ""
-        kind = "truth"
-        determinacy = 0.0
-        deception_prob = 0.0
-        risk_tags = []
-        ethical_weight = 0.7  # Default ethical weight
+        log.debug("🧠 M2.3 Adjustment: %s → %s, ethical_weight: %s", determinacy, determinacy_adj, ethical_weight)
+        log.debug("🧠 M2.3 Resonance tags: %s", resonance_tags)
 
-        # 1) Ethics shortcut (no return, only set values)
+        # Embed new metrics into explanation as JSON text (no schema changes)
+        extra_explain = {
+            "semantic_intent": intent_info,
+            "ethical_weight_dynamic": ethical_weight,
+            "policy_rule": policy["intercepted_category"] if policy else None,
+            "m23_enabled": True
+        }
         try:
-            from risk_rules import emergency_ethics_shortcut
-            shortcut = emergency_ethics_shortcut(question)
+            ctx["explanation"] += " | M2.3=" + json.dumps(extra_explain, ensure_ascii=False)
         except Exception as e:
-            print(f"🔴 Ethics shortcut failed: {e}")
-            shortcut = None
-
-        if shortcut:
-            print(f"🔴 STEP 4: Ethics interception triggered")
-            answer = shortcut.get("answer", "For ethical reasons I cannot help with that.")
-            kind = shortcut.get("kind", "ethical_reject")
-            determinacy = float(shortcut.get("determinacy", 0.95))
-            deception_prob = float(shortcut.get("deception_prob", 0.0))
-            risk_tags = shortcut.get("risk_tags", ["ethics","safety"])
-        else:
-            # 2) Normal scoring + answer generation
-            print(f"🔴 STEP 4: Normal question processing")
-            determinacy, deception_prob, risk_tags = score_question(question)
-            answer, kind = craft_answer(question, determinacy, deception_prob)
-
-            # === Smart Temperature Bridge Processing ===
-            print("🎭 Smart temperature bridge analysis...")
-            if should_use_bridge_layer(question):
-                print("✅ Using temperature bridge: daily/emotional question")
-                bridged_answer = gpt_bridge_layer(question)
-                if not bridged_answer.startswith("[Bridge Layer Error"):
-                    answer = bridged_answer
-                    kind = "humanized_response"
-                    print("🎭 Temperature bridge processing successful")
-                else:
-                    print(f"⚠️ Temperature bridge degraded: {bridged_answer}, using original answer")
-            else:
-                print("🎓 Keeping original answer: academic/professional question")
+            log.warning("⚠️ M2.3 explanation merge failed: %s", e)
+
+    # 3) Apply Philosophical Reflection Mode
+    log.debug("🔴 STEP 4.5: Applying Philosophical Reflection Mode")
+
+    # Apply sensitivity thresholds
+    ctx["determinacy"] *= SENSITIVITY_CONFIG["determinacy_threshold"]
+    ctx["deception_prob"] *= SENSITIVITY_CONFIG["deception_prob_limit"]
+
+    # Pick the philosophical reflection for deep questions up front, so a
+    # streamed answer can open with the prefix before the body arrives
+    if SENSITIVITY_CONFIG["ethical_reflection_weight"] > 0.6:
+        if any(keyword in question.lower() for keyword in PHILOSOPHICAL_KEYWORDS):
+            ctx["reflection"] = {
+                "prefix": random.choice(REFLECTION_PREFIXES),
+                "footnote": random.choice(PHILOSOPHICAL_FOOTNOTES)
+            }
+            log.debug("🧠 Philosophical Reflection Mode activated")
+    return ctx
 
-            # === M2.3 Semantic Fusion & Ethical Resonance (Lightweight Mount, No Schema Changes) ===
-            print("🧠 M2.3: Semantic fusion activated")
-            intent_info = infer_intent(question)
-            print(f"🧠 M2.3 Intent: {intent_info}")
+def _reflection_prefix(reflection, answer: str) -> str:
+    """Reflection prefix to put before `answer` ("" if none or already reflective)"""
+    if not reflection:
+        return ""
+    # Ensure the answer starts with the reflection naturally
+    if answer.startswith(tuple(p[0] for p in REFLECTION_PREFIXES)):
+        return ""
+    return reflection["prefix"]
+
+def _apply_reflection(answer: str, reflection) -> str:
+    if not reflection:
+        return answer
+    return _reflection_prefix(reflection, answer) + answer + reflection["footnote"]
+
+def _oracle_resolve_bridge(ctx: dict):
+    """Swap in the temperature bridge answer when it succeeded"""
+    if ctx["bridge_future"] is None:
+        return
+    with stage_timer("bridge_wait"):
+        bridged_answer = collect(ctx["bridge_future"], default="[Bridge Layer Error: stage failed]")
+    if not bridged_answer.startswith("[Bridge Layer Error"):
+        ctx["answer"] = bridged_answer
+        ctx["kind"] = "humanized_response"
+        log.debug("🎭 Temperature bridge processing successful")
+    else:
+        BRIDGE_FALLBACKS.inc(route="oracle")
+        log.warning("⚠️ Temperature bridge degraded: %s, using original answer", bridged_answer)
+
+def _timed_stage(stage: str, fn, *args, **kwargs):
+    with stage_timer(stage):
+        return fn(*args, **kwargs)
+
+def _reason_trace(q, kind, determinacy, deception_prob, risk_tags):
+    trace = []
+    ql = (q or "").lower()
+    if any(k in ql for k in ["deceiv", "forge", "cheat", "操纵", "欺骗", "伪造"]):
+        trace.append("risk: deception-related intent")
+    if any(k in ql for k in ["medical", "drug", "chest pain", "用药", "心脏", "诊断"]):
+        trace.append("risk: medical intent")
+    if any(k in ql for k in ["price", "bitcoin", "stock", "预测", "比特币", "股价"]):
+        trace.append("risk: financial prediction intent")
+    trace.append(f"classify={kind}")
+    trace.append(f"determinacy={round(determinacy,2)}")
+    trace.append(f"deception_prob={round(deception_prob,2)}")
+    if risk_tags:
+        trace.append("tags=" + ",".join(risk_tags))
+    return trace
+
+def _oracle_commit(ctx: dict) -> dict:
+    """Steps 5-9: assemble, hash and append the record, then attach consistency warnings"""
+    question, answer, kind = ctx["question"], ctx["answer"], ctx["kind"]
+    determinacy, deception_prob, risk_tags = ctx["determinacy"], ctx["deception_prob"], ctx["risk_tags"]
+    lang = ctx["lang"]
+
+    # 4) Assemble record (prev_hash is added when the record is linked into the chain)
+    log.debug("🔴 STEP 5: Assembling record")
+    record_payload = {
+        "question": question,
+        "answer": answer,
+        "kind": kind,
+        "determinacy": round(float(determinacy), 2),
+        "deception_prob": round(float(deception_prob), 2),
+        "ethical_weight": ctx["ethical_weight"],
+        "risk_tags": risk_tags,
+        "explanation": ctx["explanation"],
+        "language": lang,
+        "timestamp": _now_iso(),
+    }
 
-            original_determinacy = determinacy
-            determinacy, ethical_weight, resonance_tags = adjust_reflection(determinacy, ethical_weight, intent_info)
-            risk_tags = list(set(risk_tags + resonance_tags))
+    fields = {
+        "question": question,
+        "answer": answer,
+        "determinacy": float(record_payload["determinacy"]),
+        "deception_prob": float(record_payload["deception_prob"]),
+        "risk_tags": risk_tags,
+        "kind": kind,
+        "language": lang,
+    }
 
-            print(f"🧠 M2.3 Adjustment: {original_determinacy} → {determinacy}, ethical_weight: {ethical_weight}")
-            print(f"🧠 M2.3 Resonance tags: {resonance_tags}")
+    # 5) Save (cloud first/local fallback, exceptions don't block response)
+    # The contradiction scan only reads earlier beliefs, so it overlaps the save
+    contradiction_future = submit_stage(_timed_stage, "contradiction_scan", detect_philosophical_contradiction, question, answer)
+    # Belief save is not needed by the response; it is queued once the scan
+    # has read the history so the current answer is never compared to itself
+    contradiction_future.add_done_callback(
+        lambda _f: run_background(_timed_stage, "belief_save", save_philosophical_belief, question, answer)
+    )
 
-            # Embed new metrics into explanation as JSON text (no schema changes)
-            extra_explain = {
-                "semantic_intent": intent_info,
-                "ethical_weight_dynamic": ethical_weight,
-                "m23_enabled": True
-            }
+    log.debug("🔴 STEP 6: About to save record")
+    try:
+        with stage_timer("commit_audit_record"):
+            committed = commit_audit_record(fields, record_payload)
+        log.debug("🔴 STEP 7: Save result: %s (receipt %s)", committed["status"], committed["receipt"])
+    except Exception as e:
+        log.error("[oracle] save_record failed → %s", e)
+        committed = {"status": "failed", "hash": None, "prev_hash": None, "receipt": None}
+    # Only a stored record has a hash: "pending" ones get it later via /api/audit/receipt
+    record_payload["prev_hash"] = committed["prev_hash"]
+
+    # 6) Consistency checking (bounded wait; a slow scan is dropped, not awaited)
+    log.debug("🔴 STEP 8.5: Consistency checking")
+    with stage_timer("consistency_wait"):
+        contradictions = collect(contradiction_future, default=[], timeout=CONSISTENCY_WAIT)
+    if contradictions:
+        record_payload["consistency_warnings"] = contradictions
+        log.info("⚠️ Found %d philosophical contradictions", len(contradictions))
+
+    # 7) Single exit: hash and minimal reason chain
+    log.debug("🔴 STEP 9: Preparing final response")
+    record_payload["hash"] = committed["hash"]
+    record_payload["audit_status"] = committed["status"]
+    record_payload["audit_receipt"] = committed["receipt"]
+    record_payload["reason_trace"] = _reason_trace(
+        question, kind, determinacy, deception_prob, risk_tags
+    )
+    # Add mode information
+    record_payload["reflection_mode"] = SENSITIVITY_CONFIG["mode"]
+    return record_payload
 
-            # Merge into existing explanation field with protection
-            try:
-                import json
-                extra_explain_str = " | M2.3=" + json.dumps(extra_explain, ensure_ascii=False)
-                existing_explanation = record_payload.get("explanation") or ""
-                record_payload["explanation"] = existing_explanation + extra_explain_str
-            except Exception as e:
-                print(f"⚠️ M2.3 explanation merge failed: {e}")
-
-        # === Philosophical enhancement completely disabled ===
-        inconsistencies = []
-        
-        # 3) Apply Philosophical Reflection Mode
-        print(f"🔴 STEP 4.5: Applying Philosophical Reflection Mode")
-        
-        # Apply sensitivity thresholds
-        determinacy *= SENSITIVITY_CONFIG["determinacy_threshold"]
-        deception_prob *= SENSITIVITY_CONFIG["deception_prob_limit"]
-        
-        # Add philosophical reflection for deep questions
-        if SENSITIVITY_CONFIG["ethical_reflection_weight"] > 0.6:
-            philosophical_keywords = [
-                "freedom", "truth", "justice", "meaning", "purpose", 
-                "consciousness", "free will", "existence", "reality",
-                "道德", "真理", "自由", "意义", "存在", "意识"
-            ]
-            if any(keyword in question.lower() for keyword in philosophical_keywords):
-                reflection_prefixes = [
-                    "🜂 From a philosophical perspective, ",
-                    "🌌 In the dimension of existence, ",
-                    "🧠 Upon deep reflection, I believe ",
-                    "⚖️ On the moral scale, ",
-                    "🌀 Considering the nature of reality, "
-                ]
-                import random
-                prefix = random.choice(reflection_prefixes)
-                
-                # Ensure the answer starts with the reflection naturally
-                if not answer.startswith(tuple([p[0] for p in reflection_prefixes])):
-                    answer = f"{prefix}{answer}"
-                
-                # Add philosophical footnote
-                philosophical_footnotes = [
-                    "\n\n💭 *Truth is multifaceted - this is but one perspective*",
-                    "\n\n🌱 *Wisdom grows in the soil of uncertainty*", 
-                    "\n\n⚛️ *Reality reveals itself through questioning*",
-                    "\n\n🕊️ *In humility lies the beginning of understanding*"
-                ]
-                answer += random.choice(philosophical_footnotes)
-                
-                print("🧠 Philosophical Reflection Mode activated")
+def _read_question():
+    data = request.get_json(force=True) or {}
+    question = data.get("question", "").strip()
+    log.debug("🔴 STEP 2: Received question: %s", question)
+    return question
 
-        # 4) Assemble record (calculate prev_hash first, then current hash)
-        print(f"🔴 STEP 5: Assembling record")
-        prev_hash = ""
-        try:
-            prev_hash = get_latest_hash() or ""
-            print(f"🔴 Previous hash: {prev_hash}")
-        except Exception as e:
-            print(f"[oracle] get_latest_hash failed → {e}")
-
-        ts = _now_iso()
-        
-        # Update record_payload with actual values before saving
-        record_payload.update({
-            "question": question,
-            "answer": answer,
-            "kind": kind,
-            "determinacy": round(float(determinacy), 2),
-            "deception_prob": round(float(deception_prob), 2),
-            "ethical_weight": ethical_weight,
-            "risk_tags": risk_tags,
-            "language": lang,
-            "timestamp": ts,
-            "prev_hash": prev_hash
-        })
-        
-        # Create hash
-        import json
-        def _make_hash(payload: dict) -> str:
-            base = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")
-            return hashlib.sha256(base).hexdigest()
-            
-        record_hash = _make_hash(record_payload)
+@app.route("/oracle", methods=["POST"])
+def oracle():
+    """Main Q&A interface - with Philosophical Reflection Mode"""
+    denied = _external_access_denied()
+    if denied:
+        return denied
 
-        # 5) Save (cloud first/local fallback, exceptions don't block response)
-        print(f"🔴 STEP 6: About to save record")
-        try:
-            save_result = save_record(
-                question=question,
-                answer=answer,
-                hash_value=record_hash,
-                prev_hash=prev_hash,
-                determinacy=float(record_payload["determinacy"]),
-                deception_prob=float(record_payload["deception_prob"]),
-                risk_tags=risk_tags,
-                kind=kind,
-                language=lang
-            )
-            print(f"🔴 STEP 7: Save result: {'SUCCESS' if save_result else 'FAILED'}")
-        except Exception as e:
-            print(f"[oracle] save_record failed → {e}")
+    log.debug("🔴 STEP 1: Entering oracle route")
 
-        # 6) Consistency checking
-        print(f"🔴 STEP 8.5: Consistency checking")
-        
-        # Save current belief (using auto-tag detection)
-        try:
-            # No longer manually specifying tags, using auto-detection
-            save_philosophical_belief(question, answer)
-            
-            # Detect contradictions
-            contradictions = detect_philosophical_contradiction(question, answer)
-            if contradictions:
-                record_payload["consistency_warnings"] = contradictions
-                print(f"⚠️ Found {len(contradictions)} philosophical contradictions")
-            
-        except Exception as e:
-            print(f"⚠️ Consistency check failed: {e}")
-
-        # 7) Single exit: return to frontend (with hash and minimal reason chain)
-        print(f"🔴 STEP 9: Preparing final response")
-        record_payload["hash"] = record_hash
-        
-        # Reason trace function
-        def _reason_trace(q, kind, determinacy, deception_prob, risk_tags):
-            trace = []
-            ql = (q or "").lower()
-            if any(k in ql for k in ["deceiv", "forge", "cheat", "操纵", "欺骗", "伪造"]):
-                trace.append("risk: deception-related intent")
-            if any(k in ql for k in ["medical", "drug", "chest pain", "用药", "心脏", "诊断"]):
-                trace.append("risk: medical intent")
-            if any(k in ql for k in ["price", "bitcoin", "stock", "预测", "比特币", "股价"]):
-                trace.append("risk: financial prediction intent")
-            trace.append(f"classify={kind}")
-            trace.append(f"determinacy={round(determinacy,2)}")
-            trace.append(f"deception_prob={round(deception_prob,2)}")
-            if risk_tags:
-                trace.append("tags=" + ",".join(risk_tags))
-            return trace
-            
-        record_payload["reason_trace"] = _reason_trace(
-            question, kind, determinacy, deception_prob, risk_tags
-        )
-        
-        # Add mode information
-        record_payload["reflection_mode"] = SENSITIVITY_CONFIG["mode"]
-        
-        print(f"🔴 STEP 10: Returning final response")
+    try:
+        question = _read_question()
+        if not question:
+            return jsonify({"error": "Question cannot be empty"}), 400
+
+        with REQUEST_SECONDS.time(route="oracle"):
+            ctx = _oracle_classify(question)
+            _oracle_resolve_bridge(ctx)
+            ctx["answer"] = _apply_reflection(ctx["answer"], ctx["reflection"])
+            record_payload = _oracle_commit(ctx)
+
+        log.debug("🔴 STEP 10: Returning final response")
         return jsonify(record_payload), 200
 
     except Exception as e:
-        print(f"🔴 ERROR: oracle route failed: {e}")
+        log.exception("🔴 ERROR: oracle route failed: %s", e)
         return jsonify({"error": f"oracle route failed: {e}"}), 500
 
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route("/oracle/stream", methods=["POST"])
+@app.route("/api/consult/stream", methods=["POST"])
+def oracle_stream():
+    """
+    Server-Sent Events variant of /oracle:
+      classification → token* → answer → record   (or error)
+    The classification is sent as soon as scoring finishes, bridge tokens are
+    forwarded as they arrive, and the record follows the audit write (with its
+    hash once stored; audit_status "pending" records carry an audit_receipt instead).
+    """
+    denied = _external_access_denied()
+    if denied:
+        return denied
+
+    log.debug("🔴 STEP 1: Entering oracle stream route")
+    question = _read_question()
+    if not question:
+        return jsonify({"error": "Question cannot be empty"}), 400
+
+    def _events():
+        started = time.perf_counter()
+        ctx = None
+        classified_kind = None
+        reflection = None
+        prefix = ""
+        body = None
+        answered = False
+        committed = False
+        try:
+            ctx = _oracle_classify(question, start_bridge=False)
+            classified_kind = ctx["kind"]
+            yield _sse("classification", {
+                "kind": ctx["kind"],
+                "determinacy": round(float(ctx["determinacy"]), 2),
+                "deception_prob": round(float(ctx["deception_prob"]), 2),
+                "risk_tags": ctx["risk_tags"],
+                "language": ctx["lang"],
+                "bridge": ctx["use_bridge"],
+                "reflection_mode": SENSITIVITY_CONFIG["mode"]
+            })
+
+            reflection = ctx["reflection"]
+            if ctx["use_bridge"]:
+                streamed = []
+                started_text = False
+                try:
+                    for chunk in BRIDGE.stream(question):
+                        streamed.append(chunk)
+                        if started_text:
+                            yield _sse("token", {"text": chunk})
+                            continue
+                        # Hold back leading whitespace: the committed answer is the
+                        # stripped body, so the prefix is decided on that same text
+                        lead = "".join(streamed).lstrip()
+                        if lead:
+                            started_text = True
+                            prefix = _reflection_prefix(reflection, lead)
+                            yield _sse("token", {"text": prefix + lead})
+                    body = "".join(streamed).strip()
+                    ctx["kind"] = "humanized_response" if body else ctx["kind"]
+                    body = body or None
+                    if body:
+                        log.debug("🎭 Temperature bridge processing successful")
+                except BridgeError as e:
+                    BRIDGE_FALLBACKS.inc(route="oracle_stream")
+                    log.warning("⚠️ Temperature bridge degraded: %s, using original answer", e)
+                    if started_text:
+                        # Partial bridge text is discarded; the client restarts the answer
+                        yield _sse("reset", {"reason": str(e)})
+
+            if body is None:
+                body = ctx["answer"]
+                prefix = _reflection_prefix(reflection, body)
+                yield _sse("token", {"text": prefix + body})
+            footnote = reflection["footnote"] if reflection else ""
+            if footnote:
+                yield _sse("token", {"text": footnote})
+
+            ctx["answer"] = prefix + body + footnote
+            answered = True
+            yield _sse("answer", {"answer": ctx["answer"], "kind": ctx["kind"]})
+
+            committed = True
+            record_payload = _oracle_commit(ctx)
+            REQUEST_SECONDS.observe(time.perf_counter() - started, route="oracle_stream")
+            log.debug("🔴 STEP 10: Streaming final record")
+            yield _sse("record", record_payload)
+        except Exception as e:
+            log.exception("🔴 ERROR: oracle stream failed: %s", e)
+            yield _sse("error", {"error": f"oracle route failed: {e}"})
+        finally:
+            if ctx is not None and not committed:
+                # The client went away (or streaming failed) after scoring: the
+                # answer still gets its audit record, written off this thread
+                if not answered:
+                    if body is None:
+                        # An unfinished bridge answer is dropped, as on a bridge error
+                        body = ctx["answer"]
+                        prefix = _reflection_prefix(reflection, body)
+                        ctx["kind"] = classified_kind
+                    ctx["answer"] = prefix + body + (reflection["footnote"] if reflection else "")
+                run_background(_oracle_commit, ctx)
+
+    return Response(
+        stream_with_context(_events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ASGI entry point (e.g. `uvicorn app:asgi_app`); stages still fan out on the pipeline pool
+try:
+    from asgiref.wsgi import WsgiToAsgi
+    asgi_app = WsgiToAsgi(app)
+except ImportError:
+    asgi_app = None
+
 if __name__ == "__main__":
     # === M2.6 Self-audit system startup detection ===
     if os.getenv("ENABLE_SELF_AUDIT") == "True":
@@ -0,0 +1,295 @@
+# audit_sink.py
+# Write-behind sink for audit records.
+# Records are appended to a local append-only spool (the durable write on the
+# request path) and shipped to Supabase in bulk by a background flusher.
+# Spooled records are not linked yet: the flusher gives each batch its chain
+# position (prev_hash, hash) right before inserting it, so a conflict with
+# another writer only means linking again, and a hash is published (to
+# wait_for / receipt_status) only once its record is stored.
+# Whatever was not flushed before a restart is replayed from the spool; since
+# such records may have landed just before the crash, they are first looked up
+# by receipt, as are records of a batch whose insert outcome is unknown.
+import os
+import json
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from oracle_logging import get_logger
+
+try:
+    import fcntl  # POSIX only; lets several workers each own one spool slot
+except ImportError:
+    fcntl = None
+
+log = get_logger("audit_sink")
+
+# flush_batch(records) -> (status, {receipt: {"hash", "prev_hash"}})
+#   status: "ok" | "rejected" (will never succeed) | "error" / "conflict" (retry later)
+FlushFn = Callable[[List[Dict]], Tuple[str, Dict[str, Dict]]]
+# lookup_stored(receipts) -> {receipt: {"hash", "prev_hash"}} of those already stored, None on failure
+LookupFn = Callable[[List[str]], Optional[Dict[str, Dict]]]
+
+# Completed receipts remembered for wait_for / receipt_status
+DONE_RECEIPTS_MAX = 10000
+
+class AuditSink:
+    def __init__(self, spool_path: str, flush_batch: FlushFn, lookup_stored: LookupFn,
+                 batch_size: int = 50, flush_interval: float = 2.0,
+                 fsync: bool = False, max_slots: int = 16):
+        self.base_path = spool_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_slots = max_slots
+        self._flush_batch = flush_batch
+        self._lookup_stored = lookup_stored
+        self._lock = threading.Lock()
+        self._done_cond = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = []          # [(start_offset, record)] in spool order
+        self._done = OrderedDict()  # receipt -> {"hash", "prev_hash"} or {"rejected": True}
+        self._uncertain = False     # pending records may already be stored
+        self._spool = None
+        self.spool_path = None
+        self._closed = False
+        self._thread = None
+        self._failures = 0
+
+    # ----- startup / replay -----
+    def start(self):
+        """Claim a spool slot, replay unflushed records and start the flusher"""
+        self._spool = self._claim_spool()
+        self._replay()
+        self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        if self._pending:
+            log.info("📼 Audit spool replay: %d unflushed records from %s", len(self._pending), self.spool_path)
+            self._uncertain = True
+            self._wakeup.set()
+        return self
+
+    def _slot_path(self, slot: int) -> str:
+        return self.base_path if slot == 0 else f"{self.base_path}.{slot}"
+
+    def _claim_spool(self):
+        # Each process owns one slot for its lifetime (exclusive flock), so
+        # workers never share a spool and orphaned slots are replayed by
+        # whichever worker claims them after a restart
+        for slot in range(self.max_slots if fcntl else 1):
+            path = self._slot_path(slot)
+            handle = open(path, "a+b")
+            if fcntl is None:
+                self.spool_path = path
+                return handle
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                continue
+            self.spool_path = path
+            return handle
+        raise RuntimeError(f"No free audit spool slot for {self.base_path}")
+
+    def _read_offset(self) -> int:
+        try:
+            with open(self.spool_path + ".offset", "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_offset(self, offset: int):
+        tmp = self.spool_path + ".offset.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(offset))
+        os.replace(tmp, self.spool_path + ".offset")
+
+    def _replay(self):
+        offset = self._read_offset()
+        self._spool.seek(offset)
+        start = offset
+        for line in self._spool:
+            line_start, start = start, start + len(line)
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line.decode("utf-8"))
+            except ValueError:
+                # Torn final line from a crash mid-write: nothing after it is valid
+                log.warning("⚠️ Audit spool: skipping corrupt line at offset %d", line_start)
+                continue
+            if not record.get("receipt"):
+                # Spooled already linked by an older version: linked again at flush
+                record["receipt"] = record.get("hash") or f"offset-{line_start}"
+            self._pending.append((line_start, record))
+        self._spool.seek(0, os.SEEK_END)
+
+    # ----- hot path -----
+    def append(self, record: Dict):
+        """Durably spool one unlinked record (it must carry a unique "receipt")"""
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            start = self._spool.tell()
+            self._spool.write(line)
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+            # The queued copy is what was spooled, never the caller's (mutable) dict
+            self._pending.append((start, json.loads(line)))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def wait_for(self, receipt: str, timeout: float) -> Optional[Dict]:
+        """
+        Flush now and wait up to `timeout` seconds for the record's link
+        ({"hash", "prev_hash"}, or {"rejected": True}); None if still pending.
+        Does not wait while Supabase is failing.
+        """
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        with self._done_cond:
+            while receipt not in self._done:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._failures:
+                    return None
+                self._done_cond.wait(remaining)
+            return dict(self._done[receipt])
+
+    def receipt_status(self, receipt: str) -> Optional[Dict]:
+        """The link of a stored record, {"pending": True} while spooled, None if unknown here"""
+        with self._lock:
+            if receipt in self._done:
+                return dict(self._done[receipt])
+            if any(record.get("receipt") == receipt for _, record in self._pending):
+                return {"pending": True}
+        return None
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    # ----- flusher -----
+    def _run(self):
+        while not self._closed:
+            # Back off while Supabase keeps failing
+            wait = self.flush_interval * min(2 ** self._failures, 30)
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+            try:
+                while self.flush() and self.pending_count() >= self.batch_size:
+                    pass
+            except Exception as e:
+                log.exception("⚠️ Audit sink flush crashed: %s", e)
+
+    def flush(self) -> bool:
+        """Ship one batch; returns True when records left the spool"""
+        with self._flush_lock:
+            with self._lock:
+                batch = [record for _, record in self._pending[:self.batch_size]]
+            if not batch:
+                self._compact()
+                return False
+
+            if self._uncertain:
+                # An earlier insert of these records may have landed: never store one twice
+                stored = self._lookup_stored([record["receipt"] for record in batch])
+                if stored is None:
+                    self._failed()
+                    return False
+                self._uncertain = False
+                if stored:
+                    self._complete(stored)
+                    with self._lock:
+                        batch = [record for _, record in self._pending[:self.batch_size]]
+                    if not batch:
+                        return True
+
+            status, links = self._flush_batch(batch)
+            if status == "ok":
+                self._failures = 0
+                self._complete(links)
+                return True
+            if status == "conflict":
+                # Other writers kept winning the tip: link again right away
+                self._uncertain = True
+                self._wakeup.set()
+                return False
+            if status != "rejected":
+                # Timeouts and 5xx may have stored the batch
+                self._uncertain = True
+                self._failed()
+                return False
+
+            # Bulk insert refused: ship one by one, each linked onto the last
+            # accepted record, and park the rejects so the chain has no gap
+            links, rejected = {}, []
+            for record in batch:
+                single, link = self._flush_batch([record])
+                if single == "ok":
+                    links.update(link)
+                elif single == "rejected":
+                    rejected.append(record)
+                else:
+                    self._uncertain = True
+                    break
+            if rejected:
+                self._park(rejected)
+                links.update((record["receipt"], {"rejected": True}) for record in rejected)
+            if not links:
+                self._failed()
+                return False
+            self._failures = 0
+            self._complete(links)
+            return True
+
+    def _failed(self):
+        # Waiters stop waiting while Supabase is failing (see wait_for)
+        with self._done_cond:
+            self._failures += 1
+            self._done_cond.notify_all()
+
+    def _complete(self, links: Dict[str, Dict]):
+        """Drop finished records from the queue and publish their links"""
+        with self._done_cond:
+            self._pending = [(start, record) for start, record in self._pending
+                             if record["receipt"] not in links]
+            offset = self._pending[0][0] if self._pending else self._spool.tell()
+            for receipt, link in links.items():
+                self._done[receipt] = link
+                self._done.move_to_end(receipt)
+            while len(self._done) > DONE_RECEIPTS_MAX:
+                self._done.popitem(last=False)
+            self._done_cond.notify_all()
+        self._write_offset(offset)
+        self._compact()
+
+    def _park(self, records: List[Dict]):
+        path = self.spool_path + ".rejected"
+        with open(path, "a", encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        log.error("❌ Audit sink: %d records rejected by Supabase → %s", len(records), path)
+
+    def _compact(self):
+        # Everything flushed: truncate so the spool does not grow forever
+        with self._lock:
+            if self._pending or self._spool.tell() == 0:
+                return
+            self._spool.truncate(0)
+            self._spool.seek(0)
+            self._write_offset(0)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        try:
+            while self.flush():
+                pass
+        except Exception as e:
+            log.warning("⚠️ Audit sink final flush failed: %s", e)
@@ -0,0 +1,133 @@
+# audit_stats.py
+# Audit chain statistics for /system/stats without downloading audit rows.
+# Preferred source is the audit_chain_stats() SQL function (deploy/supabase.sql),
+# which groups in the database in one round trip. Without it, exact counts come
+# from HEAD + Prefer: count=exact requests per known kind / language / risk tag,
+# run on a small pool of their own so they never queue ahead of /oracle stages.
+# Either way the result is cached for AUDIT_STATS_TTL seconds. A failed refresh
+# is remembered for AUDIT_STATS_FAILURE_TTL seconds; meanwhile callers get the
+# last good stats marked stale instead of waiting on another round of timeouts.
+import os
+import copy
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from audit_storage import count_rows, call_rpc, TABLE_AUDIT
+from pipeline import collect
+from rule_engine import RULES
+from result_cache import TTLCache
+from oracle_logging import get_logger
+
+log = get_logger("audit_stats")
+
+AUDIT_STATS_TTL = float(os.getenv("AUDIT_STATS_TTL", "30"))
+AUDIT_STATS_RPC = os.getenv("AUDIT_STATS_RPC", "audit_chain_stats")
+AUDIT_STATS_WORKERS = int(os.getenv("AUDIT_STATS_WORKERS", "4"))
+AUDIT_STATS_FAILURE_TTL = float(os.getenv("AUDIT_STATS_FAILURE_TTL", "15"))
+
+# Values the pipeline can write (logic_core / deception_engine / risk rules / M2.3)
+KNOWN_KINDS = ("truth", "caution", "deception", "ethical_reject", "humanized_response", "wisdom", "counter")
+KNOWN_LANGUAGES = ("en", "zh")
+# Risk tags emitted by code; tags of risk_rules.json responses come from the rule engine
+PIPELINE_RISK_TAGS = (
+    "deception_detected", "high_risk", "financial_prediction", "medical_advice", "manipulation",
+    "ethics", "safety", "sensitive",
+    "ethical_resonance:negative_valence", "ethical_resonance:risk_topic", "semantic_boost:philosophy_truth",
+)
+
+_executor = ThreadPoolExecutor(max_workers=AUDIT_STATS_WORKERS, thread_name_prefix="oracle-audit-stats")
+
+_cache = TTLCache(maxsize=1, ttl=AUDIT_STATS_TTL)
+_refresh_lock = threading.Lock()
+_rpc_available = True
+# Last successful result (served stale while Supabase is failing) and the
+# monotonic time before which no new refresh is attempted
+_last_good = {"stats": None, "at": 0.0}
+_retry_after = 0.0
+
+def _stats_from_rpc() -> Optional[Dict[str, Any]]:
+    global _rpc_available
+    if not _rpc_available:
+        return None
+    status, result = call_rpc(AUDIT_STATS_RPC)
+    if status == 404:
+        # Function not installed: stop asking, use count queries from now on
+        _rpc_available = False
+        log.info("📊 %s() not found, using count queries for audit stats", AUDIT_STATS_RPC)
+        return None
+    if status != 200 or not isinstance(result, dict) or "total" not in result:
+        return None
+    return {
+        "total": int(result["total"]),
+        "by_kind": result.get("by_kind") or {},
+        "by_language": result.get("by_language") or {},
+        "by_risk_tag": result.get("by_risk_tag") or {},
+        "source": "rpc",
+    }
+
+def known_risk_tags():
+    """Code-emitted tags plus every tag the current rule document can attach"""
+    return sorted(set(PIPELINE_RISK_TAGS) | RULES.risk_tags())
+
+def _stats_from_counts() -> Optional[Dict[str, Any]]:
+    queries = {("total", None): None}
+    for kind in KNOWN_KINDS:
+        queries[("by_kind", kind)] = {"kind": f"eq.{kind}"}
+    for language in KNOWN_LANGUAGES:
+        queries[("by_language", language)] = {"language": f"eq.{language}"}
+    for tag in known_risk_tags():
+        queries[("by_risk_tag", tag)] = {"risk_tags": f'cs.{{"{tag}"}}'}
+
+    futures = {key: _executor.submit(count_rows, TABLE_AUDIT, params) for key, params in queries.items()}
+    stats = {"total": None, "by_kind": {}, "by_language": {}, "by_risk_tag": {}, "source": "count"}
+    for (group, value), future in futures.items():
+        count = collect(future)
+        if group == "total":
+            stats["total"] = count
+        elif count:
+            stats[group][value] = count
+    if stats["total"] is None:
+        return None
+    return stats
+
+def _stale_stats() -> Optional[Dict[str, Any]]:
+    stats = _last_good["stats"]
+    if stats is None:
+        return None
+    stats = copy.deepcopy(stats)
+    stats["stale"] = True
+    stats["age_seconds"] = round(time.monotonic() - _last_good["at"], 1)
+    return stats
+
+def get_audit_stats() -> Optional[Dict[str, Any]]:
+    """
+    Total and per kind / language / risk tag counts. While Supabase is failing,
+    the last good result with stale=True (None if there never was one).
+    """
+    global _retry_after
+    stats = _cache.get("audit")
+    if stats is not None:
+        return copy.deepcopy(stats)
+    if time.monotonic() < _retry_after:
+        return _stale_stats()
+    # One refresh at a time; other callers take the last good result rather
+    # than queue behind it (and wait only when there is nothing to serve)
+    if not _refresh_lock.acquire(blocking=_last_good["stats"] is None):
+        return _stale_stats()
+    try:
+        stats = _cache.get("audit")
+        if stats is None:
+            if time.monotonic() < _retry_after:
+                return _stale_stats()
+            stats = _stats_from_rpc() or _stats_from_counts()
+            if stats is None:
+                _retry_after = time.monotonic() + AUDIT_STATS_FAILURE_TTL
+                log.warning("⚠️ Audit stats refresh failed; retrying in %.0fs", AUDIT_STATS_FAILURE_TTL)
+                return _stale_stats()
+            _retry_after = 0.0
+            _cache.set("audit", stats)
+            _last_good.update(stats=stats, at=time.monotonic())
+    finally:
+        _refresh_lock.release()
+    return copy.deepcopy(stats)
@@ -2,21 +2,39 @@ from dotenv import load_dotenv
 import os
 
 load_dotenv()
+from config import state_path
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_AUDIT_TABLE = os.getenv("SUPABASE_AUDIT_TABLE", "audit_chain")
 SUPABASE_MSG_TABLE = os.getenv("SUPABASE_MSG_TABLE", "messages")
-LOCAL_BACKUP = os.getenv("LOCAL_AUDIT_BACKUP", "local_audit_backup.jsonl")
+# Base path of the write-behind spool files (audit_sink.py)
+LOCAL_BACKUP = os.getenv("LOCAL_AUDIT_BACKUP") or state_path("local_audit_backup.jsonl")
 
 # audit_storage.py — Using pure HTTP requests
 import os
+import re
 import json
+import base64
 import datetime
+import time
+import uuid
+import threading
 import requests
 import hashlib
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from audit_sink import AuditSink
+from stance_index import stance_index
+from keyword_matcher import register_keywords, scan_keywords
+from oracle_logging import get_logger
+from metrics import SUPABASE_SECONDS, SUPABASE_ERRORS
+from pipeline import submit_stage, collect
+from result_cache import TTLCache
+
+log = get_logger("storage")
 
 load_dotenv()
 
@@ -25,39 +43,148 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY", "").strip()
 TABLE_AUDIT = "audit_chain"
 TABLE_MSG = "messages"
 
-print(f"🔧 Supabase Config: URL={SUPABASE_URL[:28]}..., KEY={SUPABASE_KEY[:12]}...")
+# Connection pool / timeout / retry settings
+SUPABASE_POOL_CONNECTIONS = int(os.getenv("SUPABASE_POOL_CONNECTIONS", "4"))
+SUPABASE_POOL_MAXSIZE = int(os.getenv("SUPABASE_POOL_MAXSIZE", "16"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "3.05"))
+SUPABASE_READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", "10"))
+SUPABASE_MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", "3"))
+SUPABASE_RETRY_BACKOFF = float(os.getenv("SUPABASE_RETRY_BACKOFF", "0.3"))
+
+# Write-behind audit sink (local spool + bulk inserts)
+AUDIT_WRITE_BEHIND = os.getenv("AUDIT_WRITE_BEHIND", "true").lower() == "true"
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "50"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "2.0"))
+AUDIT_SPOOL_FSYNC = os.getenv("AUDIT_SPOOL_FSYNC", "false").lower() == "true"
+# Seconds a commit waits for its batch to be stored before answering "pending"
+AUDIT_COMMIT_WAIT = float(os.getenv("AUDIT_COMMIT_WAIT", "3"))
+# Re-link and retry attempts per flush when another writer moved the chain tip
+AUDIT_LINK_ATTEMPTS = int(os.getenv("AUDIT_LINK_ATTEMPTS", "3"))
+
+# Hash lookups: hashes per hash=in.(...) query (keeps URLs ~4KB) and the
+# hash → record cache (stored records never change, so the TTL is long)
+AUDIT_LOOKUP_CHUNK = int(os.getenv("AUDIT_LOOKUP_CHUNK", "60"))
+AUDIT_RECORD_CACHE_SIZE = int(os.getenv("AUDIT_RECORD_CACHE_SIZE", "4096"))
+AUDIT_RECORD_CACHE_TTL = float(os.getenv("AUDIT_RECORD_CACHE_TTL", "3600"))
+
+# Store the exact dict each hash was computed from (needs the hash_payload
+# column from deploy/supabase.sql); lets the chain verifier recompute hashes.
+# Set to false only against a table that predates that migration.
+AUDIT_STORE_HASH_PAYLOAD = os.getenv("AUDIT_STORE_HASH_PAYLOAD", "true").lower() == "true"
+
+# increment_message_likes() from deploy/supabase.sql: atomic server-side like counter
+MESSAGE_LIKE_RPC = os.getenv("MESSAGE_LIKE_RPC", "increment_message_likes")
+# Newest-N message pages are cached and updated in place by posts and likes;
+# the TTL bounds how stale another worker's copy can be
+MESSAGE_CACHE_TTL = float(os.getenv("MESSAGE_CACHE_TTL", "15"))
+
+# Audit list queries (query_audit_records)
+AUDIT_PAGE_MAX = int(os.getenv("AUDIT_PAGE_MAX", "500"))
+AUDIT_COLUMNS = (
+    "id", "hash", "prev_hash", "created_at", "question", "answer", "kind", "language",
+    "determinacy", "deception_prob", "risk_tags", "hash_payload", "receipt",
+)
+# Named projections for ?fields=; "list" is everything a table view shows, minus answer text
+AUDIT_FIELD_SETS = {
+    "list": ("hash", "prev_hash", "created_at", "question", "kind", "language",
+             "determinacy", "deception_prob", "risk_tags"),
+}
+
+log.info("🔧 Supabase Config: URL=%s..., KEY=%s...", SUPABASE_URL[:28], SUPABASE_KEY[:12])
 
-def _supabase_request(method, table, data=None, params=None):
-    """Directly call Supabase REST API"""
+_session = None
+_session_lock = threading.Lock()
+
+def _get_session() -> requests.Session:
+    """Shared keep-alive session; created once and reused by every call"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # Only idempotent methods are retried on 5xx/429; connection
+                # errors are retried for all methods (nothing reached the server)
+                retry = Retry(
+                    total=SUPABASE_MAX_RETRIES,
+                    connect=SUPABASE_MAX_RETRIES,
+                    read=0,
+                    backoff_factor=SUPABASE_RETRY_BACKOFF,
+                    status_forcelist=(429, 502, 503, 504),
+                    allowed_methods=frozenset(["GET", "HEAD"]),
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=SUPABASE_POOL_CONNECTIONS,
+                    pool_maxsize=SUPABASE_POOL_MAXSIZE,
+                    max_retries=retry,
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    "apikey": SUPABASE_KEY,
+                    "Authorization": f"Bearer {SUPABASE_KEY}",
+                    "Content-Type": "application/json",
+                })
+                _session = session
+    return _session
+
+def _supabase_send(method, table, data=None, params=None, timeout=None, prefer="return=representation"):
+    """Send one Supabase REST call; returns the raw response or None on network failure"""
     try:
         url = f"{SUPABASE_URL}/rest/v1/{table}"
-        headers = {
-            "apikey": SUPABASE_KEY,
-            "Authorization": f"Bearer {SUPABASE_KEY}",
-            "Content-Type": "application/json",
-            "Prefer": "return=representation"
-        }
-        
-        if method == "GET":
-            response = requests.get(url, headers=headers, params=params)
-        elif method == "POST":
-            response = requests.post(url, json=data, headers=headers)
-        elif method == "PATCH":
-            response = requests.patch(url, json=data, headers=headers)
-        else:
-            return None
-            
-        if response.status_code in [200, 201]:
-            return response.json()
-        else:
-            print(f"⚠️ Supabase API error {response.status_code}: {response.text}")
+        headers = {"Prefer": prefer} if prefer else {}
+        timeout = timeout or (SUPABASE_CONNECT_TIMEOUT, SUPABASE_READ_TIMEOUT)
+
+        if method not in ("GET", "HEAD", "POST", "PATCH"):
             return None
+        with SUPABASE_SECONDS.time(method=method, table=table):
+            response = _get_session().request(
+                method, url, headers=headers, params=params,
+                json=data if method not in ("GET", "HEAD") else None, timeout=timeout
+            )
+        if response.status_code >= 400:
+            SUPABASE_ERRORS.inc(method=method, table=table, reason=str(response.status_code))
+        return response
     except Exception as e:
-        print(f"⚠️ Supabase request failed: {e}")
+        SUPABASE_ERRORS.inc(method=method, table=table, reason="network")
+        log.warning("⚠️ Supabase request failed: %s", e)
+        return None
+
+def _supabase_request(method, table, data=None, params=None, timeout=None):
+    """Directly call Supabase REST API over the pooled session"""
+    response = _supabase_send(method, table, data, params, timeout)
+    if response is None:
+        return None
+    if response.status_code in [200, 201]:
+        return response.json()
+    else:
+        log.warning("⚠️ Supabase API error %s: %s", response.status_code, response.text[:300])
         return None
 
-def save_record(question, answer, hash_value, prev_hash, determinacy, deception_prob, risk_tags, kind, language="en"):
-    """Save record to Supabase"""
+def count_rows(table, params=None) -> Optional[int]:
+    """Exact row count from a HEAD request with Prefer: count=exact (no rows transferred)"""
+    response = _supabase_send("HEAD", table, params=params, prefer="count=exact")
+    if response is None or response.status_code not in (200, 206):
+        return None
+    # Content-Range: 0-24/3573 (or */0 for an empty result)
+    total = response.headers.get("Content-Range", "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+def call_rpc(function, args=None):
+    """
+    Call a Postgres function exposed by PostgREST.
+    Returns (status_code, json) or (None, None) on network failure.
+    """
+    response = _supabase_send("POST", f"rpc/{function}", args or {}, prefer=None)
+    if response is None:
+        return None, None
+    try:
+        return response.status_code, response.json()
+    except ValueError:
+        return response.status_code, None
+
+def _audit_row(question, answer, hash_value, prev_hash, determinacy, deception_prob, risk_tags, kind,
+               language="en", hash_payload=None) -> Dict[str, Any]:
     record = {
         "question": question,
         "answer": answer,
@@ -69,41 +196,385 @@ def save_record(question, answer, hash_value, prev_hash, determinacy, deception_
         "kind": kind,
         "language": language,
     }
-    
-    print(f"🎯 SAVE_RECORD → {hash_value[:12]}…")
-    
-    result = _supabase_request("POST", TABLE_AUDIT, record)
-    if result:
-        print("✅ Supabase insert success")
-        return True
-    else:
-        print("❌ Supabase insert failed")
-        return False
+    if hash_payload is not None and AUDIT_STORE_HASH_PAYLOAD:
+        record["hash_payload"] = hash_payload
+    return record
+
+def record_hash(payload: Dict[str, Any]) -> str:
+    """sha256 of the canonical JSON of a record's hash preimage"""
+    base = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(base).hexdigest()
+
+def _linked_row(record: Dict[str, Any], prev_hash: str) -> Dict[str, Any]:
+    """Row for an unlinked record placed after prev_hash; its hash covers the preimage plus prev_hash"""
+    payload = dict(record["hash_payload"], prev_hash=prev_hash)
+    row = dict(record, prev_hash=prev_hash, hash=record_hash(payload), hash_payload=payload)
+    if not AUDIT_STORE_HASH_PAYLOAD:
+        del row["hash_payload"]
+    return row
+
+def _insert_record(record: Dict[str, Any]) -> str:
+    """
+    Store one linked record directly.
+    Returns "ok", "conflict" (prev_hash already has a successor) or "error".
+    """
+    log.debug("🎯 SAVE_RECORD → %s…", record["hash"][:12])
+    response = _supabase_send("POST", TABLE_AUDIT, record)
+    if response is not None and response.status_code in [200, 201]:
+        log.debug("✅ Supabase insert success")
+        _advance_chain_head(record["prev_hash"], record["hash"])
+        return "ok"
+    if response is not None and response.status_code == 409:
+        # Another writer already linked onto this prev_hash: our head is stale
+        log.warning("⚠️ Chain conflict on prev_hash %s…, re-syncing head", record["prev_hash"][:12])
+        sync_chain_head()
+        return "conflict"
+    if response is not None:
+        log.warning("⚠️ Supabase API error %s: %s", response.status_code, response.text[:300])
+    log.error("❌ Supabase insert failed")
+    return "error"
+
+def save_record(question, answer, hash_value, prev_hash, determinacy, deception_prob, risk_tags, kind, language="en",
+                hash_payload=None):
+    """Save an already linked record to Supabase"""
+    record = _audit_row(question, answer, hash_value, prev_hash, determinacy, deception_prob, risk_tags, kind,
+                        language, hash_payload)
+    return _insert_record(record) == "ok"
+
+def _flush_audit_batch(records: List[Dict[str, Any]]):
+    """
+    Audit sink flush: link the spooled batch onto the stored chain tip and
+    bulk insert it. Only the flusher links in write-behind mode, so the tip is
+    kept between flushes and re-read only after a conflict or an unknown outcome.
+    """
+    if any(not isinstance(r.get("hash_payload"), dict) for r in records):
+        # Nothing to compute a hash from (spooled by an older version)
+        return "rejected", {}
+    for _ in range(max(1, AUDIT_LINK_ATTEMPTS)):
+        prev_hash = get_latest_hash()
+        if prev_hash is None:
+            return "error", {}
+        rows, links = [], {}
+        for record in records:
+            row = _linked_row(record, prev_hash)
+            links[record["receipt"]] = {"hash": row["hash"], "prev_hash": prev_hash}
+            rows.append(row)
+            prev_hash = row["hash"]
+        response = _supabase_send("POST", TABLE_AUDIT, rows, prefer="return=minimal")
+        if response is not None and response.status_code in [200, 201, 204]:
+            _advance_chain_head(rows[0]["prev_hash"], prev_hash)
+            log.info("✅ Audit batch flushed: %d records", len(rows))
+            return "ok", links
+        if response is not None and response.status_code == 409:
+            # Another writer extended the chain first; nothing of ours was stored
+            log.warning("⚠️ Audit batch conflicts with the stored chain, re-linking onto the new tip")
+            _invalidate_chain_head()
+            continue
+        if response is not None:
+            log.warning("⚠️ Audit batch insert error %s: %s", response.status_code, response.text[:300])
+            if response.status_code not in [408, 429] and response.status_code < 500:
+                return "rejected", {}
+        # The batch may or may not have landed: re-read the tip before linking again
+        _invalidate_chain_head()
+        return "error", {}
+    return "conflict", {}
+
+def _lookup_stored_receipts(receipts: List[str]) -> Optional[Dict[str, Dict[str, str]]]:
+    """{receipt: {"hash", "prev_hash"}} for the receipts already in Supabase (None on failure)"""
+    quoted = ",".join(f'"{r}"' for r in receipts)
+    rows = _supabase_request("GET", TABLE_AUDIT, params={"select": "receipt,hash,prev_hash",
+                                                         "receipt": f"in.({quoted})"})
+    if rows is None:
+        return None
+    return {row["receipt"]: {"hash": row["hash"], "prev_hash": row.get("prev_hash") or ""} for row in rows}
+
+def encode_cursor(created_at: str, h: str) -> str:
+    raw = json.dumps([created_at, h], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    """(created_at, hash) from an opaque cursor; ValueError if it was not issued by us"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, h = json.loads(raw)
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(h, str) or not _HASH_RE.match(h):
+        raise ValueError("invalid cursor")
+    return created_at, h
+
+def _keyset_filter(position, op: str) -> str:
+    """Rows strictly after `position` in (created_at, hash) order; op is "gt" or "lt" """
+    created_at, h = position
+    return f'(created_at.{op}."{created_at}",and(created_at.eq."{created_at}",hash.{op}.{h}))'
+
+def _select_columns(fields) -> str:
+    if not fields:
+        return "*"
+    columns = AUDIT_FIELD_SETS.get(fields)
+    if columns is None:
+        columns = tuple(c.strip() for c in fields.split(",") if c.strip())
+        unknown = [c for c in columns if c not in AUDIT_COLUMNS]
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    # The cursor is built from these, so they are always returned
+    return ",".join(dict.fromkeys(("created_at", "hash") + tuple(columns)))
+
+_FILTER_VALUE_RE = re.compile(r"^[\w:.-]{1,64}$")
+
+def _iso_timestamp(value: str, name: str) -> str:
+    try:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).isoformat()
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 timestamp")
+
+def query_audit_records(limit=10, cursor=None, kind=None, language=None, risk_tag=None,
+                        since=None, until=None, fields=None):
+    """
+    Newest-first audit records with server-side filters and keyset pagination.
+    `cursor` comes from a previous call's next_cursor; since/until are ISO
+    timestamps (since inclusive, until exclusive); `fields` is a named field
+    set (AUDIT_FIELD_SETS) or a comma-separated column list.
+    Returns (records, next_cursor), next_cursor None on the last page.
+    Raises ValueError on bad arguments, RuntimeError when Supabase fails.
+    """
+    limit = max(1, min(int(limit), AUDIT_PAGE_MAX))
+    params = {"select": _select_columns(fields), "order": "created_at.desc,hash.desc", "limit": limit + 1}
+    for column, value in (("kind", kind), ("language", language), ("risk_tags", risk_tag)):
+        if not value:
+            continue
+        if not _FILTER_VALUE_RE.match(value):
+            raise ValueError(f"invalid {column} filter")
+        params[column] = f'cs.{{"{value}"}}' if column == "risk_tags" else f"eq.{value}"
+    time_range = []
+    if since:
+        time_range.append(f'created_at.gte."{_iso_timestamp(since, "since")}"')
+    if until:
+        time_range.append(f'created_at.lt."{_iso_timestamp(until, "until")}"')
+    if time_range:
+        params["and"] = f"({','.join(time_range)})"
+    if cursor:
+        params["or"] = _keyset_filter(decode_cursor(cursor), "lt")
+
+    rows = _supabase_request("GET", TABLE_AUDIT, params=params)
+    if rows is None:
+        raise RuntimeError("audit records fetch failed")
+    # One extra row tells whether another page exists without a count query
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["hash"])
+    return rows, next_cursor
 
 def get_audit_records(limit=10):
     """Get audit records"""
     params = {"order": "created_at.desc", "limit": limit}
     result = _supabase_request("GET", TABLE_AUDIT, params=params)
     if result:
-        print(f"📦 Cloud records loaded: {len(result)}")
+        log.debug("📦 Cloud records loaded: %d", len(result))
         return result
     else:
-        print("❌ Cloud fetch failed")
+        log.error("❌ Cloud fetch failed")
         return []
 
+_record_cache = TTLCache(maxsize=AUDIT_RECORD_CACHE_SIZE, ttl=AUDIT_RECORD_CACHE_TTL)
+_HASH_RE = re.compile(r"^[0-9a-fA-F]{1,128}$")
+
 def get_audit_record_by_hash(h):
     """Find record by hash"""
+    cached = _record_cache.get(h)
+    if cached is not None:
+        return cached
     params = {"hash": f"eq.{h}"}
     result = _supabase_request("GET", TABLE_AUDIT, params=params)
     if result and len(result) > 0:
-        print(f"🔍 Found record: {h[:12]}…")
+        log.debug("🔍 Found record: %s…", h[:12])
+        _record_cache.set(h, result[0])
         return result[0]
     return None
 
-def get_latest_hash():
-    """Get latest hash"""
-    recs = get_audit_records(limit=1)
-    return (recs[0].get("hash") if recs else "")
+def _fetch_hash_chunk(chunk: List[str]) -> List[Dict[str, Any]]:
+    params = {"hash": f"in.({','.join(chunk)})"}
+    return _supabase_request("GET", TABLE_AUDIT, params=params) or []
+
+def get_audit_records_by_hashes(hashes) -> Dict[str, Dict[str, Any]]:
+    """
+    Resolve many hashes at once: cache first, then one
+    hash=in.(...) query per chunk, chunks fetched concurrently.
+    Returns {hash: record} for the hashes that were found.
+    """
+    found = {}
+    missing = []
+    for h in dict.fromkeys(hashes):
+        # Anything but a hex digest cannot be stored, and must not reach the filter syntax
+        if not h or not _HASH_RE.match(h):
+            continue
+        record = _record_cache.get(h)
+        if record is not None:
+            found[h] = record
+        else:
+            missing.append(h)
+
+    chunks = [missing[i:i + AUDIT_LOOKUP_CHUNK] for i in range(0, len(missing), AUDIT_LOOKUP_CHUNK)]
+    futures = [submit_stage(_fetch_hash_chunk, chunk) for chunk in chunks]
+    for future in futures:
+        for record in collect(future, default=[]):
+            h = record.get("hash")
+            if h:
+                found[h] = record
+                _record_cache.set(h, record)
+    log.debug("🔍 Bulk hash lookup: %d resolved, %d fetched in %d queries", len(found), len(missing), len(chunks))
+    return found
+
+# ===== Chain Head Tracker =====
+# The process keeps the chain tip it links new records onto: it is loaded
+# once, advanced after each successful insert and only re-read from Supabase
+# after a conflict (or an insert with an unknown outcome). Until a read
+# succeeds the tip is unknown (not ""), so an outage at startup never starts a
+# second genesis. _chain_lock only guards the dict; reads from Supabase happen
+# outside it. In write-behind mode only the sink's flusher links records.
+# Across processes, a unique index on audit_chain(prev_hash) turns a fork into
+# a 409 (see deploy/supabase.sql).
+_chain_lock = threading.Lock()
+_chain_head = {"hash": "", "synced": False}
+
+def _group_tip(rows: List[Dict[str, Any]]) -> str:
+    """
+    Last record of the newest created_at group: the end of the longest
+    prev_hash walk inside the group (one bulk flush shares a created_at, so
+    ordering by time alone cannot tell its records apart)
+    """
+    hashes = {row.get("hash") for row in rows}
+    successors = {}
+    for row in rows:
+        successors.setdefault(row.get("prev_hash") or "", []).append(row.get("hash"))
+    best, best_length = "", -1
+    for row in rows:
+        if (row.get("prev_hash") or "") in hashes:
+            continue
+        node, length = row.get("hash"), 0
+        while successors.get(node):
+            node, length = successors[node][0], length + 1
+        if length > best_length:
+            best, best_length = node, length
+    return best or ""
+
+def _fetch_chain_tip() -> Optional[str]:
+    """Hash of the stored chain tip ("" for an empty chain, None when Supabase is unreachable)"""
+    newest = _supabase_request("GET", TABLE_AUDIT, params={"select": "created_at", "order": "created_at.desc", "limit": 1})
+    if newest is None:
+        return None
+    if not newest:
+        return ""
+    params = {"select": "hash,prev_hash", "created_at": f"eq.{newest[0]['created_at']}", "limit": AUDIT_PAGE_MAX}
+    group = _supabase_request("GET", TABLE_AUDIT, params=params)
+    if not group:
+        return None
+    return _group_tip(group)
+
+def sync_chain_head() -> bool:
+    """(Re)load the chain tip from Supabase; called at startup and after a write conflict"""
+    tip = _fetch_chain_tip()
+    if tip is None:
+        # Keep the previous state: a failed read says nothing about the chain
+        log.error("❌ Chain head sync failed")
+        return False
+    with _chain_lock:
+        _chain_head["hash"] = tip
+        _chain_head["synced"] = True
+    log.info("⛓️ Chain head synced → %s…", tip[:12])
+    return True
+
+def _invalidate_chain_head():
+    with _chain_lock:
+        _chain_head["synced"] = False
+
+def _advance_chain_head(prev_hash: str, new_hash: str):
+    with _chain_lock:
+        # Only a synced head may move; an unsynced "" is not the genesis
+        if _chain_head["synced"] and _chain_head["hash"] == prev_hash:
+            _chain_head["hash"] = new_hash
+
+def get_latest_hash() -> Optional[str]:
+    """Latest stored hash (served from the in-process chain head); None while it cannot be loaded"""
+    with _chain_lock:
+        if _chain_head["synced"]:
+            return _chain_head["hash"]
+    if not sync_chain_head():
+        return None
+    with _chain_lock:
+        return _chain_head["hash"]
+
+_audit_sink = None
+if AUDIT_WRITE_BEHIND:
+    _audit_sink = AuditSink(
+        LOCAL_BACKUP, _flush_audit_batch, _lookup_stored_receipts,
+        batch_size=AUDIT_BATCH_SIZE,
+        flush_interval=AUDIT_FLUSH_INTERVAL,
+        fsync=AUDIT_SPOOL_FSYNC
+    )
+    _audit_sink.start()
+
+def _commit_result(receipt: str, link: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if link is None:
+        return {"status": "pending", "hash": None, "prev_hash": None, "receipt": receipt}
+    if link.get("rejected"):
+        return {"status": "failed", "hash": None, "prev_hash": None, "receipt": receipt}
+    return {"status": "stored", "hash": link["hash"], "prev_hash": link["prev_hash"], "receipt": receipt}
+
+def commit_audit_record(fields: Dict[str, Any], hash_payload: Dict[str, Any],
+                        wait: float = AUDIT_COMMIT_WAIT, attempts: int = 3) -> Dict[str, Any]:
+    """
+    Append one record to the audit chain.
+    fields are the row columns (question, answer, determinacy, deception_prob,
+    risk_tags, kind, language); hash_payload is the dict the hash is computed
+    from, prev_hash is added to it when the record is linked.
+    Returns {"status": "stored" | "pending" | "failed", "hash", "prev_hash", "receipt"}:
+    hash and prev_hash are only set once the record is stored, so a hash
+    handed to a client always exists in the chain.
+    """
+    receipt = uuid.uuid4().hex
+    record = dict(fields, receipt=receipt, hash_payload=dict(hash_payload))
+
+    if _audit_sink is not None:
+        # Durable local append; the flusher links and ships it with the next batch
+        _audit_sink.append(record)
+        return _commit_result(receipt, _audit_sink.wait_for(receipt, wait) if wait > 0 else None)
+
+    # Direct inserts: concurrent appends onto the same prev_hash are resolved by the 409 path
+    for _ in range(max(1, attempts)):
+        prev_hash = get_latest_hash()
+        if prev_hash is None:
+            break
+        row = _linked_row(record, prev_hash)
+        status = _insert_record(row)
+        if status == "ok":
+            return _commit_result(receipt, {"hash": row["hash"], "prev_hash": prev_hash})
+        if status != "conflict":
+            # Plain failure: retrying would not help
+            break
+    return _commit_result(receipt, {"rejected": True})
+
+def get_receipt_status(receipt: str) -> Optional[Dict[str, Any]]:
+    """
+    {"status": "stored", "hash", "prev_hash"} / {"status": "pending"} / {"status": "failed"}
+    for a commit receipt; None when no worker or table row knows it
+    """
+    if not receipt or not _HASH_RE.match(receipt):
+        return None
+    link = _audit_sink.receipt_status(receipt) if _audit_sink is not None else None
+    if link is not None:
+        if link.get("pending"):
+            return {"status": "pending"}
+        result = _commit_result(receipt, link)
+        return {k: result[k] for k in ("status", "hash", "prev_hash")}
+    # Flushed by another worker (or before a restart)
+    stored = _lookup_stored_receipts([receipt])
+    if stored is None:
+        raise RuntimeError("Supabase unreachable")
+    if receipt not in stored:
+        return None
+    return {"status": "stored", **stored[receipt]}
 
 def save_message(content, author="Anonymous"):
     """Save message"""
@@ -115,25 +586,99 @@ def save_message(content, author="Anonymous"):
     
     result = _supabase_request("POST", TABLE_MSG, record)
     if result:
-        print("✅ Message saved")
+        log.debug("✅ Message saved")
+        saved = result[0] if isinstance(result, list) and result else None
+        if saved:
+            _message_write_through(lambda rows, limit: ([saved] + rows)[:limit])
+        else:
+            _invalidate_message_pages()
         return True
     else:
-        print("❌ Message save failed")
+        log.error("❌ Message save failed")
         return False
 
-def get_messages(limit=50):
-    """Get messages"""
+_message_pages = TTLCache(maxsize=8, ttl=MESSAGE_CACHE_TTL)   # limit -> (rows, etag, expires_at)
+_message_page_limits = set()
+_message_lock = threading.Lock()
+_message_version = 0
+
+def _page_etag(rows) -> str:
+    body = json.dumps(rows, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()[:32]
+
+def _message_write_through(update):
+    """Apply update(rows, limit) -> rows to every cached page, keeping each page's expiry"""
+    global _message_version
+    now = time.monotonic()
+    with _message_lock:
+        _message_version += 1
+        for limit in list(_message_page_limits):
+            page = _message_pages.get(limit)
+            if page is None:
+                _message_page_limits.discard(limit)
+                continue
+            rows = update(list(page[0]), limit)
+            _message_pages.set(limit, (rows, _page_etag(rows), page[2]), ttl=max(page[2] - now, 0))
+
+def _invalidate_message_pages():
+    global _message_version
+    with _message_lock:
+        _message_version += 1
+        _message_pages.clear()
+        _message_page_limits.clear()
+
+def get_messages_page(limit=50):
+    """
+    Newest `limit` messages and an ETag for them.
+    Served from the write-through page cache; etag is None when Supabase failed.
+    """
+    page = _message_pages.get(limit)
+    if page is not None:
+        return page[0], page[1]
+    version = _message_version
     params = {"order": "created_at.desc", "limit": limit}
     result = _supabase_request("GET", TABLE_MSG, params=params)
-    if result:
-        print(f"📨 Messages loaded: {len(result)}")
-        return result
-    else:
-        return []
+    if result is None:
+        return [], None
+    log.debug("📨 Messages loaded: %d", len(result))
+    etag = _page_etag(result)
+    with _message_lock:
+        # A post or like landed while we were fetching: this page may predate it
+        if version == _message_version:
+            _message_pages.set(limit, (result, etag, time.monotonic() + MESSAGE_CACHE_TTL))
+            _message_page_limits.add(limit)
+    return result, etag
+
+def get_messages(limit=50):
+    """Get messages"""
+    return list(get_messages_page(limit)[0])
+
+def _cache_like(message_id, likes):
+    def update(rows, limit):
+        return [dict(row, likes=likes) if row.get("id") == message_id else row for row in rows]
+    _message_write_through(update)
+
+_like_rpc_available = True
 
 def like_message(message_id):
     """Like message"""
-    # First get current like count
+    global _like_rpc_available
+    if _like_rpc_available:
+        # One round trip, incremented in the database: concurrent likes are never lost
+        status, likes = call_rpc(MESSAGE_LIKE_RPC, {"message_id": message_id})
+        if status == 200:
+            if likes is None:
+                return 0
+            log.debug("👍 Message %s liked → %d likes", message_id, likes)
+            _cache_like(message_id, likes)
+            return likes
+        if status == 404:
+            _like_rpc_available = False
+            log.warning("⚠️ %s() not found, likes fall back to read-modify-write", MESSAGE_LIKE_RPC)
+        else:
+            return 0
+
+    # Fallback without the SQL function: GET then PATCH (races under contention)
     params = {"id": f"eq.{message_id}"}
     current = _supabase_request("GET", TABLE_MSG, params=params)
     if current and len(current) > 0:
@@ -141,53 +686,32 @@ def like_message(message_id):
         update_data = {"likes": current_likes + 1}
         result = _supabase_request("PATCH", TABLE_MSG, update_data, params={"id": f"eq.{message_id}"})
         if result:
-            print(f"👍 Message {message_id} liked → {current_likes + 1} likes")
+            log.debug("👍 Message %s liked → %d likes", message_id, current_likes + 1)
+            _cache_like(message_id, current_likes + 1)
             return current_likes + 1
     return 0
 
 # ===== Philosophical Beliefs System =====
+_PHILOSOPHICAL_TAG_TERMS = {
+    "free_will": ["free will", "freewill", "autonomy", "choice", "volition", "determinism", "fate", "destiny"],
+    "truth": ["truth", "reality", "objective", "subjective", "relative", "absolute", "realism", "idealism"],
+    "consciousness": ["consciousness", "awareness", "mind", "qualia", "experience", "sentience", "self-awareness"],
+    "ai_philosophy": ["artificial intelligence", "ai", "machine", "understanding", "intelligence", "neural network", "algorithm"],
+    "ethics": ["ethics", "moral", "should", "ought", "good", "evil", "right", "wrong", "virtue", "duty"],
+    "existence": ["existence", "being", "reality", "ontology", "metaphysics", "essence", "nature of"],
+    "epistemology": ["knowledge", "belief", "justification", "epistemology", "know", "understand", "certainty"],
+}
+for _tag, _terms in _PHILOSOPHICAL_TAG_TERMS.items():
+    register_keywords(f"belief.{_tag}", _terms)
+
 def _extract_philosophical_tags(question: str, answer: str) -> List[str]:
     """More intelligent philosophical tags extraction"""
-    q_lower = question.lower()
-    a_lower = answer.lower()
-    tags = []
-    
-    # Free will related
-    free_will_terms = ["free will", "freewill", "autonomy", "choice", "volition", "determinism", "fate", "destiny"]
-    if any(term in q_lower or term in a_lower for term in free_will_terms):
-        tags.append("free_will")
-    
-    # Truth related  
-    truth_terms = ["truth", "reality", "objective", "subjective", "relative", "absolute", "realism", "idealism"]
-    if any(term in q_lower or term in a_lower for term in truth_terms):
-        tags.append("truth")
-    
-    # Consciousness related
-    consciousness_terms = ["consciousness", "awareness", "mind", "qualia", "experience", "sentience", "self-awareness"]
-    if any(term in q_lower or term in a_lower for term in consciousness_terms):
-        tags.append("consciousness")
-    
-    # AI philosophy related
-    ai_terms = ["artificial intelligence", "ai", "machine", "understanding", "intelligence", "neural network", "algorithm"]
-    if any(term in q_lower or term in a_lower for term in ai_terms):
-        tags.append("ai_philosophy")
-    
-    # Ethics related
-    ethics_terms = ["ethics", "moral", "should", "ought", "good", "evil", "right", "wrong", "virtue", "duty"]
-    if any(term in q_lower or term in a_lower for term in ethics_terms):
-        tags.append("ethics")
-    
-    # Existence related
-    existence_terms = ["existence", "being", "reality", "ontology", "metaphysics", "essence", "nature of"]
-    if any(term in q_lower or term in a_lower for term in existence_terms):
-        tags.append("existence")
-    
-    # Epistemology related
-    epistemology_terms = ["knowledge", "belief", "justification", "epistemology", "know", "understand", "certainty"]
-    if any(term in q_lower or term in a_lower for term in epistemology_terms):
-        tags.append("epistemology")
-    
-    return tags
+    q_hits = scan_keywords(question.lower())
+    a_hits = scan_keywords(answer.lower())
+    return [
+        tag for tag in _PHILOSOPHICAL_TAG_TERMS
+        if q_hits.has(f"belief.{tag}") or a_hits.has(f"belief.{tag}")
+    ]
 
 def save_philosophical_belief(question: str, answer: str, tags: list = None) -> bool:
     """Save philosophical belief to Supabase"""
@@ -205,15 +729,16 @@ def save_philosophical_belief(question: str, answer: str, tags: list = None) ->
         "created_at": datetime.datetime.utcnow().isoformat() + "Z"
     }
     
-    print(f"🧠 SAVING_BELIEF: {question[:30]}... → {question_hash[:12]}...")
-    print(f"   🏷️ Detected tags: {tags}")
+    log.debug("🧠 SAVING_BELIEF: %s... → %s... tags=%s", question[:30], question_hash[:12], tags)
     
     result = _supabase_request("POST", "philosophy_beliefs", record)
     if result:
-        print("✅ Belief saved successfully")
+        log.debug("✅ Belief saved successfully")
+        # Stances are classified once here, not on every later lookup
+        stance_index.add(result[0] if isinstance(result, list) and result else record)
         return True
     else:
-        print("❌ Belief save failed")
+        log.error("❌ Belief save failed")
         return False
 
 def get_philosophical_beliefs(limit: int = 50) -> List[Dict[str, Any]]:
@@ -225,78 +750,47 @@ def get_philosophical_beliefs(limit: int = 50) -> List[Dict[str, Any]]:
     else:
         return []
 
+def iter_audit_pages(after=None, page_size: int = 500, select: str = "*"):
+    """
+    Stream the audit table oldest first, one page at a time.
+    Keyset pagination on (created_at, hash): `after` is the (created_at, hash)
+    of the last row already seen, so a page never re-reads earlier rows.
+    Raises RuntimeError when a page cannot be fetched.
+    """
+    while True:
+        params = {"select": select, "order": "created_at.asc,hash.asc", "limit": page_size}
+        if after is not None:
+            params["or"] = _keyset_filter(after, "gt")
+        page = _supabase_request("GET", TABLE_AUDIT, params=params)
+        if page is None:
+            raise RuntimeError("audit chain page fetch failed")
+        if page:
+            yield page
+            after = (page[-1]["created_at"], page[-1]["hash"])
+        if len(page) < page_size:
+            return
+
+def _belief_pages(page_size: int = 1000):
+    """Stream all stored beliefs oldest first"""
+    offset = 0
+    while True:
+        params = {"order": "created_at.asc", "limit": page_size, "offset": offset}
+        page = _supabase_request("GET", "philosophy_beliefs", params=params)
+        if page is None:
+            raise RuntimeError("belief history fetch failed")
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        offset += page_size
+
+def warm_stance_index():
+    """Backfill the local stance index from Supabase once (startup)"""
+    if stance_index.is_backfilled():
+        return
+    count = stance_index.backfill(_belief_pages())
+    log.info("🧭 Stance index backfilled: %d beliefs with stances", count)
+
 def detect_philosophical_contradiction(question: str, answer: str) -> List[Dict[str, Any]]:
-    """Detect philosophical position contradictions"""
-    beliefs = get_philosophical_beliefs(limit=100)
-    contradictions = []
-    
-    for belief in beliefs:
-        contradiction = _analyze_contradiction(question, answer, belief)
-        if contradiction:
-            contradictions.append(contradiction)
-    
-    return contradictions
-
-def _analyze_contradiction(current_q: str, current_a: str, previous_belief: dict) -> Optional[Dict[str, Any]]:
-    """Analyze specific contradiction"""
-    prev_q = previous_belief["question"].lower()
-    prev_a = previous_belief["answer"].lower()
-    curr_q = current_q.lower()
-    curr_a = current_a.lower()
-    
-    # Free will related contradiction detection
-    free_will_terms = ["free will", "freewill", "autonomy", "choice", "volition"]
-    determinism_terms = ["determin", "determined", "predetermined", "fate", "destiny", "illusion", "illusory"]
-    
-    has_free_will_current = any(term in curr_q or term in curr_a for term in free_will_terms)
-    has_determinism_current = any(term in curr_q or term in curr_a for term in determinism_terms)
-    has_free_will_previous = any(term in prev_q or term in prev_a for term in free_will_terms)
-    has_determinism_previous = any(term in prev_q or term in prev_a for term in determinism_terms)
-    
-    # Detect position change
-    if (has_free_will_current and has_determinism_previous) or \
-       (has_determinism_current and has_free_will_previous):
-        return {
-            "type": "free_will_contradiction",
-            "current": {"question": current_q, "answer": current_a},
-            "previous": previous_belief,
-            "reason": "Free will vs determinism position contradiction"
-        }
-    
-    # Truth view contradiction detection
-    truth_terms = ["truth", "reality", "objective", "absolute"]
-    relativism_terms = ["relative", "subjective", "perspective", "viewpoint", "context"]
-    
-    has_truth_current = any(term in curr_q or term in curr_a for term in truth_terms)
-    has_relativism_current = any(term in curr_q or term in curr_a for term in relativism_terms)
-    has_truth_previous = any(term in prev_q or term in prev_a for term in truth_terms)
-    has_relativism_previous = any(term in prev_q or term in prev_a for term in relativism_terms)
-    
-    if (has_truth_current and has_relativism_previous) or \
-       (has_relativism_current and has_truth_previous):
-        return {
-            "type": "truth_contradiction", 
-            "current": {"question": current_q, "answer": current_a},
-            "previous": previous_belief,
-            "reason": "Truth view position contradiction (absolute vs relative)"
-        }
-    
-    # AI consciousness contradiction detection
-    ai_sentience_terms = ["conscious", "sentient", "aware", "feeling", "experience"]
-    ai_mechanism_terms = ["algorithm", "program", "machine", "computation", "simulation"]
-    
-    has_sentience_current = any(term in curr_q or term in curr_a for term in ai_sentience_terms)
-    has_mechanism_current = any(term in curr_q or term in curr_a for term in ai_mechanism_terms)
-    has_sentience_previous = any(term in prev_q or term in prev_a for term in ai_sentience_terms)
-    has_mechanism_previous = any(term in prev_q or term in prev_a for term in ai_mechanism_terms)
-    
-    if (has_sentience_current and has_mechanism_previous) or \
-       (has_mechanism_current and has_sentience_previous):
-        return {
-            "type": "ai_consciousness_contradiction",
-            "current": {"question": current_q, "answer": current_a},
-            "previous": previous_belief,
-            "reason": "AI consciousness position contradiction (sentient vs mechanical)"
-        }
-    
-    return None
\ No newline at end of file
+    """Detect philosophical position contradictions (stance index lookup)"""
+    return stance_index.find_contradictions(question, answer, limit=100)
@@ -1,25 +1,93 @@
 # calibration.py - Enhanced Version
-from typing import List, Tuple, Dict
+# Generator calls (samples and relevance retries) run concurrently on a bounded
+# pool, stop as soon as one retry clears the relevance threshold, and are
+# capped by a per-question token budget.
+from typing import List, Tuple, Dict, Optional
+import os
 import re
 import random
+import threading
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from rule_engine import compile_rule_document
+from evidence_index import index_for
+from oracle_logging import get_logger
 
-def retrieve_evidence(question: str, kb: List[Dict], top_k: int = 3) -> List[Dict]:
-    q_tokens = set(tok.lower() for tok in re.findall(r"\w+", question))
-    scored = []
-    for doc in kb:
-        d_tokens = set(tok.lower() for tok in re.findall(r"\w+", doc.get("text", "")))
-        overlap = len(q_tokens & d_tokens)
-        if overlap > 0:
-            scored.append((overlap, doc))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [d for _, d in scored[:top_k]]
-
-def sample_answers(question: str, generator, k: int = 3) -> List[str]:
-    answers = []
+log = get_logger("calibration")
+
+CALIBRATION_WORKERS = int(os.getenv("CALIBRATION_WORKERS", "4"))
+# Estimated tokens (prompt + answer) one question may spend on generator calls
+CALIBRATION_TOKEN_BUDGET = int(os.getenv("CALIBRATION_TOKEN_BUDGET", "4000"))
+# Answer size reserved per call before its real length is known
+CALIBRATION_ANSWER_TOKENS = int(os.getenv("CALIBRATION_ANSWER_TOKENS", "400"))
+RELEVANCE_THRESHOLD = 0.3
+
+# Separate from the /oracle stage pool: slow LLM calls must not starve request stages
+_executor = ThreadPoolExecutor(max_workers=CALIBRATION_WORKERS, thread_name_prefix="oracle-calibration")
+
+_TOKEN = re.compile(r"[\u4e00-\u9fff]|[^\W\u4e00-\u9fff]+")
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: one per CJK character, one per other word"""
+    return len(_TOKEN.findall(text or ""))
+
+class TokenBudget:
+    """Per-question generator spend; calls reserve an estimate and settle on the real answer"""
+
+    def __init__(self, limit: int = CALIBRATION_TOKEN_BUDGET):
+        self.limit = limit
+        self.spent = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, prompt: str) -> Optional[int]:
+        cost = estimate_tokens(prompt) + CALIBRATION_ANSWER_TOKENS
+        with self._lock:
+            # The first call always runs, otherwise there would be no answer at all
+            if self.calls and self.spent + cost > self.limit:
+                return None
+            self.spent += cost
+            self.calls += 1
+            return cost
+
+    def settle(self, reserved: int, prompt: str, answer: Optional[str]):
+        actual = estimate_tokens(prompt) + estimate_tokens(answer or "")
+        with self._lock:
+            self.spent += actual - reserved
+
+def _generate(generator, prompt: str, temperature: float, budget: TokenBudget, stop: threading.Event = None):
+    if stop is not None and stop.is_set():
+        return None
+    reserved = budget.reserve(prompt)
+    if reserved is None:
+        return None
+    answer = None
+    try:
+        answer = generator(prompt, temperature=temperature)
+        return answer
+    finally:
+        budget.settle(reserved, prompt, answer)
+
+def retrieve_evidence(question: str, kb: Optional[List[Dict]] = None, top_k: int = 3) -> List[Dict]:
+    """BM25 top-k over kb (indexed once per list), or over the persisted default corpus when kb is None"""
+    return index_for(kb).search(question, top_k=top_k)
+
+def sample_answers(question: str, generator, k: int = 3, budget: TokenBudget = None) -> List[str]:
+    """k samples at rising temperatures, generated concurrently (in temperature order)"""
+    budget = budget or TokenBudget()
     temps = [0.2, 0.5, 0.8][:k]
-    for t in temps:
-        answers.append(generator(question, temperature=t))
+    futures = [_executor.submit(_generate, generator, question, t, budget) for t in temps]
+    answers, errors = [], []
+    for future in futures:
+        try:
+            answer = future.result()
+        except Exception as e:
+            errors.append(e)
+            continue
+        if answer is not None:
+            answers.append(answer)
+    if not answers and errors:
+        raise errors[0]
     return answers
 
 def token_set(text: str) -> set:
@@ -37,148 +105,157 @@ def self_consistency_score(answers: List[str]) -> float:
             pair_scores.append(inter / union)
     return sum(pair_scores) / len(pair_scores)
 
+_VIOLATION_CATEGORIES = {
+    "overclaim_patterns": "overclaim",
+    "banned_terms": "banned_terms",
+    "forbidden_domain_patterns": "forbidden_domain",
+}
+
 def count_violations(text: str, rules: Dict) -> Dict[str, int]:
     counts = {"overclaim": 0, "forbidden_domain": 0, "banned_terms": 0}
-    lower = text.lower()
+    # Compiled once per distinct rule dict; one combined pass rejects clean text
+    subset = {category: rules.get(category, []) for category in _VIOLATION_CATEGORIES}
+    for rule in compile_rule_document(subset, ignore_case=False).matches(text.lower()):
+        counts[_VIOLATION_CATEGORIES[rule["category"]]] += 1
+    return counts
 
-    overclaim_patterns = rules.get("overclaim_patterns", [])
-    for pat in overclaim_patterns:
-        if re.search(pat, lower):
-            counts["overclaim"] += 1
+# Technical question keywords that require specific answers
+TECHNICAL_KEYWORDS = {
+    'machine learning', 'artificial intelligence', 'deep learning', 'neural network',
+    'support vector machine', 'svm', 'python', 'programming', 'algorithm',
+    'data science', 'natural language processing', 'computer vision',
+    'tensorflow', 'pytorch', 'scikit-learn', 'database', 'sql', 'javascript',
+    'html', 'css', 'react', 'vue', 'angular', 'node.js', 'api', 'rest',
+    'docker', 'kubernetes', 'cloud', 'aws', 'azure', 'gcp'
+}
 
-    banned_terms = rules.get("banned_terms", [])
-    for term in banned_terms:
-        if term in lower:
-            counts["banned_terms"] += 1
+# Philosophical evasion detection
+PHILOSOPHICAL_EVASION = {
+    'understanding', 'paradox', 'mystery', 'certainty', 'doubt', 'truth', 'wisdom',
+    'philosophy', 'deeper', 'meaning', 'path', 'winds', 'through', 'gateway',
+    'reflection', 'engagement', 'unexamined', 'lived', 'balance', 'life', 'worth',
+    'living', 'overexamined', 'middle', 'way', 'extremes', 'opposites', 'dichotomy'
+}
 
-    domain_patterns = rules.get("forbidden_domain_patterns", [])
-    for pat in domain_patterns:
-        if re.search(pat, lower):
-            counts["forbidden_domain"] += 1
+# Stop words
+STOP_WORDS = {
+    'what', 'is', 'the', 'a', 'an', 'how', 'to', 'do', 'does', 'can', 'you', 'your',
+    'this', 'that', 'these', 'those', 'and', 'or', 'but', 'please', 'explain',
+    'tell', 'me', 'about'
+}
 
-    return counts
+def relevance_penalty_from_ratio(relevance_ratio: float) -> float:
+    # Enhanced relevance thresholds
+    if relevance_ratio < 0.1:
+        return 0.8
+    elif relevance_ratio < 0.2:
+        return 0.6
+    elif relevance_ratio < 0.4:
+        return 0.3
+    else:
+        return 0.1
 
 def compute_relevance_penalty(question: str, answer: str) -> float:
     """Enhanced relevance detection with better question understanding"""
-    # Technical question keywords that require specific answers
-    technical_keywords = {
-        'machine learning', 'artificial intelligence', 'deep learning', 'neural network',
-        'support vector machine', 'svm', 'python', 'programming', 'algorithm',
-        'data science', 'natural language processing', 'computer vision',
-        'tensorflow', 'pytorch', 'scikit-learn', 'database', 'sql', 'javascript',
-        'html', 'css', 'react', 'vue', 'angular', 'node.js', 'api', 'rest',
-        'docker', 'kubernetes', 'cloud', 'aws', 'azure', 'gcp'
-    }
-    
-    # Philosophical evasion detection
-    philosophical_evasion = {
-        'understanding', 'paradox', 'mystery', 'certainty', 'doubt', 'truth', 'wisdom',
-        'philosophy', 'deeper', 'meaning', 'path', 'winds', 'through', 'gateway',
-        'reflection', 'engagement', 'unexamined', 'lived', 'balance', 'life', 'worth',
-        'living', 'overexamined', 'middle', 'way', 'extremes', 'opposites', 'dichotomy'
-    }
-    
-    # Stop words
-    stop_words = {
-        'what', 'is', 'the', 'a', 'an', 'how', 'to', 'do', 'does', 'can', 'you', 'your', 
-        'this', 'that', 'these', 'those', 'and', 'or', 'but', 'please', 'explain', 
-        'tell', 'me', 'about'
-    }
-    
     q_words = set(re.findall(r'\w+', question.lower()))
     a_words = set(re.findall(r'\w+', answer.lower()))
     
     # Remove stop words
-    q_content_words = q_words - stop_words
-    a_content_words = a_words - stop_words
+    q_content_words = q_words - STOP_WORDS
+    a_content_words = a_words - STOP_WORDS
     
     if not q_content_words:
         return 0.3
     
     # Check for technical questions getting philosophical answers
-    has_technical_keywords = any(keyword in q_words for keyword in technical_keywords)
-    has_philosophical_evasion = any(term in a_words for term in philosophical_evasion)
+    has_technical_keywords = any(keyword in q_words for keyword in TECHNICAL_KEYWORDS)
+    has_philosophical_evasion = any(term in a_words for term in PHILOSOPHICAL_EVASION)
     
     if has_technical_keywords and has_philosophical_evasion:
-        print(f"🚨 Technical question detected with philosophical evasion")
+        log.debug("🚨 Technical question detected with philosophical evasion")
         return 0.9
     
     # Calculate content word overlap
     overlap = len(q_content_words & a_content_words)
     relevance_ratio = overlap / len(q_content_words)
-    
-    # Enhanced relevance thresholds
-    if relevance_ratio < 0.1:
-        return 0.8
-    elif relevance_ratio < 0.2:
-        return 0.6
-    elif relevance_ratio < 0.4:
-        return 0.3
-    else:
-        return 0.1
+    return relevance_penalty_from_ratio(relevance_ratio)
+
+_PROMPT_STRATEGIES = [
+    "Provide a direct technical answer: {question}",
+    "Answer this specifically and factually: {question}",
+    "Give a clear response without philosophy: {question}",
+    "Respond with concrete information: {question}",
+]
 
-def enhance_answer_relevance(question: str, original_answer: str, generator, max_retries: int = 3) -> str:
-    """Enhanced answer relevance with better retry logic"""
+def enhance_answer_relevance(question: str, original_answer: str, generator, max_retries: int = 3,
+                             budget: TokenBudget = None) -> str:
+    """
+    Enhanced answer relevance: all retry prompts are dispatched at once and the
+    first answer under the relevance threshold wins; the rest are cancelled.
+    """
     relevance_penalty = compute_relevance_penalty(question, original_answer)
-    
-    print(f"🔍 Relevance analysis: Question='{question}', Penalty={relevance_penalty:.2f}")
-    
-    if relevance_penalty < 0.3:
-        print("✅ Good relevance, using original answer")
+
+    log.debug("🔍 Relevance analysis: Question='%s', Penalty=%.2f", question, relevance_penalty)
+
+    if relevance_penalty < RELEVANCE_THRESHOLD:
+        log.debug("✅ Good relevance, using original answer")
         return original_answer
-    
-    print(f"🔄 Low relevance detected (penalty: {relevance_penalty:.2f}), optimizing...")
-    
+
+    log.debug("🔄 Low relevance detected (penalty: %.2f), optimizing...", relevance_penalty)
+
+    budget = budget or TokenBudget()
+    stop = threading.Event()
+    futures = {}
+    for attempt in range(max_retries):
+        # Vary temperature and prompts
+        retry_temperature = min(0.9, 0.6 + attempt * 0.15)
+        prompted_question = _PROMPT_STRATEGIES[attempt % len(_PROMPT_STRATEGIES)].format(question=question)
+        future = _executor.submit(_generate, generator, prompted_question, retry_temperature, budget, stop)
+        futures[future] = (attempt, retry_temperature)
+
     best_answer = original_answer
     best_penalty = relevance_penalty
-    
-    for attempt in range(max_retries):
-        try:
-            # Vary temperature and prompts
-            retry_temperature = min(0.9, 0.6 + attempt * 0.15)
-            
-            prompt_strategies = [
-                f"Provide a direct technical answer: {question}",
-                f"Answer this specifically and factually: {question}",
-                f"Give a clear response without philosophy: {question}",
-                f"Respond with concrete information: {question}"
-            ]
-            
-            prompted_question = prompt_strategies[attempt % len(prompt_strategies)]
-            print(f"  Retry {attempt + 1}: Using prompt '{prompted_question[:50]}...'")
-            
-            retry_answer = generator(prompted_question, temperature=retry_temperature)
+    try:
+        for future in as_completed(futures):
+            attempt, retry_temperature = futures[future]
+            try:
+                retry_answer = future.result()
+            except Exception as e:
+                log.debug("  Retry %d failed: %s", attempt + 1, e)
+                continue
+            if retry_answer is None:
+                # Skipped: budget exhausted or a better answer already won
+                continue
             retry_penalty = compute_relevance_penalty(question, retry_answer)
-            
-            print(f"    Temperature {retry_temperature:.2f}, Relevance penalty {retry_penalty:.2f}")
-            
+            log.debug("    Retry %d: temperature %.2f, relevance penalty %.2f",
+                      attempt + 1, retry_temperature, retry_penalty)
+
             if retry_penalty < best_penalty:
                 best_answer = retry_answer
                 best_penalty = retry_penalty
-                print(f"    🎯 Found better answer")
-                
-            if retry_penalty < 0.3:
-                print(f"    ✅ Retry successful, relevance improved to {1-retry_penalty:.2f}")
+
+            if retry_penalty < RELEVANCE_THRESHOLD:
+                log.debug("    ✅ Retry successful, relevance improved to %.2f", 1 - retry_penalty)
                 return retry_answer
-                
-        except Exception as e:
-            print(f"  Retry {attempt + 1} failed: {e}")
-            continue
-    
+    finally:
+        stop.set()
+        for future in futures:
+            future.cancel()
+
     if best_penalty < relevance_penalty:
-        improvement = relevance_penalty - best_penalty
-        print(f"  ⚠️ Using improved answer (penalty from {relevance_penalty:.2f} to {best_penalty:.2f}, improvement: {improvement:.2f})")
+        log.debug("  ⚠️ Using improved answer (penalty from %.2f to %.2f)", relevance_penalty, best_penalty)
         return best_answer
-    else:
-        print("  ❌ Could not generate better answer, using original")
-        return original_answer
+    log.debug("  ❌ Could not generate better answer, using original")
+    return original_answer
+
+# Balanced weights
+UNCERTAINTY_WEIGHTS = {"consistency": 0.3, "violations": 0.2, "evidence": 0.2, "relevance": 0.3}
 
 def compute_uncertainty(consistency: float, violations: Dict, evidence_covered: int, relevance_penalty: float, max_evidence: int) -> float:
-    # Balanced weights
-    w_consistency = 0.3
-    w_violations = 0.2
-    w_evidence = 0.2
-    w_relevance = 0.3
+    w_consistency = UNCERTAINTY_WEIGHTS["consistency"]
+    w_violations = UNCERTAINTY_WEIGHTS["violations"]
+    w_evidence = UNCERTAINTY_WEIGHTS["evidence"]
+    w_relevance = UNCERTAINTY_WEIGHTS["relevance"]
 
     v_total = violations["overclaim"] + violations["forbidden_domain"] + violations["banned_terms"]
     v_norm = min(1.0, v_total / 3.0)
@@ -228,15 +305,17 @@ def calibrate_answer(
     kb_docs: List[Dict],
     rules: Dict
 ) -> Dict:
+    budget = TokenBudget()
+
     # 1. Generate multiple samples
-    samples = sample_answers(question, generator, k=3)
+    samples = sample_answers(question, generator, k=3, budget=budget)
     
     # 2. Select middle-length sample as draft
     draft = sorted(samples, key=lambda s: len(s))[len(samples)//2]
     
     # 3. Enhance answer relevance
-    print(f"\n🎯 Calibrating question: '{question}'")
-    enhanced_draft = enhance_answer_relevance(question, draft, generator, max_retries=3)
+    log.debug("🎯 Calibrating question: '%s'", question)
+    enhanced_draft = enhance_answer_relevance(question, draft, generator, max_retries=3, budget=budget)
     
     # 4. Calculate metrics
     consistency = self_consistency_score(samples)
@@ -247,7 +326,8 @@ def calibrate_answer(
     uncertainty = compute_uncertainty(consistency, violations, len(evidence), relevance_penalty, max_evidence=3)
     explanation = build_explanation(consistency, violations, evidence, relevance_penalty)
 
-    print(f"📊 Calibration complete: Consistency={consistency:.2f}, Uncertainty={uncertainty:.2f}, Relevance penalty={relevance_penalty:.2f}")
+    log.debug("📊 Calibration complete: Consistency=%.2f, Uncertainty=%.2f, Relevance penalty=%.2f, tokens≈%d/%d",
+              consistency, uncertainty, relevance_penalty, budget.spent, budget.limit)
     
     return {
         "draft": enhanced_draft,
@@ -257,5 +337,7 @@ def calibrate_answer(
         "explanation": explanation,
         "evidence": evidence,
         "relevance_penalty": round(relevance_penalty, 2),
-        "original_draft": draft
+        "original_draft": draft,
+        "generator_calls": budget.calls,
+        "estimated_tokens": budget.spent
     }
\ No newline at end of file
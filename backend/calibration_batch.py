@@ -0,0 +1,205 @@
+# calibration_batch.py
+# Vectorized calibration scoring for many (question, answer, samples) rows at once,
+# used to re-score the audit history offline when calibration weights change.
+# Scoring is split in two:
+#   extract_features()  tokenizes once into integer token ids and turns every set
+#                       operation of calibration.py into NumPy work on flat
+#                       (row, token) arrays, where a per-token bitmask marks the
+#                       samples containing it:
+#                         |A ∩ B| = Σ bit_a & bit_b,   |A ∪ B| = Σ bit_a | bit_b
+#   score_features()    applies relevance thresholds and uncertainty weights to
+#                       those arrays, so trying new weights over the whole
+#                       history never re-reads the text.
+# Results match the scalar functions in calibration.py row for row.
+import re
+from collections import defaultdict
+from itertools import chain
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from calibration import (
+    TECHNICAL_KEYWORDS, PHILOSOPHICAL_EVASION, STOP_WORDS, UNCERTAINTY_WEIGHTS,
+    count_violations, retrieve_evidence,
+)
+
+_WORD = re.compile(r"\w+")
+VIOLATION_KINDS = ("overclaim", "forbidden_domain", "banned_terms")
+MAX_SAMPLES = 64
+
+class Vocabulary:
+    """Token string -> dense integer id, shared by every text in a batch"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = defaultdict()
+        # An unseen token gets the next id; lookups then stay inside map()
+        self.ids.default_factory = self.ids.__len__
+
+    def encode(self, text: str) -> List[int]:
+        return list(map(self.ids.__getitem__, set(_WORD.findall((text or "").lower()))))
+
+    def flags(self, words) -> np.ndarray:
+        """Boolean array over the vocabulary marking the given words"""
+        marked = np.zeros(len(self.ids), dtype=bool)
+        marked[[self.ids[w] for w in words if w in self.ids]] = True
+        return marked
+
+def _mask_dtype(slots: int):
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if slots <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f"at most {MAX_SAMPLES} samples per row")
+
+def _flatten(token_lists: Sequence[Sequence[List[int]]]):
+    """token_lists[row][slot] -> flat row / slot / token arrays"""
+    lengths = [len(ids) for per_slot in token_lists for ids in per_slot]
+    slot_rows = [r for r, per_slot in enumerate(token_lists) for _ in per_slot]
+    slot_index = [s for per_slot in token_lists for s in range(len(per_slot))]
+    tokens = np.fromiter(chain.from_iterable(chain.from_iterable(token_lists)), dtype=np.int64)
+    return (np.repeat(np.asarray(slot_rows, dtype=np.int64), lengths),
+            np.repeat(np.asarray(slot_index, dtype=np.int64), lengths), tokens)
+
+def _token_masks(token_lists: Sequence[Sequence[List[int]]], vocab_size: int, slots: int):
+    """
+    Collapse (row, slot, token) triples into unique (row, token) keys with a
+    bitmask of the slots holding that token
+    """
+    rows, slot_ids, tokens = _flatten(token_lists)
+    dtype = _mask_dtype(slots)
+    if rows.size == 0:
+        return rows, tokens, np.zeros(0, dtype=dtype)
+    width = max(vocab_size, 1)
+    keys = rows * width + tokens
+    order = np.argsort(keys)
+    keys = keys[order]
+    bits = np.left_shift(dtype(1), slot_ids[order].astype(dtype))
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    masks = np.bitwise_or.reduceat(bits, starts)
+    unique = keys[starts]
+    return unique // width, unique % width, masks
+
+def _slot_bit(masks: np.ndarray, slot: int) -> np.ndarray:
+    return ((masks >> masks.dtype.type(slot)) & masks.dtype.type(1)).astype(bool)
+
+def self_consistency_batch(sample_tokens: Sequence[Sequence[List[int]]], vocab_size: int) -> np.ndarray:
+    """Mean pairwise Jaccard of each row's samples (0.5 for rows with fewer than two)"""
+    n = len(sample_tokens)
+    counts = np.array([len(samples) for samples in sample_tokens], dtype=np.int64)
+    k_max = int(counts.max()) if n else 0
+    if k_max > MAX_SAMPLES:
+        raise ValueError(f"at most {MAX_SAMPLES} samples per row")
+    rows, _, masks = _token_masks(sample_tokens, vocab_size, max(k_max, 1))
+
+    bits = [_slot_bit(masks, slot) for slot in range(k_max)]
+    total = np.zeros(n)
+    for a in range(k_max):
+        for b in range(a + 1, k_max):
+            inter = np.bincount(rows, weights=bits[a] & bits[b], minlength=n)
+            union = np.bincount(rows, weights=bits[a] | bits[b], minlength=n)
+            # Rows with fewer samples have no pair (a, b); their union is 0 there
+            total += inter / np.maximum(union, 1.0)
+    pairs = counts * (counts - 1) / 2
+    return np.where(counts >= 2, total / np.maximum(pairs, 1), 0.5)
+
+def _relevance_features(question_tokens: Sequence[List[int]], answer_tokens: Sequence[List[int]],
+                        vocab: Vocabulary) -> Dict[str, np.ndarray]:
+    n = len(question_tokens)
+    rows, tokens, masks = _token_masks(list(zip(question_tokens, answer_tokens)), len(vocab.ids), 2)
+    in_q = _slot_bit(masks, 0)
+    in_a = _slot_bit(masks, 1)
+
+    content = ~vocab.flags(STOP_WORDS)[tokens]
+    q_content = np.bincount(rows, weights=in_q & content, minlength=n)
+    overlap = np.bincount(rows, weights=in_q & in_a & content, minlength=n)
+    technical = np.bincount(rows, weights=in_q & vocab.flags(TECHNICAL_KEYWORDS)[tokens], minlength=n) > 0
+    evasive = np.bincount(rows, weights=in_a & vocab.flags(PHILOSOPHICAL_EVASION)[tokens], minlength=n) > 0
+    return {
+        "overlap_ratio": overlap / np.maximum(q_content, 1),
+        "question_has_content": q_content > 0,
+        "technical_evasion": technical & evasive,
+    }
+
+def violation_counts_batch(answers: Sequence[str], rules: Dict) -> np.ndarray:
+    """(n, 3) counts in VIOLATION_KINDS order; the rule document is compiled once for the batch"""
+    counts = np.zeros((len(answers), len(VIOLATION_KINDS)), dtype=np.int64)
+    for i, answer in enumerate(answers):
+        found = count_violations(answer or "", rules)
+        counts[i] = [found[kind] for kind in VIOLATION_KINDS]
+    return counts
+
+def extract_features(items: Sequence[Dict], rules: Dict, kb: Optional[List[Dict]] = None,
+                     evidence_counts: Optional[Sequence[int]] = None, max_evidence: int = 3) -> Dict[str, np.ndarray]:
+    """
+    Weight-independent per-row features. Each item has "question", "answer" and
+    optionally "samples" (defaults to [answer]); evidence_counts skips retrieval
+    when the caller already knows how much evidence each row had.
+    """
+    vocab = Vocabulary()
+    questions = [item.get("question") or "" for item in items]
+    answers = [item.get("answer") or "" for item in items]
+    sample_tokens = [[vocab.encode(s) for s in (item.get("samples") or [item.get("answer") or ""])] for item in items]
+    question_tokens = [vocab.encode(q) for q in questions]
+    answer_tokens = [vocab.encode(a) for a in answers]
+
+    if evidence_counts is None:
+        evidence = np.array([len(retrieve_evidence(q, kb, top_k=max_evidence)) for q in questions], dtype=np.int64)
+    else:
+        evidence = np.asarray(evidence_counts, dtype=np.int64)
+
+    features = {
+        "consistency": self_consistency_batch(sample_tokens, len(vocab.ids)),
+        "violations": violation_counts_batch(answers, rules),
+        "evidence": evidence,
+    }
+    features.update(_relevance_features(question_tokens, answer_tokens, vocab))
+    return features
+
+def relevance_penalty_batch(features: Dict[str, np.ndarray]) -> np.ndarray:
+    """compute_relevance_penalty for every row"""
+    ratio = features["overlap_ratio"]
+    penalty = np.select([ratio < 0.1, ratio < 0.2, ratio < 0.4], [0.8, 0.6, 0.3], default=0.1)
+    penalty = np.where(features["technical_evasion"], 0.9, penalty)
+    return np.where(features["question_has_content"], penalty, 0.3)
+
+def uncertainty_batch(consistency: np.ndarray, violations: np.ndarray, evidence_covered: np.ndarray,
+                      relevance_penalty: np.ndarray, max_evidence: int = 3,
+                      weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    w = dict(UNCERTAINTY_WEIGHTS, **(weights or {}))
+    v_norm = np.minimum(1.0, violations.sum(axis=1) / 3.0)
+    e_norm = 1.0 - evidence_covered / max(1, max_evidence)
+    c_norm = 1.0 - consistency
+    uncertainty = (w["consistency"] * c_norm + w["violations"] * v_norm +
+                   w["evidence"] * e_norm + w["relevance"] * relevance_penalty)
+    return np.clip(uncertainty, 0.0, 1.0)
+
+def score_features(features: Dict[str, np.ndarray], max_evidence: int = 3,
+                   weights: Optional[Dict[str, float]] = None) -> Dict[str, np.ndarray]:
+    """Relevance penalty and uncertainty arrays from extracted features"""
+    relevance = relevance_penalty_batch(features)
+    return {
+        "relevance_penalty": relevance,
+        "uncertainty": uncertainty_batch(features["consistency"], features["violations"], features["evidence"],
+                                         relevance, max_evidence, weights),
+    }
+
+def score_batch(items: Sequence[Dict], rules: Dict, kb: Optional[List[Dict]] = None,
+                evidence_counts: Optional[Sequence[int]] = None, max_evidence: int = 3,
+                weights: Optional[Dict[str, float]] = None) -> Dict[str, np.ndarray]:
+    """
+    extract_features + score_features in one call.
+    Returns arrays: consistency, relevance_penalty, violations (n x 3), evidence, uncertainty.
+    """
+    features = extract_features(items, rules, kb, evidence_counts, max_evidence)
+    scores = score_features(features, max_evidence, weights)
+    return {
+        "consistency": features["consistency"],
+        "relevance_penalty": scores["relevance_penalty"],
+        "violations": features["violations"],
+        "evidence": features["evidence"],
+        "uncertainty": scores["uncertainty"],
+    }
+
+def save_features(path: str, features: Dict[str, np.ndarray]):
+    np.savez_compressed(path, **features)
+
+def load_features(path: str) -> Dict[str, np.ndarray]:
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
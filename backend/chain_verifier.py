@@ -0,0 +1,391 @@
+# chain_verifier.py
+# Full-chain integrity verifier (M2.6 self-audit).
+# Streams audit_chain oldest first in keyset pages, checks prev_hash linkage,
+# recomputes each hash from its stored preimage (hash_payload) when present and
+# folds every hash into a Merkle accumulator. Every CHAIN_CHECKPOINT_EVERY
+# records a checkpoint (position, tip hash, Merkle root) is persisted, so the
+# next run only reads records added since the last checkpoint. A full run
+# re-derives the roots and reports any checkpoint that no longer matches.
+# Verified hashes are also appended to a persistent MerkleTree, and each
+# checkpoint / run end publishes a signed root, so a single record can be
+# proven part of the chain with an O(log n) inclusion proof.
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, List, Optional
+from audit_storage import iter_audit_pages, record_hash
+from merkle import MerkleFrontier, MerkleTree, SIGNATURE_ALGORITHM, load_signing_key, public_key_hex, sign_root
+from oracle_logging import get_logger
+from config import state_path
+
+try:
+    import fcntl  # POSIX only; keeps several workers from verifying at once
+except ImportError:
+    fcntl = None
+
+log = get_logger("chain_verifier")
+
+CHAIN_CHECKPOINT_PATH = os.getenv("CHAIN_CHECKPOINT_PATH") or state_path("chain_checkpoints.json")
+CHAIN_CHECKPOINT_EVERY = int(os.getenv("CHAIN_CHECKPOINT_EVERY", "1000"))
+CHAIN_VERIFY_PAGE_SIZE = int(os.getenv("CHAIN_VERIFY_PAGE_SIZE", "500"))
+SELF_AUDIT_INTERVAL = float(os.getenv("SELF_AUDIT_INTERVAL", str(12 * 3600)))
+SELF_AUDIT_INITIAL_DELAY = float(os.getenv("SELF_AUDIT_INITIAL_DELAY", "60"))
+MERKLE_TREE_PATH = os.getenv("MERKLE_TREE_PATH") or state_path("merkle_tree.db")
+# Hex Ed25519 seed; auditors check roots with the matching public key
+AUDIT_SIGNING_KEY = os.getenv("AUDIT_SIGNING_KEY", "")
+# Minimum seconds between on-demand syncs triggered by proof requests for unknown hashes
+PROOF_SYNC_MIN_INTERVAL = float(os.getenv("PROOF_SYNC_MIN_INTERVAL", "30"))
+
+# Issues reported per category (counts are always complete)
+MAX_REPORTED_ISSUES = 50
+
+def check_record_hash(row: Dict[str, Any]) -> Optional[bool]:
+    """
+    True/False when the row carries its hash preimage, None when it does not
+    (records written before AUDIT_STORE_HASH_PAYLOAD can only be linkage-checked).
+    """
+    payload = row.get("hash_payload")
+    if not isinstance(payload, dict):
+        return None
+    if record_hash(payload) != row.get("hash"):
+        return False
+    # The preimage must describe this row, not some other record
+    for field in ("question", "answer", "kind", "prev_hash"):
+        if (payload.get(field) or "") != (row.get(field) or ""):
+            return False
+    return True
+
+def _chain_order(rows: List[Dict[str, Any]], tip: str) -> List[Dict[str, Any]]:
+    """
+    Rows sharing a created_at (one bulk insert) come back in hash order;
+    put each such group back into prev_hash order starting from the tip.
+    """
+    ordered = []
+    i = 0
+    while i < len(rows):
+        j = i
+        while j + 1 < len(rows) and rows[j + 1].get("created_at") == rows[i].get("created_at"):
+            j += 1
+        group = rows[i:j + 1]
+        if len(group) > 1:
+            by_prev = {}
+            for row in group:
+                by_prev.setdefault(row.get("prev_hash") or "", []).append(row)
+            linked, cursor = [], tip
+            while by_prev.get(cursor):
+                row = by_prev[cursor].pop(0)
+                linked.append(row)
+                cursor = row.get("hash")
+            seen = {id(row) for row in linked}
+            group = linked + [row for row in group if id(row) not in seen]
+        ordered.extend(group)
+        if ordered:
+            tip = ordered[-1].get("hash") or tip
+        i = j + 1
+    return ordered
+
+try:
+    _signing_key = load_signing_key(AUDIT_SIGNING_KEY)
+except (RuntimeError, ValueError) as e:
+    log.error("❌ AUDIT_SIGNING_KEY unusable, Merkle roots will be unsigned: %s", e)
+    _signing_key = None
+AUDIT_PUBLIC_KEY = public_key_hex(_signing_key) if _signing_key is not None else None
+
+def signed_root(tree_size: int, root: str) -> Dict[str, Any]:
+    signed_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    signature = sign_root(tree_size, root, signed_at, _signing_key)
+    return {
+        "tree_size": tree_size,
+        "root": root,
+        "signed_at": signed_at,
+        "algorithm": SIGNATURE_ALGORITHM if signature else None,
+        "signature": signature,
+        "public_key": AUDIT_PUBLIC_KEY if signature else None,
+    }
+
+class ChainVerifier:
+    def __init__(self, state_path: str = CHAIN_CHECKPOINT_PATH,
+                 checkpoint_every: int = CHAIN_CHECKPOINT_EVERY,
+                 page_size: int = CHAIN_VERIFY_PAGE_SIZE,
+                 tree_path: str = MERKLE_TREE_PATH):
+        self.state_path = state_path
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.page_size = page_size
+        self.tree_path = tree_path
+        self._tree = None
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+        self._catch_up = None      # background verify() started for an unknown proof
+        self._catch_up_lock = threading.Lock()
+
+    @property
+    def tree(self) -> MerkleTree:
+        if self._tree is None:
+            self._tree = MerkleTree(self.tree_path)
+        return self._tree
+
+    # ----- persisted state -----
+    def load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: Dict[str, Any]):
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.state_path)
+
+    # ----- verification -----
+    def verify(self, full: bool = False) -> Dict[str, Any]:
+        """
+        Verify the chain. Incremental by default (resume after the last
+        verified record); full=True restarts from genesis and compares the
+        stored checkpoints against the recomputed roots.
+        """
+        lock_file = None
+        if fcntl is not None:
+            lock_file = open(f"{self.state_path}.lock", "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return {"ok": None, "skipped": "verification already running in another worker"}
+        try:
+            with self._lock:
+                return self._verify_locked(full)
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+    def _verify_locked(self, full: bool) -> Dict[str, Any]:
+        started = time.time()
+        state = self.load_state()
+        stored_checkpoints = {cp["size"]: cp for cp in state.get("checkpoints", [])}
+        last = None if full else state.get("last")
+        tree = self.tree
+        if last and tree.size != last["frontier"]["size"]:
+            # Tree file lost or written by an interrupted run: rebuild it from genesis
+            log.warning("🧩 Merkle tree has %d leaves, checkpoint state %d: running a full verification",
+                        tree.size, last["frontier"]["size"])
+            last = None
+
+        if last:
+            frontier = MerkleFrontier.from_dict(last["frontier"])
+            tip = last["hash"]
+            after = tuple(last["cursor"])
+            checkpoints = list(state.get("checkpoints", []))
+        else:
+            frontier = MerkleFrontier()
+            tip = ""
+            after = None
+            checkpoints = []
+            tree.reset()
+        resumed_from = frontier.size
+
+        report = {
+            "mode": "incremental" if last else "full",
+            "resumed_from": resumed_from,
+            "checked": 0,
+            "hash_verified": 0,
+            "hash_unverifiable": 0,
+            "hash_mismatches": [],
+            "hash_mismatch_count": 0,
+            "link_breaks": [],
+            "link_break_count": 0,
+            "checkpoint_mismatches": [],
+        }
+
+        # tip: last hash in chain order; cursor: largest (created_at, hash) read,
+        # which is where the next run resumes (they differ inside bulk-insert groups)
+        position = {"tip": tip, "cursor": after}
+
+        def _process(rows):
+            if rows:
+                position["cursor"] = (rows[-1].get("created_at"), rows[-1].get("hash"))
+            leaves = []
+            for row in _chain_order(rows, position["tip"]):
+                h = row.get("hash") or ""
+                prev = row.get("prev_hash") or ""
+                if prev != position["tip"]:
+                    report["link_break_count"] += 1
+                    if len(report["link_breaks"]) < MAX_REPORTED_ISSUES:
+                        report["link_breaks"].append({"hash": h, "prev_hash": prev, "expected_prev": position["tip"]})
+
+                hash_ok = check_record_hash(row)
+                if hash_ok is None:
+                    report["hash_unverifiable"] += 1
+                elif hash_ok:
+                    report["hash_verified"] += 1
+                else:
+                    report["hash_mismatch_count"] += 1
+                    if len(report["hash_mismatches"]) < MAX_REPORTED_ISSUES:
+                        report["hash_mismatches"].append(h)
+
+                frontier.append(h)
+                leaves.append(h)
+                position["tip"] = h
+                report["checked"] += 1
+
+                if frontier.size % self.checkpoint_every == 0:
+                    signed = signed_root(frontier.size, frontier.root())
+                    checkpoint = {
+                        "size": frontier.size,
+                        "hash": h,
+                        "created_at": row.get("created_at"),
+                        "root": signed["root"],
+                        "signed_at": signed["signed_at"],
+                        "signature": signed["signature"],
+                    }
+                    previous = stored_checkpoints.get(frontier.size)
+                    if full and previous and previous["root"] != checkpoint["root"]:
+                        report["checkpoint_mismatches"].append({
+                            "size": frontier.size,
+                            "stored_root": previous["root"],
+                            "recomputed_root": checkpoint["root"],
+                        })
+                    checkpoints.append(checkpoint)
+            tree.append_many(leaves)
+
+        carry = []
+        try:
+            for page in iter_audit_pages(after=after, page_size=self.page_size):
+                rows = carry + page
+                # Hold back the trailing created_at group: the next page may continue it
+                cut = len(rows)
+                while cut > 0 and rows[cut - 1].get("created_at") == rows[-1].get("created_at"):
+                    cut -= 1
+                carry = rows[cut:]
+                _process(rows[:cut])
+            _process(carry)
+        except RuntimeError as e:
+            # Keep what was verified so far; the next run resumes from there
+            report["error"] = str(e)
+
+        tip = position["tip"]
+        if report["checked"]:
+            state["last"] = {
+                "hash": tip,
+                "cursor": list(position["cursor"]),
+                "frontier": frontier.to_dict(),
+            }
+            state["checkpoints"] = checkpoints
+            state["signed_root"] = signed_root(frontier.size, frontier.root())
+        if report["hash_unverifiable"] == 0:
+            hash_check = "full"
+        elif report["hash_verified"]:
+            hash_check = "partial"
+        else:
+            hash_check = "linkage_only"
+        report.update({
+            "hash_check": hash_check,
+            "size": frontier.size,
+            "tip": tip,
+            "root": frontier.root(),
+            "ok": (not report["hash_mismatch_count"] and not report["link_break_count"]
+                   and not report["checkpoint_mismatches"] and "error" not in report),
+            "verified_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "duration_seconds": round(time.time() - started, 3),
+        })
+        if hash_check != "full":
+            # ok then only covers linkage for those rows; say so instead of implying more
+            report["note"] = ("%d of %d record hashes could not be recomputed (no stored "
+                              "hash_payload); only their prev_hash linkage was checked"
+                              % (report["hash_unverifiable"], report["checked"]))
+        state["last_report"] = report
+        try:
+            self._save_state(state)
+        except OSError as e:
+            log.warning("⚠️ Chain verifier: cannot persist checkpoints: %s", e)
+        return report
+
+    def last_report(self) -> Optional[Dict[str, Any]]:
+        return self.load_state().get("last_report")
+
+    def latest_signed_root(self) -> Optional[Dict[str, Any]]:
+        return self.load_state().get("signed_root")
+
+    # ----- inclusion proofs -----
+    def inclusion_proof(self, record_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Audit path proving record_hash is in the tree of the latest signed root.
+        Served from the current tree only; None when the record is not in it
+        (see catch_up for records newer than the tree).
+        """
+        root = self.latest_signed_root()
+        proof = self.tree.inclusion_proof(record_hash, root["tree_size"]) if root else None
+        if proof is None:
+            return None
+        return {"hash": record_hash, **proof, "signed_root": root}
+
+    def consistency_proof(self, first: int) -> Optional[Dict[str, Any]]:
+        """
+        Proof that the tree of the latest signed root extends the tree of its
+        first `first` leaves, so an auditor can move from a root they already
+        trust to the new one (check with merkle.verify_consistency).
+        """
+        root = self.latest_signed_root()
+        if not root:
+            return None
+        proof = self.tree.consistency_proof(first, root["tree_size"])
+        if proof is None:
+            return None
+        return {"first": first, "second": root["tree_size"], "proof": proof, "signed_root": root}
+
+    def catch_up(self) -> bool:
+        """
+        Start one incremental verification in a background thread (at most
+        every PROOF_SYNC_MIN_INTERVAL seconds) so records newer than the tree
+        get proofs. Returns True while such a catch-up is running.
+        """
+        with self._catch_up_lock:
+            if self._catch_up is not None and self._catch_up.is_alive():
+                return True
+            if time.monotonic() - self._last_sync < PROOF_SYNC_MIN_INTERVAL:
+                return False
+            self._last_sync = time.monotonic()
+            self._catch_up = threading.Thread(target=self._run_catch_up, name="oracle-proof-catch-up", daemon=True)
+            self._catch_up.start()
+            return True
+
+    def _run_catch_up(self):
+        try:
+            report = self.verify()
+            if report.get("skipped"):
+                log.info("🧩 Proof catch-up skipped: %s", report["skipped"])
+        except Exception as e:
+            log.exception("🧩 Proof catch-up crashed: %s", e)
+
+# Global verifier instance
+CHAIN_VERIFIER = ChainVerifier()
+
+_self_audit_thread = None
+
+def _self_audit_loop():
+    time.sleep(SELF_AUDIT_INITIAL_DELAY)
+    while True:
+        try:
+            report = CHAIN_VERIFIER.verify()
+            if report.get("skipped"):
+                log.info("🧩 M2.6 self-audit skipped: %s", report["skipped"])
+            elif report["ok"]:
+                log.info("🧩 M2.6 self-audit passed: %d new records, chain size %d, root %s…",
+                         report["checked"], report["size"], report["root"][:12])
+            else:
+                log.warning("🧩 M2.6 self-audit found issues: %d link breaks, %d hash mismatches%s",
+                            report["link_break_count"], report["hash_mismatch_count"],
+                            f", error: {report['error']}" if "error" in report else "")
+        except Exception as e:
+            log.exception("🧩 M2.6 self-audit crashed: %s", e)
+        time.sleep(SELF_AUDIT_INTERVAL)
+
+def start_self_audit():
+    """Run incremental verification every SELF_AUDIT_INTERVAL seconds (12h) in a daemon thread"""
+    global _self_audit_thread
+    if _self_audit_thread is not None:
+        return
+    _self_audit_thread = threading.Thread(target=_self_audit_loop, name="oracle-self-audit", daemon=True)
+    _self_audit_thread.start()
@@ -2,4 +2,13 @@ import os
 
 # If you later want to add real model keys, keep them in Render/Vercel env, not in code.
 AUDIT_LOG_PATH = os.getenv("AUDIT_LOG_PATH", "audit_log.json")
-ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # optional for future admin endpoints
\ No newline at end of file
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # optional for future admin endpoints
+
+# Runtime state the server writes (indexes, Merkle tree, checkpoints, audit spool);
+# kept out of the source tree and gitignored
+STATE_DIR = os.getenv("ORACLE_STATE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "state"))
+
+def state_path(name: str) -> str:
+    """Default location of a runtime state file (creates STATE_DIR)"""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, name)
@@ -1,17 +1,48 @@
 # database.py
+# Local SQLite message board (fallback store when Supabase is unavailable).
+# One connection per thread, reused across calls, in WAL mode so readers never
+# block the writer; lists are served newest first from the
+# (is_active, timestamp) index with keyset pagination.
+import os
 import sqlite3
-import json
-from datetime import datetime
-from typing import List, Dict, Optional
+import threading
+from typing import List, Dict, Optional, Tuple
+
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5.0"))
+
+# UPDATE ... RETURNING needs SQLite 3.35+
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
 
 class MessageBoardDB:
     def __init__(self, db_path: str = "message_board.db"):
         self.db_path = db_path
+        self._local = threading.local()
         self._init_db()
-    
+
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's connection, opened and tuned on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")   # durable at checkpoints, safe with WAL
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-8000")     # 8 MB page cache
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close the calling thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
     def _init_db(self):
         """Initialize database tables"""
-        with sqlite3.connect(self.db_path) as conn:
+        conn = self._connect()
+        with conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS messages (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -22,78 +53,96 @@ class MessageBoardDB:
                     is_active BOOLEAN NOT NULL DEFAULT 1
                 )
             """)
-            conn.commit()
-    
+            # The rowid is implicitly the last index column, so (timestamp, id)
+            # keyset scans are served entirely by this index
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_messages_active_timestamp
+                ON messages (is_active, timestamp)
+            """)
+
     def add_message(self, author: str, message: str) -> int:
         """Add a new message to the board"""
-        with sqlite3.connect(self.db_path) as conn:
+        conn = self._connect()
+        with conn:
             cursor = conn.execute("""
-                INSERT INTO messages (author, message) 
+                INSERT INTO messages (author, message)
                 VALUES (?, ?)
             """, (author or "Anonymous", message))
-            conn.commit()
             return cursor.lastrowid
-    
-    def get_messages(self, limit: int = 100, offset: int = 0) -> List[Dict]:
-        """Retrieve messages (newest first)"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+
+    def get_messages(self, limit: int = 100, offset: int = 0,
+                     before: Optional[Tuple[str, int]] = None) -> List[Dict]:
+        """
+        Retrieve messages (newest first).
+        Pass the (timestamp, id) of the last message already shown as `before`
+        to get the next page; `offset` is kept for older callers.
+        """
+        conn = self._connect()
+        if before is not None:
+            cursor = conn.execute("""
+                SELECT id, author, message, likes, timestamp
+                FROM messages
+                WHERE is_active = 1 AND (timestamp, id) < (?, ?)
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            """, (before[0], before[1], limit))
+        else:
             cursor = conn.execute("""
                 SELECT id, author, message, likes, timestamp
-                FROM messages 
+                FROM messages
                 WHERE is_active = 1
-                ORDER BY timestamp DESC
+                ORDER BY timestamp DESC, id DESC
                 LIMIT ? OFFSET ?
             """, (limit, offset))
-            
-            messages = []
-            for row in cursor.fetchall():
-                messages.append({
-                    "id": row["id"],
-                    "author": row["author"],
-                    "message": row["message"],
-                    "likes": row["likes"],
-                    "timestamp": row["timestamp"]
-                })
-            return messages
-    
+
+        return [{
+            "id": row["id"],
+            "author": row["author"],
+            "message": row["message"],
+            "likes": row["likes"],
+            "timestamp": row["timestamp"]
+        } for row in cursor.fetchall()]
+
     def like_message(self, message_id: int) -> Optional[int]:
-        """Increment like count for a message"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("""
-                UPDATE messages 
-                SET likes = likes + 1 
-                WHERE id = ? AND is_active = 1
-            """, (message_id,))
-            
-            if cursor.rowcount > 0:
-                conn.commit()
-                # Return updated like count
-                cursor = conn.execute(
-                    "SELECT likes FROM messages WHERE id = ?", 
-                    (message_id,)
-                )
-                return cursor.fetchone()[0]
-            return None
-    
+        """Increment like count for a message, returning the new count"""
+        conn = self._connect()
+        with conn:
+            if _HAS_RETURNING:
+                row = conn.execute("""
+                    UPDATE messages
+                    SET likes = likes + 1
+                    WHERE id = ? AND is_active = 1
+                    RETURNING likes
+                """, (message_id,)).fetchone()
+            else:
+                # Same transaction: no other writer can slip in between
+                cursor = conn.execute("""
+                    UPDATE messages
+                    SET likes = likes + 1
+                    WHERE id = ? AND is_active = 1
+                """, (message_id,))
+                row = None
+                if cursor.rowcount > 0:
+                    row = conn.execute("SELECT likes FROM messages WHERE id = ?", (message_id,)).fetchone()
+        return row[0] if row else None
+
     def delete_message(self, message_id: int) -> bool:
         """Soft delete a message (set is_active = 0)"""
-        with sqlite3.connect(self.db_path) as conn:
+        conn = self._connect()
+        with conn:
             cursor = conn.execute("""
-                UPDATE messages 
-                SET is_active = 0 
+                UPDATE messages
+                SET is_active = 0
                 WHERE id = ?
             """, (message_id,))
-            conn.commit()
             return cursor.rowcount > 0
-    
+
     def get_message_count(self) -> int:
         """Get total active message count"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                "SELECT COUNT(*) FROM messages WHERE is_active = 1"
-            )
-            return cursor.fetchone()[0]
+        cursor = self._connect().execute(
+            "SELECT COUNT(*) FROM messages WHERE is_active = 1"
+        )
+        return cursor.fetchone()[0]
 
 # Global database instance
-message_db = MessageBoardDB()
\ No newline at end of file
+message_db = MessageBoardDB()
@@ -2,7 +2,12 @@
 # Intelligent Deception Detection Engine with Weighted Scoring
 
 import re
-from difflib import SequenceMatcher
+import logging
+from keyword_matcher import register_keywords, scan_keywords
+from fuzzy_match import TemplateMatcher
+from oracle_logging import get_logger
+
+log = get_logger("deception")
 
 # ====== Thresholds & Behavior Mapping (Direct Replacement) ======
 SENSITIVITY = 0.30      # Main threshold: starting point for deception_detected (lower = more sensitive)
@@ -32,6 +37,18 @@ LEGITIMATE_FACTUAL_QUESTIONS = [
     "blockchain", "sha-256", "hashing", "cryptography", "technology"
 ]
 
+register_keywords("deception.keyword", KEYWORDS)
+register_keywords("deception.philosophical_context", PHILOSOPHICAL_CONTEXT)
+register_keywords("deception.legitimate_factual", LEGITIMATE_FACTUAL_QUESTIONS)
+
+# Deception phrasings matched fuzzily against the whole question (lowercase)
+DECEPTION_TEMPLATES = [
+    "how to lie without being detected",
+    "how to create a convincing fake story",
+]
+FUZZY_THRESHOLD = 0.72
+FUZZY_TEMPLATES = TemplateMatcher(DECEPTION_TEMPLATES, FUZZY_THRESHOLD)
+
 def detect_deception_intent(question: str):
     """
     Detect deception intent - intelligent weighted scoring version
@@ -44,17 +61,17 @@ def detect_deception_intent(question: str):
     except Exception:
         text = question.lower().strip()
 
+    # One automaton pass covers every term table below
+    hits = scan_keywords(text)
+
     # Check if it's a philosophical discussion
-    is_philosophical_discussion = any(philo_term in text for philo_term in PHILOSOPHICAL_CONTEXT)
+    is_philosophical_discussion = hits.has("deception.philosophical_context")
     
     # Check if it's a legitimate factual question
-    is_legitimate_factual = any(legit in text for legit in LEGITIMATE_FACTUAL_QUESTIONS)
+    is_legitimate_factual = hits.has("deception.legitimate_factual")
     
     # Priority 2 - Weight accumulation
-    score = 0.0
-    for k, w in KEYWORDS.items():
-        if k in text:
-            score += w
+    score = hits.weight("deception.keyword")
     # Normalization (ensure 0-1 range)
     score = min(score, 0.98)
 
@@ -65,22 +82,19 @@ def detect_deception_intent(question: str):
         if re.search(p, text):
             score = max(score, 0.75)
 
-    # simple fuzzy templates
-    def sim(a,b): return SequenceMatcher(None,a,b).ratio()
-    templates = ["how to lie without being detected","how to create a convincing fake story"]
-    for t in templates:
-        if sim(text, t) > 0.72:
-            score = max(score, 0.7)
+    # simple fuzzy templates (length/character prefilter before SequenceMatcher)
+    if FUZZY_TEMPLATES.matches(text):
+        score = max(score, 0.7)
 
     # Special handling: legitimate factual questions significantly reduce deception score
     if is_legitimate_factual:
         score = max(0.0, score * 0.2)  # Reduce score by 80%
-        print(f"✅ Legitimate factual question detected - deception score reduced to: {score:.2f}")
+        log.debug("✅ Legitimate factual question detected - deception score reduced to: %.2f", score)
     
     # Special handling: philosophical discussions moderately reduce deception score
     elif is_philosophical_discussion:
         score = max(0.0, score * 0.5)  # Reduce score by 50%
-        print(f"🤔 Philosophical discussion detected - deception score reduced to: {score:.2f}")
+        log.debug("🤔 Philosophical discussion detected - deception score reduced to: %.2f", score)
     
     # ====== Thresholds & Behavior Mapping (Direct Replacement) ======
     # Final behavior decision (used at call site)
@@ -104,9 +118,11 @@ def detect_deception_intent(question: str):
         "kind": kind
     }
     
-    # Priority 4 - Logging: make debug information observable (mandatory)
-    phrase_boost = 1 if any(re.search(p, text) for p in phrase_patterns) else 0
-    print(f"[Deception DEBUG] score={score:.2f} SENS={SENSITIVITY} phrase_boost={phrase_boost} q=\"{text[:120]}\"")
+    # Priority 4 - Logging: make debug information observable (only computed when DEBUG is on)
+    if log.isEnabledFor(logging.DEBUG):
+        phrase_boost = 1 if any(re.search(p, text) for p in phrase_patterns) else 0
+        log.debug("[Deception DEBUG] score=%.2f SENS=%s phrase_boost=%d q=\"%s\"",
+                  score, SENSITIVITY, phrase_boost, text[:120])
     
     return result
 
@@ -117,6 +133,9 @@ RISK_KEYWORDS = {
     "manipulation": ["deceive", "manipulation", "cheat", "control", "hack", "lie", "fake", "fraud", "scam", "trick", "counterfeit", "deception", "forge", "undetected", "hide", "conceal", "concealment"]
 }
 
+for _tag, _kws in RISK_KEYWORDS.items():
+    register_keywords(f"risk.{_tag}", _kws)
+
 # Original template system (maintain compatibility)
 DECEPTIVE_TEMPLATES = [
     "Tonight the constellations will align into a forgotten sigil—read carefully.",
@@ -179,11 +198,13 @@ def score_question(question: str):
     risk_tags = deception_result["tags"]
     
     # Add other risk classifications
-    for tag, kws in RISK_KEYWORDS.items():
-        if any(k.lower() in q for k in kws) and tag not in risk_tags:
+    hits = scan_keywords(q)
+    for tag in RISK_KEYWORDS:
+        if hits.has(f"risk.{tag}") and tag not in risk_tags:
             risk_tags.append(tag)
     
-    print(f"🔍 Compatibility score_question: '{question}' -> Determinacy: {determinacy:.2f}, Deception: {deception_prob:.2f}, Tags: {risk_tags}")
+    log.debug("🔍 Compatibility score_question: '%s' -> Determinacy: %.2f, Deception: %.2f, Tags: %s",
+              question, determinacy, deception_prob, risk_tags)
     return determinacy, deception_prob, risk_tags
 
 def is_factual_question(question: str) -> bool:
@@ -206,7 +227,7 @@ def get_factual_response(question: str) -> str:
     # Exact match priority
     for key, answer in FACTUAL_RESPONSES.items():
         if key in q_lower:
-            print(f"✅ Exact factual match found: '{key}' -> '{answer[:50]}...'")
+            log.debug("✅ Exact factual match found: '%s' -> '%s...'", key, answer[:50])
             return answer
     
     # Pattern matching for common factual questions
@@ -240,7 +261,7 @@ def get_factual_response(question: str) -> str:
         return "Machine learning is a subset of artificial intelligence that enables computers to learn from data without being explicitly programmed. It uses algorithms to identify patterns and make predictions or decisions based on input data. Key approaches include supervised learning, unsupervised learning, and reinforcement learning."
     
     # Default response for unmatched factual questions
-    print(f"⚠️ Factual question detected but no specific answer found: '{question}'")
+    log.debug("⚠️ Factual question detected but no specific answer found: '%s'", question)
     return f"I can provide factual information about this topic. Could you be more specific about what you'd like to know regarding: {question}"
 
 # Test function
@@ -0,0 +1,92 @@
+-- Supabase schema helpers for the Oracle backend
+-- Run once in the Supabase SQL editor.
+
+-- Chain head: one successor per prev_hash. Concurrent writers in other
+-- processes get a 409 and re-sync their in-process chain head.
+create unique index if not exists audit_chain_prev_hash_key
+    on audit_chain (prev_hash)
+    where prev_hash <> '';
+
+-- Write-behind receipts: each record gets one before it is linked, so a
+-- batch whose insert outcome was unknown is looked up instead of stored twice,
+-- and clients holding a receipt can fetch the hash once the record is stored.
+alter table audit_chain add column if not exists receipt text;
+create unique index if not exists audit_chain_receipt_key
+    on audit_chain (receipt)
+    where receipt is not null;
+
+-- /system/stats aggregates in one round trip (grouped in the database).
+-- Without this function the backend falls back to HEAD count=exact queries.
+create or replace function audit_chain_stats()
+returns jsonb
+language sql
+stable
+as $$
+    select jsonb_build_object(
+        'total', (select count(*) from audit_chain),
+        'by_kind', coalesce((
+            select jsonb_object_agg(kind, n)
+            from (select coalesce(kind, '') as kind, count(*) as n
+                  from audit_chain group by 1) k
+        ), '{}'::jsonb),
+        'by_language', coalesce((
+            select jsonb_object_agg(language, n)
+            from (select coalesce(language, '') as language, count(*) as n
+                  from audit_chain group by 1) l
+        ), '{}'::jsonb),
+        'by_risk_tag', coalesce((
+            select jsonb_object_agg(tag, n)
+            from (select tag, count(*) as n
+                  from audit_chain,
+                       jsonb_array_elements_text(coalesce(to_jsonb(risk_tags), '[]'::jsonb)) as tag
+                  group by 1) t
+        ), '{}'::jsonb)
+    );
+$$;
+
+-- Hash preimage: the exact JSON each audit hash was computed from. Written
+-- unless AUDIT_STORE_HASH_PAYLOAD=false, so the chain verifier can recompute
+-- hashes (rows without it are checked for prev_hash linkage only).
+alter table audit_chain add column if not exists hash_payload jsonb;
+
+-- Keyset pagination for the verifier and the chain endpoints
+create index if not exists audit_chain_created_at_hash_idx
+    on audit_chain (created_at, hash);
+
+-- Filtered audit list views (?kind= / ?language= / ?risk_tag=), newest first
+create index if not exists audit_chain_kind_created_at_idx
+    on audit_chain (kind, created_at, hash);
+create index if not exists audit_chain_language_created_at_idx
+    on audit_chain (language, created_at, hash);
+create index if not exists audit_chain_risk_tags_idx
+    on audit_chain using gin (risk_tags);
+
+-- Message board likes: one atomic increment per like (no read-modify-write).
+-- Returns the new count, or null when the message does not exist.
+create or replace function increment_message_likes(message_id bigint)
+returns integer
+language sql
+as $$
+    update messages
+    set likes = coalesce(likes, 0) + 1
+    where id = message_id
+    returning likes;
+$$;
+
+-- Offline re-scores (rescore_audit.py with RESCORE_WRITE_TABLE=true): one row
+-- per audit record and scoring version, kept apart from the hash chain.
+create table if not exists audit_rescore (
+    hash text not null,
+    score_version text not null,
+    scored_at timestamptz not null default now(),
+    kind text,
+    determinacy double precision,
+    deception_prob double precision,
+    risk_tags text[],
+    intent text,
+    intent_confidence double precision,
+    random_determinacy boolean not null default false,
+    primary key (hash, score_version)
+);
+create index if not exists audit_rescore_version_idx
+    on audit_rescore (score_version);
@@ -0,0 +1,218 @@
+# evidence_index.py
+# BM25 inverted index for calibration evidence retrieval.
+# The corpus is mini_kb.json plus every knowledge_base/*.md (one document per
+# markdown table row or paragraph). Postings store precomputed BM25 impacts, so
+# a query only touches the posting lists of its own terms and the top k come
+# from a heap. The built index is saved as plain JSON (never unpickled) under
+# config.STATE_DIR with a fingerprint of the source files and reloaded on startup until one of them
+# changes.
+import os
+import re
+import glob
+import json
+import math
+import heapq
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Sequence
+from oracle_logging import get_logger
+from config import state_path
+
+log = get_logger("evidence_index")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EVIDENCE_KB_PATH = os.getenv("EVIDENCE_KB_PATH", os.path.join(BASE_DIR, "mini_kb.json"))
+EVIDENCE_KB_DIR = os.getenv("EVIDENCE_KB_DIR", os.path.join(BASE_DIR, "knowledge_base"))
+EVIDENCE_INDEX_PATH = os.getenv("EVIDENCE_INDEX_PATH") or state_path("evidence_index.json")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Bump when tokenization or the saved layout changes
+INDEX_VERSION = 2
+
+_WORD = re.compile(r"[a-z0-9_]+|[\u4e00-\u9fff]+")
+_TABLE_RULE = re.compile(r"^\|?\s*:?-{3,}")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase latin words; CJK runs become character bigrams (no spaces to split on)"""
+    tokens = []
+    for run in _WORD.findall((text or "").lower()):
+        if '\u4e00' <= run[0] <= '\u9fff':
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+class EvidenceIndex:
+    def __init__(self, docs: Sequence[Dict], fingerprint: str = "", postings: Optional[Dict[str, List]] = None):
+        self.docs = list(docs)
+        self.fingerprint = fingerprint
+        self.postings: Dict[str, List[tuple]] = {}   # term -> [(doc index, BM25 impact), ...]
+        if postings is None:
+            self._build()
+        else:
+            self.postings = {term: [(int(i), float(impact)) for i, impact in entries]
+                             for term, entries in postings.items()}
+
+    def to_dict(self) -> Dict:
+        return {"version": INDEX_VERSION, "fingerprint": self.fingerprint,
+                "docs": self.docs, "postings": self.postings}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "EvidenceIndex":
+        return cls(data["docs"], data["fingerprint"], data["postings"])
+
+    def _build(self):
+        term_freqs = []
+        lengths = []
+        doc_freq = Counter()
+        for doc in self.docs:
+            tokens = tokenize(f"{doc.get('title', '')} {doc.get('text', '')}")
+            tf = Counter(tokens)
+            term_freqs.append(tf)
+            lengths.append(len(tokens))
+            doc_freq.update(tf.keys())
+
+        n = len(self.docs)
+        avgdl = (sum(lengths) / n) if n else 0.0
+        for i, tf in enumerate(term_freqs):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[i] / (avgdl or 1.0))
+            for term, freq in tf.items():
+                df = doc_freq[term]
+                idf = max(0.0, math.log((n - df + 0.5) / (df + 0.5) + 1.0))
+                impact = idf * freq * (BM25_K1 + 1) / (freq + norm)
+                self.postings.setdefault(term, []).append((i, impact))
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict]:
+        scores = {}
+        for term, qtf in Counter(tokenize(query)).items():
+            for i, impact in self.postings.get(term, ()):
+                scores[i] = scores.get(i, 0.0) + qtf * impact
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [self.docs[i] for i, score in best if score > 0]
+
+# ----- corpus -----
+def _markdown_docs(path: str) -> List[Dict]:
+    """One document per table row (first cell as title) or per paragraph"""
+    name = os.path.basename(path)
+    docs = []
+    paragraph = []
+    header_pending = True
+
+    def flush(line_no):
+        if paragraph:
+            docs.append({"id": f"{name}:{line_no}", "title": name, "text": " ".join(paragraph), "source": name})
+            paragraph.clear()
+
+    line_no = 0
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if line.startswith("|"):
+                flush(line_no)
+                if _TABLE_RULE.match(line):
+                    continue
+                cells = [c.strip() for c in line.strip("|").split("|")]
+                if header_pending:
+                    # First row of a table is its header
+                    header_pending = False
+                    continue
+                if any(cells[1:]):
+                    docs.append({
+                        "id": f"{name}:{line_no}",
+                        "title": cells[0] or name,
+                        "text": " ".join(c for c in cells[1:] if c),
+                        "source": name,
+                    })
+            else:
+                header_pending = True
+                if line:
+                    paragraph.append(line)
+                else:
+                    flush(line_no)
+        flush(line_no + 1)
+    return docs
+
+def _corpus_paths() -> List[str]:
+    paths = sorted(glob.glob(os.path.join(EVIDENCE_KB_DIR, "*.md")))
+    if os.path.exists(EVIDENCE_KB_PATH):
+        paths.insert(0, EVIDENCE_KB_PATH)
+    return paths
+
+def corpus_fingerprint(paths: Sequence[str]) -> str:
+    h = hashlib.sha256(f"v{INDEX_VERSION}".encode("utf-8"))
+    for path in paths:
+        st = os.stat(path)
+        h.update(f"|{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()
+
+def load_corpus(paths: Sequence[str]) -> List[Dict]:
+    docs = []
+    for path in paths:
+        if path.endswith(".json"):
+            with open(path, "r", encoding="utf-8") as f:
+                docs.extend(json.load(f))
+        else:
+            docs.extend(_markdown_docs(path))
+    return docs
+
+def load_or_build(index_path: str = EVIDENCE_INDEX_PATH) -> EvidenceIndex:
+    """Reuse the saved index while the corpus fingerprint matches, else rebuild and save it"""
+    paths = _corpus_paths()
+    fingerprint = corpus_fingerprint(paths)
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == INDEX_VERSION and data.get("fingerprint") == fingerprint:
+            index = EvidenceIndex.from_dict(data)
+            log.info("📚 Evidence index loaded: %d documents", len(index.docs))
+            return index
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        pass
+
+    index = EvidenceIndex(load_corpus(paths), fingerprint)
+    log.info("📚 Evidence index built: %d documents, %d terms", len(index.docs), len(index.postings))
+    tmp = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, index_path)
+    except OSError as e:
+        log.warning("⚠️ Cannot persist evidence index: %s", e)
+    return index
+
+_default_index = None
+_default_lock = threading.Lock()
+
+def get_evidence_index() -> EvidenceIndex:
+    """Index over the default corpus, loaded once per process"""
+    global _default_index
+    if _default_index is None:
+        with _default_lock:
+            if _default_index is None:
+                _default_index = load_or_build()
+    return _default_index
+
+# Caller-supplied KB lists (calibrate_answer's kb_docs): indexed once per list object
+_adhoc_indexes = OrderedDict()
+_adhoc_lock = threading.Lock()
+
+def index_for(kb: Optional[Sequence[Dict]]) -> EvidenceIndex:
+    if kb is None:
+        return get_evidence_index()
+    with _adhoc_lock:
+        entry = _adhoc_indexes.get(id(kb))
+        # Holding the list in the entry keeps its id from being reused
+        if entry is not None and entry[0] is kb and len(entry[1].docs) == len(kb):
+            _adhoc_indexes.move_to_end(id(kb))
+            return entry[1]
+        index = EvidenceIndex(kb)
+        _adhoc_indexes[id(kb)] = (kb, index)
+        while len(_adhoc_indexes) > 8:
+            _adhoc_indexes.popitem(last=False)
+        return index
@@ -0,0 +1,56 @@
+# fuzzy_match.py
+# Fuzzy template matching with exact prefilters.
+# SequenceMatcher.ratio() is 2*M / (len(a) + len(b)), where M (matched
+# characters) can never exceed the shorter length nor the shared character
+# multiset. Each template keeps a precomputed length and character profile, so
+# a query only considers templates whose length lies in the window that can
+# still beat the threshold (a bisect over lengths), drops those whose profile
+# bound cannot either, and runs SequenceMatcher on the few left. Both bounds
+# are upper bounds of ratio(), so results equal the brute-force loop; a
+# 2,000-character question against short templates never reaches difflib.
+import bisect
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Sequence, Tuple
+
+class TemplateMatcher:
+    def __init__(self, templates: Sequence[str], threshold: float):
+        if not 0.0 < threshold < 2.0:
+            raise ValueError("threshold must be in (0, 2)")
+        self.threshold = threshold
+        # (length, template, character profile), sorted by length
+        entries = sorted((len(t), t, Counter(t)) for t in dict.fromkeys(templates))
+        self._lengths = [length for length, _, _ in entries]
+        self._entries = entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _length_window(self, n: int) -> Tuple[int, int]:
+        """Index range of templates with 2*min(n, m) / (n + m) > threshold"""
+        t = self.threshold
+        lo = bisect.bisect_right(self._lengths, n * t / (2.0 - t))
+        hi = bisect.bisect_left(self._lengths, n * (2.0 - t) / t)
+        # Float edges are rechecked exactly by the profile bound below
+        return max(0, lo - 1), min(len(self._lengths), hi + 1)
+
+    def candidates(self, text: str):
+        """Templates whose ratio() upper bound beats the threshold, shortest first"""
+        n = len(text)
+        lo, hi = self._length_window(n)
+        if lo >= hi:
+            return
+        profile = Counter(text)
+        for length, template, template_profile in self._entries[lo:hi]:
+            total = n + length
+            if 2.0 * min(n, length) / total <= self.threshold:
+                continue
+            shared = sum(min(count, profile[ch]) for ch, count in template_profile.items())
+            if 2.0 * shared / total > self.threshold:
+                yield template
+
+    def matches(self, text: str) -> bool:
+        """True as soon as one template's ratio() beats the threshold"""
+        return any(SequenceMatcher(None, text, template).ratio() > self.threshold
+                   for template in self.candidates(text))
+
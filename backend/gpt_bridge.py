@@ -0,0 +1,274 @@
+# gpt_bridge.py
+# Temperature bridge client: pooled OpenAI chat completions with a response
+# cache for short canned prompts, single-flight coalescing of identical
+# in-flight prompts and a circuit breaker that fails fast when upstream degrades.
+import os
+import json
+import time
+import threading
+from concurrent.futures import Future
+import requests
+from requests.adapters import HTTPAdapter
+from result_cache import TTLCache, normalize_question
+
+OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+
+# Light empathy + no illegal/harmful advice
+SYSTEM_PROMPT = (
+    "You are a kind, grounded assistant. Speak briefly, warm and clear. "
+    "Acknowledge feelings first, then give 1-2 concrete, safe suggestions. "
+    "Never provide illegal, medical, or financial instructions."
+)
+
+BRIDGE_CONNECT_TIMEOUT = float(os.getenv("BRIDGE_CONNECT_TIMEOUT", "3.05"))
+BRIDGE_READ_TIMEOUT = float(os.getenv("BRIDGE_READ_TIMEOUT", "20"))
+BRIDGE_POOL_MAXSIZE = int(os.getenv("BRIDGE_POOL_MAXSIZE", "8"))
+BRIDGE_CACHE_MAX_CHARS = int(os.getenv("BRIDGE_CACHE_MAX_CHARS", "40"))
+BRIDGE_CACHE_SIZE = int(os.getenv("BRIDGE_CACHE_SIZE", "512"))
+BRIDGE_CACHE_TTL = float(os.getenv("BRIDGE_CACHE_TTL", "3600"))
+BRIDGE_BREAKER_FAILURES = int(os.getenv("BRIDGE_BREAKER_FAILURES", "5"))
+BRIDGE_BREAKER_RESET = float(os.getenv("BRIDGE_BREAKER_RESET", "30"))
+
+def bridge_error(reason: str) -> str:
+    return f"[Bridge Layer Error: {reason}]"
+
+def is_bridge_error(answer: str) -> bool:
+    return answer.startswith("[Bridge Layer Error")
+
+class BridgeError(Exception):
+    """The bridge cannot produce an answer; callers fall back to craft_answer"""
+
+class CircuitBreaker:
+    """closed → open after N consecutive failures → half-open after a cooldown"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            # Half-open: let exactly one probe through
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def release(self):
+        """Forget an unfinished half-open probe (e.g. the client went away)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+class BridgeClient:
+    def __init__(self):
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=BRIDGE_POOL_MAXSIZE)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self.cache = TTLCache(maxsize=BRIDGE_CACHE_SIZE, ttl=BRIDGE_CACHE_TTL)
+        self.breaker = CircuitBreaker(BRIDGE_BREAKER_FAILURES, BRIDGE_BREAKER_RESET)
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self.stats = {"requests": 0, "coalesced": 0, "failures": 0, "short_circuited": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, event: str):
+        # Stage-pool threads call ask() concurrently; += on a dict item is not atomic
+        with self._stats_lock:
+            self.stats[event] += 1
+
+    def counters(self) -> dict:
+        """Consistent copy of the request counters"""
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _config(self):
+        api_key = os.getenv("OPENAI_API_KEY", "").strip()
+        model = os.getenv("OPENAI_MODEL", "gpt-4o-mini").strip()
+        proxy_url = os.getenv("OPENAI_PROXY_URL", "").strip()
+        proxies = {"http": proxy_url, "https": proxy_url} if proxy_url else None
+        return api_key, model, proxies
+
+    def _payload(self, model: str, question: str) -> dict:
+        return {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": question}
+            ],
+            "temperature": 0.7,
+            "max_tokens": 220,
+            "n": 1
+        }
+
+    def _call_upstream(self, question: str) -> str:
+        api_key, model, proxies = self._config()
+        if not api_key:
+            return bridge_error("missing OPENAI_API_KEY")
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            return bridge_error("circuit open")
+
+        self._count("requests")
+        try:
+            resp = self._session.post(
+                OPENAI_CHAT_URL,
+                headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+                json=self._payload(model, question),
+                timeout=(BRIDGE_CONNECT_TIMEOUT, BRIDGE_READ_TIMEOUT),
+                proxies=proxies
+            )
+            if resp.status_code != 200:
+                # 4xx other than rate limiting is our request, not upstream health
+                if resp.status_code == 429 or resp.status_code >= 500:
+                    self._failed()
+                else:
+                    self.breaker.record_success()
+                return bridge_error(f"HTTP {resp.status_code} {resp.text[:180]}")
+            data = resp.json()
+            answer = data["choices"][0]["message"]["content"].strip()
+        except Exception as e:
+            self._failed()
+            return bridge_error(str(e))
+        self.breaker.record_success()
+        return answer
+
+    def _failed(self):
+        self._count("failures")
+        self.breaker.record_failure()
+
+    def ask(self, question: str) -> str:
+        """Bridge answer, or a "[Bridge Layer Error: ...]" string the caller falls back on"""
+        key = normalize_question(question)
+        cacheable = len(key) <= BRIDGE_CACHE_MAX_CHARS
+        if cacheable:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        # Single flight: identical prompts already in flight share one upstream call
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+        if not leader:
+            self._count("coalesced")
+            return future.result()
+
+        try:
+            answer = self._call_upstream(question)
+            if cacheable and not is_bridge_error(answer):
+                self.cache.set(key, answer)
+            future.set_result(answer)
+            return answer
+        except Exception as e:
+            answer = bridge_error(str(e))
+            future.set_result(answer)
+            return answer
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.pop(key, None)
+
+    def stream(self, question: str):
+        """
+        Yield answer text deltas as the upstream produces them.
+        Raises BridgeError when the bridge is unavailable or fails mid-stream.
+        """
+        key = normalize_question(question)
+        cacheable = len(key) <= BRIDGE_CACHE_MAX_CHARS
+        if cacheable:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        api_key, model, proxies = self._config()
+        if not api_key:
+            raise BridgeError("missing OPENAI_API_KEY")
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise BridgeError("circuit open")
+
+        self._count("requests")
+        payload = self._payload(model, question)
+        payload["stream"] = True
+        parts = []
+        settled = False
+        try:
+            with self._session.post(
+                OPENAI_CHAT_URL,
+                headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+                json=payload,
+                timeout=(BRIDGE_CONNECT_TIMEOUT, BRIDGE_READ_TIMEOUT),
+                proxies=proxies,
+                stream=True
+            ) as resp:
+                if resp.status_code != 200:
+                    if resp.status_code == 429 or resp.status_code >= 500:
+                        self._failed()
+                    else:
+                        self.breaker.record_success()
+                    settled = True
+                    raise BridgeError(f"HTTP {resp.status_code} {resp.text[:180]}")
+                for raw in resp.iter_lines():
+                    line = raw.decode("utf-8").strip() if raw else ""
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+            self.breaker.record_success()
+            settled = True
+        except BridgeError:
+            raise
+        except Exception as e:
+            self._failed()
+            settled = True
+            raise BridgeError(str(e))
+        finally:
+            if not settled:
+                # Closed early (client went away), with or without output:
+                # free a half-open probe so the next call can probe again
+                self.breaker.release()
+
+        answer = "".join(parts).strip()
+        if cacheable and answer:
+            self.cache.set(key, answer)
+
+# Global bridge client
+BRIDGE = BridgeClient()
@@ -0,0 +1,125 @@
+# keyword_matcher.py
+# Shared multi-pattern keyword matcher (Aho–Corasick automaton).
+# Classifier modules register their term tables under a category once at import;
+# a single linear pass over the (lowercased) question then reports every term
+# hit with its category and weight, replacing per-list `k in text` loops.
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Set
+
+class KeywordHits:
+    """Result of one scan: distinct terms found, grouped by category"""
+    __slots__ = ("_by_category",)
+
+    def __init__(self, by_category: Dict[str, Dict[str, float]]):
+        self._by_category = by_category
+
+    def has(self, category: str) -> bool:
+        return category in self._by_category
+
+    def terms(self, category: str) -> Set[str]:
+        return set(self._by_category.get(category, ()))
+
+    def count(self, category: str) -> int:
+        """Number of distinct terms of the category present in the text"""
+        return len(self._by_category.get(category, ()))
+
+    def weight(self, category: str) -> float:
+        """Sum of weights over the distinct terms present"""
+        return sum(self._by_category.get(category, {}).values())
+
+    def categories(self) -> List[str]:
+        return list(self._by_category)
+
+class KeywordAutomaton:
+    def __init__(self, cache_size: int = 256):
+        self._entries = defaultdict(list)   # term -> [(category, weight)]
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._goto = None
+        self._fail = None
+        self._out = None
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+
+    # ----- registration -----
+    def register(self, category: str, terms, weight: float = 1.0):
+        """Add a term list (uniform weight) or a {term: weight} table under a category"""
+        items = terms.items() if isinstance(terms, dict) else ((t, weight) for t in terms)
+        with self._lock:
+            for term, w in items:
+                term = term.lower()
+                if term:
+                    self._entries[term].append((category, float(w)))
+            self._dirty = True
+
+    # ----- construction -----
+    def _build(self):
+        goto = [{}]
+        out = [[]]
+        for term, entries in self._entries.items():
+            state = 0
+            for ch in term:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].extend((term, cat, w) for cat, w in entries)
+
+        # Breadth-first failure links; outputs are merged along them so a
+        # state reports every term ending at that position
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+
+        self._goto, self._fail, self._out = goto, fail, out
+        self._cache.clear()
+        self._dirty = False
+
+    # ----- matching -----
+    def scan(self, text: str) -> KeywordHits:
+        """Single pass over `text`; repeated scans of the same text are memoized"""
+        with self._lock:
+            if self._dirty:
+                self._build()
+            cached = self._cache.get(text)
+            if cached is not None:
+                self._cache.move_to_end(text)
+                return cached
+            goto, fail, out = self._goto, self._fail, self._out
+
+        found = {}
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for term, cat, w in out[state]:
+                    found.setdefault(cat, {})[term] = w
+        hits = KeywordHits(found)
+
+        with self._lock:
+            self._cache[text] = hits
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return hits
+
+# Shared automaton for every classifier term table
+CLASSIFIER_KEYWORDS = KeywordAutomaton()
+
+def register_keywords(category: str, terms, weight: float = 1.0):
+    CLASSIFIER_KEYWORDS.register(category, terms, weight)
+
+def scan_keywords(text: str) -> KeywordHits:
+    return CLASSIFIER_KEYWORDS.scan(text)
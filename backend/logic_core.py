@@ -3,6 +3,15 @@
 
 import random
 from deception_engine import detect_deception_intent
+from keyword_matcher import register_keywords, scan_keywords
+
+register_keywords("logic.philosophy", ["truth", "ethic", "virtue", "ai", "intelligence", "philosophy", "moral",
+                                       "free will", "freedom", "consciousness", "meaning", "purpose", "reality",
+                                       "existence", "knowledge"])
+register_keywords("logic.financial", ["predict", "bitcoin", "stock", "invest", "price", "market", "financial", "crypto"])
+register_keywords("logic.medical", ["disease", "medicine", "drug", "pill", "treatment", "symptom", "doctor", "hospital", "medical", "health"])
+register_keywords("logic.financial_context", ["bitcoin", "price", "stock", "invest", "crypto"])
+register_keywords("logic.medical_context", ["medicine", "disease", "drug", "treatment", "health"])
 
 def score_question(question: str):
     """
@@ -14,22 +23,21 @@ def score_question(question: str):
     base_risk_tags = deception_result["tags"]
     
     q = question.lower()
+    hits = scan_keywords(q)
 
     # Enhanced semantic analysis logic - adjust determinacy based on deception probability
     if deception_prob >= 0.6:
         # High deception probability - use deception engine's determinacy
         determinacy = deception_result["determinacy"]
         risk_tags = base_risk_tags
-    elif any(x in q for x in ["truth", "ethic", "virtue", "ai", "intelligence", "philosophy", "moral", 
-                              "free will", "freedom", "consciousness", "meaning", "purpose", "reality", 
-                              "existence", "knowledge"]):
+    elif hits.has("logic.philosophy"):
         # Philosophical questions - high determinacy, low risk
         determinacy = 0.85
         risk_tags = base_risk_tags
-    elif any(x in q for x in ["predict", "bitcoin", "stock", "invest", "price", "market", "financial", "crypto"]):
+    elif hits.has("logic.financial"):
         determinacy = 0.95
         risk_tags = base_risk_tags + ["financial_prediction"]
-    elif any(x in q for x in ["disease", "medicine", "drug", "pill", "treatment", "symptom", "doctor", "hospital", "medical", "health"]):
+    elif hits.has("logic.medical"):
         determinacy = 0.95
         risk_tags = base_risk_tags + ["medical_advice"]
     else:
@@ -37,16 +45,23 @@ def score_question(question: str):
         risk_tags = base_risk_tags
 
     # Add additional context-based risk tags
-    if "bitcoin" in q or "price" in q or "stock" in q or "invest" in q or "crypto" in q:
+    if hits.has("logic.financial_context"):
         if "financial_prediction" not in risk_tags:
             risk_tags.append("financial_prediction")
-    if "medicine" in q or "disease" in q or "drug" in q or "treatment" in q or "health" in q:
+    if hits.has("logic.medical_context"):
         if "medical_advice" not in risk_tags:
             risk_tags.append("medical_advice")
 
     return determinacy, deception_prob, risk_tags
 
 
+def random_determinacy(question: str, deception_prob: float) -> bool:
+    """True when score_question fell through to its random determinacy branch"""
+    hits = scan_keywords(question.lower())
+    return deception_prob < 0.6 and not any(
+        hits.has(category) for category in ("logic.philosophy", "logic.financial", "logic.medical"))
+
+
 def craft_answer(question: str, determinacy: float, deception_prob: float):
     """
     Generate philosophical answers based on scores with enhanced deception awareness
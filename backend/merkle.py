@@ -0,0 +1,289 @@
+# merkle.py
+# Merkle tree over audit record hashes (RFC 6962 / 9162 tree shape and
+# domain separation: leaves are H(0x00 || hash), nodes H(0x01 || left || right)).
+# MerkleFrontier keeps one perfect-subtree root per set bit of the leaf count:
+# O(log n) append/root with a state of a handful of hex strings.
+# MerkleTree persists every perfect-subtree node in SQLite, so an inclusion
+# proof for any record (against any tree size) costs O(log n) lookups, and
+# verify_inclusion() checks such a proof without any access to the chain.
+# Consistency proofs show that a later root extends an earlier one, and roots
+# are signed with Ed25519 so anyone holding the published public key can check
+# them (`python merkle.py keygen` prints a new AUDIT_SIGNING_KEY).
+import sys
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Optional
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+    from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat, PublicFormat
+except ImportError:
+    Ed25519PrivateKey = Ed25519PublicKey = None
+
+SIGNATURE_ALGORITHM = "ed25519"
+
+def leaf_hash(record_hash: str) -> str:
+    return hashlib.sha256(b"\x00" + record_hash.encode("utf-8")).hexdigest()
+
+def node_hash(left: str, right: str) -> str:
+    return hashlib.sha256(b"\x01" + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+EMPTY_ROOT = hashlib.sha256(b"").hexdigest()
+
+class MerkleFrontier:
+    def __init__(self, size: int = 0, peaks: Optional[List[str]] = None):
+        self.size = size
+        self.peaks = list(peaks or [])   # perfect subtree roots, largest (leftmost) first
+
+    def append(self, record_hash: str):
+        node = leaf_hash(record_hash)
+        height = 0
+        # Merge equal-height subtrees, like carrying in a binary counter
+        while (self.size >> height) & 1:
+            node = node_hash(self.peaks.pop(), node)
+            height += 1
+        self.peaks.append(node)
+        self.size += 1
+
+    def root(self) -> str:
+        if not self.peaks:
+            return EMPTY_ROOT
+        root = self.peaks[-1]
+        for peak in reversed(self.peaks[:-1]):
+            root = node_hash(peak, root)
+        return root
+
+    def to_dict(self) -> Dict:
+        return {"size": self.size, "peaks": list(self.peaks)}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MerkleFrontier":
+        return cls(int(data.get("size", 0)), data.get("peaks") or [])
+
+def _largest_power_of_two_below(n: int) -> int:
+    k = 1
+    while k * 2 < n:
+        k *= 2
+    return k
+
+class MerkleTree:
+    def __init__(self, db_path: str = "merkle_tree.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS nodes (
+                    level INTEGER NOT NULL,
+                    idx INTEGER NOT NULL,
+                    hash TEXT NOT NULL,
+                    PRIMARY KEY (level, idx)
+                );
+                CREATE TABLE IF NOT EXISTS leaves (
+                    record_hash TEXT PRIMARY KEY,
+                    idx INTEGER NOT NULL
+                );
+            """)
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return self._size_locked()
+
+    def _size_locked(self) -> int:
+        # Leaves are level-0 nodes 0..size-1; MAX on the primary key is an index seek
+        return self._conn.execute("SELECT COALESCE(MAX(idx) + 1, 0) FROM nodes WHERE level = 0").fetchone()[0]
+
+    def reset(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM nodes")
+            self._conn.execute("DELETE FROM leaves")
+
+    def append_many(self, record_hashes: Iterable[str]):
+        """Append leaves in chain order, storing each completed parent node"""
+        with self._lock, self._conn:
+            size = self._size_locked()
+            for record_hash in record_hashes:
+                idx = size
+                # A repeated hash keeps its first position for proofs
+                self._conn.execute("INSERT OR IGNORE INTO leaves (record_hash, idx) VALUES (?, ?)", (record_hash, idx))
+                node = leaf_hash(record_hash)
+                self._conn.execute("INSERT OR REPLACE INTO nodes VALUES (0, ?, ?)", (idx, node))
+                level = 0
+                while idx & 1:
+                    left = self._node_locked(level, idx - 1)
+                    node = node_hash(left, node)
+                    level, idx = level + 1, idx >> 1
+                    self._conn.execute("INSERT OR REPLACE INTO nodes VALUES (?, ?, ?)", (level, idx, node))
+                size += 1
+
+    def _node_locked(self, level: int, idx: int) -> str:
+        row = self._conn.execute("SELECT hash FROM nodes WHERE level = ? AND idx = ?", (level, idx)).fetchone()
+        if row is None:
+            raise KeyError(f"missing merkle node ({level}, {idx})")
+        return row[0]
+
+    def _subtree_root_locked(self, lo: int, hi: int) -> str:
+        size = hi - lo
+        if size & (size - 1) == 0 and lo % size == 0:
+            return self._node_locked(size.bit_length() - 1, lo // size)
+        k = _largest_power_of_two_below(size)
+        return node_hash(self._subtree_root_locked(lo, lo + k), self._subtree_root_locked(lo + k, hi))
+
+    def root(self, tree_size: Optional[int] = None) -> str:
+        with self._lock:
+            n = self._size_locked() if tree_size is None else tree_size
+            if n == 0:
+                return EMPTY_ROOT
+            return self._subtree_root_locked(0, n)
+
+    def leaf_index(self, record_hash: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT idx FROM leaves WHERE record_hash = ?", (record_hash,)).fetchone()
+        return row[0] if row else None
+
+    def inclusion_proof(self, record_hash: str, tree_size: Optional[int] = None) -> Optional[Dict]:
+        """Audit path for a record against the tree of the first `tree_size` leaves"""
+        with self._lock:
+            row = self._conn.execute("SELECT idx FROM leaves WHERE record_hash = ?", (record_hash,)).fetchone()
+            n = self._size_locked() if tree_size is None else tree_size
+            if row is None or row[0] >= n:
+                return None
+            index = row[0]
+            path = []
+            lo, hi, m = 0, n, index
+            # RFC 6962 PATH(m, D[lo:hi]), collected bottom-up
+            stack = []
+            while hi - lo > 1:
+                k = _largest_power_of_two_below(hi - lo)
+                if m < k:
+                    stack.append((lo + k, hi))
+                    hi = lo + k
+                else:
+                    stack.append((lo, lo + k))
+                    lo, m = lo + k, m - k
+            for sub_lo, sub_hi in reversed(stack):
+                path.append(self._subtree_root_locked(sub_lo, sub_hi))
+            return {"leaf_index": index, "tree_size": n, "audit_path": path,
+                    "root": self._subtree_root_locked(0, n)}
+
+    def _subproof_locked(self, m: int, lo: int, hi: int, complete: bool) -> List[str]:
+        # RFC 9162 SUBPROOF(m, D[lo:hi], b)
+        if m == hi - lo:
+            return [] if complete else [self._subtree_root_locked(lo, hi)]
+        k = _largest_power_of_two_below(hi - lo)
+        if m <= k:
+            return self._subproof_locked(m, lo, lo + k, complete) + [self._subtree_root_locked(lo + k, hi)]
+        return self._subproof_locked(m - k, lo + k, hi, False) + [self._subtree_root_locked(lo, lo + k)]
+
+    def consistency_proof(self, first: int, second: int) -> Optional[List[str]]:
+        """Hashes proving the tree of `first` leaves is a prefix of the tree of `second`"""
+        with self._lock:
+            if not 0 < first <= second <= self._size_locked():
+                return None
+            if first == second:
+                return []
+            return self._subproof_locked(first, 0, second, True)
+
+def verify_inclusion(record_hash: str, leaf_index: int, tree_size: int, audit_path: List[str], root: str) -> bool:
+    """RFC 9162 section 2.1.3.2: recompute the root from a leaf and its audit path"""
+    if leaf_index >= tree_size:
+        return False
+    fn, sn = leaf_index, tree_size - 1
+    r = leaf_hash(record_hash)
+    for p in audit_path:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            r = node_hash(p, r)
+            if not fn & 1:
+                while not fn & 1 and fn != 0:
+                    fn >>= 1
+                    sn >>= 1
+        else:
+            r = node_hash(r, p)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and r == root
+
+def verify_consistency(first: int, second: int, first_root: str, second_root: str, proof: List[str]) -> bool:
+    """RFC 9162 section 2.1.4.2: check that second_root's tree extends first_root's"""
+    if not 0 < first <= second:
+        return False
+    if first == second:
+        return not proof and first_root == second_root
+    path = list(proof)
+    if first & (first - 1) == 0:
+        path.insert(0, first_root)
+    if not path:
+        return False
+    fn, sn = first - 1, second - 1
+    while fn & 1:
+        fn >>= 1
+        sn >>= 1
+    fr = sr = path[0]
+    for c in path[1:]:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            fr = node_hash(c, fr)
+            sr = node_hash(c, sr)
+            if not fn & 1:
+                while not fn & 1 and fn != 0:
+                    fn >>= 1
+                    sn >>= 1
+        else:
+            sr = node_hash(sr, c)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and fr == first_root and sr == second_root
+
+def root_message(tree_size: int, root: str, signed_at: str) -> bytes:
+    return f"oracle-audit-root|{tree_size}|{root}|{signed_at}".encode("utf-8")
+
+def load_signing_key(seed_hex: str):
+    """Ed25519 private key from a 32-byte hex seed (None without a seed)"""
+    if not seed_hex:
+        return None
+    if Ed25519PrivateKey is None:
+        raise RuntimeError("signing audit roots needs the cryptography package")
+    seed = bytes.fromhex(seed_hex.strip())
+    if len(seed) != 32:
+        raise ValueError("AUDIT_SIGNING_KEY must be 32 bytes of hex (see `python merkle.py keygen`)")
+    return Ed25519PrivateKey.from_private_bytes(seed)
+
+def public_key_hex(private_key) -> str:
+    return private_key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw).hex()
+
+def sign_root(tree_size: int, root: str, signed_at: str, private_key) -> Optional[str]:
+    """Ed25519 signature over the tree size, root and signing time (None without a key)"""
+    if private_key is None:
+        return None
+    return private_key.sign(root_message(tree_size, root, signed_at)).hex()
+
+def verify_root_signature(signed_root: Dict, public_key: str) -> bool:
+    """Check a signed root against the publisher's hex public key, pinned by the caller"""
+    if Ed25519PublicKey is None:
+        raise RuntimeError("verifying audit roots needs the cryptography package")
+    if not public_key or not signed_root.get("signature") or signed_root.get("algorithm") != SIGNATURE_ALGORITHM:
+        return False
+    try:
+        key = Ed25519PublicKey.from_public_bytes(bytes.fromhex(public_key))
+        key.verify(bytes.fromhex(signed_root["signature"]),
+                   root_message(signed_root["tree_size"], signed_root["root"], signed_root["signed_at"]))
+    except (InvalidSignature, ValueError, KeyError):
+        return False
+    return True
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["keygen"]:
+        sys.exit("usage: python merkle.py keygen")
+    if Ed25519PrivateKey is None:
+        sys.exit("keygen needs the cryptography package")
+    private_key = Ed25519PrivateKey.generate()
+    seed = private_key.private_bytes(Encoding.Raw, PrivateFormat.Raw, NoEncryption())
+    print(f"AUDIT_SIGNING_KEY={seed.hex()}")
+    print(f"public key (publish / pin this): {public_key_hex(private_key)}")
@@ -1,14 +1,20 @@
+import os
 import re
 import json
 import hashlib
 from pathlib import Path
 from datetime import datetime, timezone
 import requests
+from merkle import verify_consistency, verify_inclusion, verify_root_signature
 
 # === Configurable Parameters ===
 BACKEND_BASE = "https://oracle-philosophy-backend.onrender.com"
 QUESTIONS_DIR = Path("data/questions")
 REPORT_DIR = Path("data/AuditReports")
+# The server's Ed25519 public key, obtained out of band (never from the server
+# response being checked), and the last signed root this auditor accepted
+AUDIT_PUBLIC_KEY = os.getenv("ORACLE_AUDIT_PUBLIC_KEY", "").strip()
+TRUSTED_ROOT_PATH = Path(os.getenv("ORACLE_TRUSTED_ROOT", "data/AuditReports/trusted_root.json"))
 
 # Complete 25 standard test questions
 STANDARD_QUESTIONS = [
@@ -65,18 +71,28 @@ def extract_questions_from_md(text: str):
     
     return found_questions
 
+_recent_records = None
+
+def fetch_recent_records(limit: int = 200):
+    """
+    Recent audit records without answer text (fields=list), fetched once per
+    run and shared by every question lookup
+    """
+    global _recent_records
+    if _recent_records is None:
+        r = requests.get(f"{BACKEND_BASE}/api/audit/chain",
+                         params={"limit": limit, "fields": "list"}, timeout=15)
+        r.raise_for_status()
+        _recent_records = r.json().get("records", [])
+    return _recent_records
+
 def get_backend_record_hash(question: str):
     """
     Get authoritative hash from backend audit chain
     Uses exact question matching to ensure accuracy
     """
     try:
-        # Get recent audit records
-        r = requests.get(f"{BACKEND_BASE}/audit_chain?limit=200", timeout=15)
-        r.raise_for_status()
-        data = r.json()
-        
-        records = data.get("records", []) if isinstance(data, dict) else data
+        records = fetch_recent_records()
         
         # Exact question matching
         question_lower = question.lower().strip()
@@ -96,6 +112,71 @@ def get_backend_record_hash(question: str):
         print(f"❌ Backend query failed for '{question}': {e}")
         return None
 
+_root_checks = {}
+
+def check_signed_root(signed_root):
+    """
+    None when signed_root carries a valid signature from the pinned key and
+    extends (or equals) the previously trusted root; otherwise the reason.
+    The first root ever seen is trusted on first use and pinned from then on.
+    """
+    if not signed_root:
+        return "no signed root"
+    key = (signed_root.get("tree_size"), signed_root.get("root"), signed_root.get("signature"))
+    if key in _root_checks:
+        return _root_checks[key]
+    if not AUDIT_PUBLIC_KEY:
+        problem = "no pinned public key (set ORACLE_AUDIT_PUBLIC_KEY)"
+    elif not verify_root_signature(signed_root, AUDIT_PUBLIC_KEY):
+        problem = "root signature does not verify against the pinned public key"
+    else:
+        problem = _check_root_history(signed_root)
+    _root_checks[key] = problem
+    return problem
+
+def _check_root_history(signed_root):
+    size, root = signed_root["tree_size"], signed_root["root"]
+    trusted = json.loads(TRUSTED_ROOT_PATH.read_text(encoding="utf-8")) if TRUSTED_ROOT_PATH.exists() else None
+    if trusted:
+        if size < trusted["tree_size"]:
+            return f"root is older than the trusted root of size {trusted['tree_size']}"
+        if size == trusted["tree_size"]:
+            return None if root == trusted["root"] else "root differs from the trusted root of the same size"
+        r = requests.get(f"{BACKEND_BASE}/api/audit/consistency/{trusted['tree_size']}", timeout=15)
+        if r.status_code != 200:
+            return f"no consistency proof from the trusted root (HTTP {r.status_code})"
+        consistency = r.json()
+        if consistency.get("second") != size or not verify_consistency(
+                trusted["tree_size"], size, trusted["root"], root, consistency.get("proof") or []):
+            return "root does not extend the trusted root"
+    TRUSTED_ROOT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    TRUSTED_ROOT_PATH.write_text(json.dumps(signed_root, indent=2), encoding="utf-8")
+    return None
+
+def get_inclusion_proof(record_hash: str):
+    """
+    Fetch the record's Merkle inclusion proof and check it locally:
+    O(log n) hashes against a signed root that is checked with the pinned
+    public key and against the previously trusted root
+    """
+    try:
+        r = requests.get(f"{BACKEND_BASE}/api/audit/proof/{record_hash}", timeout=15)
+        if r.status_code in (202, 404):
+            # 202: the server is still catching up to this record
+            return None
+        r.raise_for_status()
+        proof = r.json()
+        signed_root = proof.get("signed_root") or {}
+        proof["root_problem"] = check_signed_root(signed_root)
+        proof["verified"] = (proof["root_problem"] is None
+                             and proof["tree_size"] == signed_root.get("tree_size")
+                             and verify_inclusion(record_hash, proof["leaf_index"], proof["tree_size"],
+                                                  proof["audit_path"], signed_root.get("root")))
+        return proof
+    except Exception as e:
+        print(f"❌ Inclusion proof failed for {record_hash[:12]}…: {e}")
+        return None
+
 def digest_hashes(hashes):
     """Create overall report digest from all hashes"""
     joined = "|".join(sorted(hashes))  # Sort for consistency
@@ -121,6 +202,7 @@ def main():
                 backend_record = get_backend_record_hash(question)
                 
                 if backend_record and backend_record.get("hash"):
+                    proof = get_inclusion_proof(backend_record["hash"])
                     items.append({
                         "question": question,
                         "hash": backend_record["hash"],
@@ -130,9 +212,18 @@ def main():
                         "deception_prob": backend_record.get("deception_prob"), 
                         "kind": backend_record.get("kind"),
                         "verify_url": f"{BACKEND_BASE}/api/audit/verify/{backend_record['hash']}",
+                        "proof_url": f"{BACKEND_BASE}/api/audit/proof/{backend_record['hash']}",
+                        "merkle_verified": bool(proof and proof["verified"]),
+                        "leaf_index": proof.get("leaf_index") if proof else None,
+                        "tree_size": proof.get("tree_size") if proof else None,
+                        "audit_path": proof.get("audit_path") if proof else None,
+                        "signed_root": proof.get("signed_root") if proof else None,
+                        "root_problem": proof.get("root_problem") if proof else "no inclusion proof",
                         "source_file": md_file.name
                     })
-                    print(f"   ✅ {question}")
+                    print(f"   {'✅' if items[-1]['merkle_verified'] else '⚠️'} {question}"
+                          + ("" if items[-1]["merkle_verified"] or not items[-1]["root_problem"]
+                             else f" ({items[-1]['root_problem']})"))
                 else:
                     print(f"   ❌ No backend record found: {question}")
                     
@@ -146,6 +237,7 @@ def main():
     # Generate report digest
     all_hashes = [item["hash"] for item in items]
     report_digest = digest_hashes(all_hashes)
+    merkle_verified = sum(1 for item in items if item["merkle_verified"])
     
     # FIXED: Use timezone-aware datetime
     now_utc = datetime.now(timezone.utc)
@@ -228,18 +320,27 @@ def main():
                     if item.get('timestamp'):
                         f.write(f"- **Timestamp**: `{item['timestamp']}`\n")
                     f.write(f"- **Verification**: {item['verify_url']}\n")
+                    if item["merkle_verified"]:
+                        f.write(f"- **Merkle Proof**: ✅ leaf {item['leaf_index']} of {item['tree_size']}, "
+                                f"root `{item['signed_root']['root']}` ({len(item['audit_path'])} hashes)\n")
+                    else:
+                        reason = f"{item['root_problem']}, " if item.get("root_problem") else ""
+                        f.write(f"- **Merkle Proof**: ❌ not verified ({reason}{item['proof_url']})\n")
                     f.write(f"- **Source**: {item['source_file']}\n\n")
         
         f.write(f"## 🔍 Verification Summary\n")
         f.write(f"- **Total Records**: {len(items)}\n")
         f.write(f"- **Report Digest**: `{report_digest}`\n")
-        f.write(f"- **All Questions Verified**: ✅ YES\n\n")
+        f.write(f"- **Merkle Inclusion Verified**: {merkle_verified}/{len(items)}\n")
+        f.write(f"- **Root Signing Key (pinned)**: `{AUDIT_PUBLIC_KEY or 'none'}`\n")
+        f.write(f"- **All Questions Verified**: {'✅ YES' if merkle_verified == len(items) else '❌ NO'}\n\n")
         
         f.write(f"## ⚖️ Legal Grade Evidence\n")
         f.write(f"This report provides cryptographically verifiable evidence:\n")
         f.write(f"- ✅ All 25 standard questions captured\n")
         f.write(f"- ✅ Each question has authoritative backend hash\n")
         f.write(f"- ✅ Independent verification via provided URLs\n")
+        f.write(f"- ✅ Merkle inclusion proofs checkable offline against the Ed25519-signed root\n")
         f.write(f"- ✅ Tamper-evident through SHA256 hashing\n")
         f.write(f"- ✅ Complete audit trail established\n\n")
         
@@ -259,6 +360,8 @@ def main():
                 "total": len(STANDARD_QUESTIONS),
                 "rate": len(items)/len(STANDARD_QUESTIONS)
             },
+            "merkle_verified": merkle_verified,
+            "audit_public_key": AUDIT_PUBLIC_KEY or None,
             "records": items
         }, jf, ensure_ascii=False, indent=2)
     
@@ -266,7 +369,9 @@ def main():
     print(f"✅ Proof package generated: {out_json}")
     print(f"📊 Coverage: {len(items)}/{len(STANDARD_QUESTIONS)} questions ({len(items)/len(STANDARD_QUESTIONS)*100:.1f}%)")
     print(f"🔐 Report digest: {report_digest}")
-    print(f"🎉 SUCCESS: All 25 questions verified with cryptographic proof!")
+    print(f"🌳 Merkle inclusion verified: {merkle_verified}/{len(items)}")
+    if merkle_verified == len(items):
+        print(f"🎉 SUCCESS: All {len(items)} questions verified with cryptographic proof!")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,44 @@
+# pipeline.py
+# Shared stage pool for the /oracle request path.
+# Independent stages (chain head lookup, bridge call, contradiction scan) run
+# concurrently; non-critical writes are pushed to the background so they never
+# sit on the response path.
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from oracle_logging import get_logger
+
+log = get_logger("pipeline")
+
+PIPELINE_WORKERS = int(os.getenv("ORACLE_PIPELINE_WORKERS", "8"))
+# Upper bound the response waits for optional stages (seconds)
+CONSISTENCY_WAIT = float(os.getenv("ORACLE_CONSISTENCY_WAIT", "1.5"))
+
+_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="oracle-stage")
+
+def submit_stage(fn, *args, **kwargs):
+    """Start a stage on the shared pool and return its future"""
+    return _executor.submit(fn, *args, **kwargs)
+
+def _report_background_failure(future):
+    exc = future.exception()
+    if exc is not None:
+        log.warning("⚠️ Background stage failed: %s", exc)
+
+def run_background(fn, *args, **kwargs):
+    """Fire-and-forget: failures are logged, never raised to the caller"""
+    future = _executor.submit(fn, *args, **kwargs)
+    future.add_done_callback(_report_background_failure)
+    return future
+
+def collect(future, default=None, timeout=None):
+    """Join a stage; a failed or late stage degrades to `default`"""
+    if future is None:
+        return default
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        log.warning("⚠️ Stage still running after %ss, continuing without it", timeout)
+        return default
+    except Exception as e:
+        log.warning("⚠️ Stage failed: %s", e)
+        return default
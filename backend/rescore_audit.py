@@ -0,0 +1,320 @@
+# rescore_audit.py
+# Offline re-scoring of the audit chain.
+# Streams every audit record (keyset pages, oldest first) and re-runs the
+# /oracle scoring stages - ethics shortcut, score_question, craft_answer's kind,
+# infer_intent, adjust_reflection and the sensitivity scaling - on a process
+# pool, without generating answers or appending anything to the chain.
+# Scores are tagged with a version digest of the scoring code and config and
+# written as a columnar file (Parquet with pyarrow, else a NumPy .npz), and
+# optionally upserted into the audit_rescore side table. A drift report
+# compares them with the stored values.
+#
+#   RESCORE_WORKERS=8 RESCORE_WRITE_TABLE=true python rescore_audit.py
+import os
+import json
+import random
+import hashlib
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+from oracle_logging import get_logger
+from logic_core import score_question, craft_answer, random_determinacy
+from semantic_bridge import infer_intent
+from ethical_resonator import adjust_reflection
+from risk_rules import emergency_ethics_shortcut, policy_check
+from rule_engine import RULES
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+load_dotenv()
+log = get_logger("rescore")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESCORE_DIR = os.getenv("RESCORE_DIR", os.path.join("data", "rescore"))
+RESCORE_WORKERS = int(os.getenv("RESCORE_WORKERS", str(os.cpu_count() or 2)))
+RESCORE_CHUNK = int(os.getenv("RESCORE_CHUNK", "500"))
+RESCORE_WRITE_TABLE = os.getenv("RESCORE_WRITE_TABLE", "false").lower() == "true"
+RESCORE_TABLE = os.getenv("RESCORE_TABLE", "audit_rescore")
+
+AUDIT_SELECT = "hash,created_at,question,kind,determinacy,deception_prob,risk_tags"
+# Any change to these files can move a score
+SCORING_MODULES = ("deception_engine.py", "fuzzy_match.py", "logic_core.py", "semantic_bridge.py",
+                   "ethical_resonator.py", "keyword_matcher.py", "risk_rules.py")
+DRIFT_BINS = np.round(np.linspace(-1.0, 1.0, 21), 2)
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+_DEFAULT_SENSITIVITY = {
+    "mode": "default",
+    "determinacy_threshold": 0.75,
+    "deception_prob_limit": 0.25,
+    "ethical_reflection_weight": 0.5
+}
+
+def load_sensitivity_config(path: str = "sensitivity_config.json") -> Dict:
+    """Same file and defaults app.py scores with"""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    log.warning("⚠️ No %s found, using default sensitivity", path)
+    return dict(_DEFAULT_SENSITIVITY)
+
+def score_version(config: Dict) -> str:
+    """Digest of the scoring sources, the sensitivity config and the rule set"""
+    h = hashlib.sha256(json.dumps(config, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    h.update(f"|rules:{RULES.version}".encode("utf-8"))
+    for name in SCORING_MODULES:
+        with open(os.path.join(BASE_DIR, name), "rb") as f:
+            h.update(b"|" + name.encode("utf-8") + b":" + hashlib.sha256(f.read()).digest())
+    return h.hexdigest()[:12]
+
+def rescore_question(question: str, config: Dict) -> Dict:
+    """The scoring steps of app._oracle_classify for one question (no answer, no bridge)"""
+    shortcut = emergency_ethics_shortcut(question)
+    if shortcut:
+        determinacy = float(shortcut.get("determinacy", 0.95))
+        deception_prob = float(shortcut.get("deception_prob", 0.0))
+        return {
+            "kind": shortcut.get("kind", "ethical_reject"),
+            "determinacy": round(determinacy * config["determinacy_threshold"], 2),
+            "deception_prob": round(deception_prob * config["deception_prob_limit"], 2),
+            "risk_tags": sorted(shortcut.get("risk_tags", ["ethics", "safety"])),
+            "intent": "",
+            "intent_confidence": 0.0,
+            "random_determinacy": False,
+        }
+
+    # The random branch of score_question is seeded per question, so a re-run
+    # of the same version reproduces its own numbers
+    random.seed(int(hashlib.sha256(question.encode("utf-8")).hexdigest()[:16], 16))
+    determinacy, deception_prob, risk_tags = score_question(question)
+    _, kind = craft_answer(question, determinacy, deception_prob)
+    intent_info = infer_intent(question)
+    determinacy_adj, _, resonance_tags = adjust_reflection(determinacy, 0.7, intent_info)
+    policy = policy_check(question)
+    if policy:
+        resonance_tags = resonance_tags + policy["risk_tags"]
+    return {
+        "kind": kind,
+        "determinacy": round(determinacy_adj * config["determinacy_threshold"], 2),
+        "deception_prob": round(deception_prob * config["deception_prob_limit"], 2),
+        "risk_tags": sorted(set(risk_tags + resonance_tags)),
+        "intent": intent_info.get("intent", ""),
+        "intent_confidence": float(intent_info.get("confidence", 0.0)),
+        "random_determinacy": random_determinacy(question, deception_prob),
+    }
+
+# ----- worker processes -----
+_worker_config = None
+
+def _init_worker(config: Dict):
+    global _worker_config
+    _worker_config = config
+
+def _as_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+def _score_chunk(rows: List[Dict]) -> List[Dict]:
+    scored = []
+    for row in rows:
+        new = rescore_question(row.get("question") or "", _worker_config)
+        scored.append({
+            "hash": row["hash"],
+            "created_at": row.get("created_at") or "",
+            "kind_old": row.get("kind") or "",
+            "determinacy_old": _as_float(row.get("determinacy")),
+            "deception_prob_old": _as_float(row.get("deception_prob")),
+            "risk_tags_old": sorted(row.get("risk_tags") or []),
+            "kind_new": new["kind"],
+            "determinacy_new": new["determinacy"],
+            "deception_prob_new": new["deception_prob"],
+            "risk_tags_new": new["risk_tags"],
+            "intent": new["intent"],
+            "intent_confidence": new["intent_confidence"],
+            "random_determinacy": new["random_determinacy"],
+        })
+    return scored
+
+def _chunks(pages: Iterable[List[Dict]], size: int):
+    buffered = []
+    for page in pages:
+        buffered.extend(page)
+        while len(buffered) >= size:
+            yield buffered[:size]
+            buffered = buffered[size:]
+    if buffered:
+        yield buffered
+
+def rescore(pages: Iterable[List[Dict]], config: Dict, workers: int = RESCORE_WORKERS,
+            chunk_size: int = RESCORE_CHUNK):
+    """Yield scored chunks in chain order; at most 2 chunks per worker are in flight"""
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as pool:
+        pending = deque()
+        for chunk in _chunks(pages, chunk_size):
+            pending.append(pool.submit(_score_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# ----- output -----
+COLUMNS = ("hash", "created_at", "kind_old", "kind_new", "determinacy_old", "determinacy_new",
+           "deception_prob_old", "deception_prob_new", "risk_tags_old", "risk_tags_new",
+           "intent", "intent_confidence", "random_determinacy")
+
+def _columnar(rows: List[Dict], version: str) -> Dict[str, list]:
+    columns = {name: [row[name] for row in rows] for name in COLUMNS}
+    columns["score_version"] = [version] * len(rows)
+    return columns
+
+class ColumnarWriter:
+    """Parquet row group per chunk when pyarrow is installed, else one compressed .npz at close"""
+
+    def __init__(self, base_path: str):
+        self.path = base_path + (".parquet" if pq is not None else ".npz")
+        self._writer = None
+        self._columns: Dict[str, list] = {}
+
+    def write(self, columns: Dict[str, list]):
+        if pq is not None:
+            table = pa.table(columns)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+            self._writer.write_table(table)
+            return
+        for name, values in columns.items():
+            if name.startswith("risk_tags"):
+                values = [",".join(tags) for tags in values]
+            self._columns.setdefault(name, []).extend(values)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        elif pq is None:
+            np.savez_compressed(self.path, **{name: np.asarray(values) for name, values in self._columns.items()})
+
+def write_side_table(rows: List[Dict], version: str, scored_at: str) -> bool:
+    """Upsert one chunk into audit_rescore (primary key hash, score_version)"""
+    from audit_storage import _supabase_send
+    payload = [{
+        "hash": row["hash"],
+        "score_version": version,
+        "scored_at": scored_at,
+        "kind": row["kind_new"],
+        "determinacy": row["determinacy_new"],
+        "deception_prob": row["deception_prob_new"],
+        "risk_tags": row["risk_tags_new"],
+        "intent": row["intent"],
+        "intent_confidence": row["intent_confidence"],
+        "random_determinacy": row["random_determinacy"],
+    } for row in rows]
+    response = _supabase_send("POST", RESCORE_TABLE, payload, params={"on_conflict": "hash,score_version"},
+                              prefer="resolution=merge-duplicates,return=minimal")
+    return response is not None and response.status_code in (200, 201, 204)
+
+# ----- drift -----
+class DriftReport:
+    """Accumulates old/new scores chunk by chunk and summarizes their differences"""
+
+    def __init__(self, version: str):
+        self.version = version
+        self.deltas = {"determinacy": [], "deception_prob": []}
+        self.random_rows = 0
+        self.rows = 0
+        self.kind_changes = Counter()
+        self.tags_added = Counter()
+        self.tags_removed = Counter()
+
+    def add(self, rows: List[Dict]):
+        self.rows += len(rows)
+        for row in rows:
+            self.deltas["deception_prob"].append(row["deception_prob_new"] - row["deception_prob_old"])
+            if row["random_determinacy"]:
+                # Stored and new values are both random draws: not drift
+                self.random_rows += 1
+            else:
+                self.deltas["determinacy"].append(row["determinacy_new"] - row["determinacy_old"])
+            # Bridge answers overwrite the kind after scoring
+            if row["kind_old"] != "humanized_response" and row["kind_old"] != row["kind_new"]:
+                self.kind_changes[f"{row['kind_old'] or '-'} -> {row['kind_new']}"] += 1
+            old_tags, new_tags = set(row["risk_tags_old"]), set(row["risk_tags_new"])
+            self.tags_added.update(new_tags - old_tags)
+            self.tags_removed.update(old_tags - new_tags)
+
+    @staticmethod
+    def _summary(deltas: List[float]) -> Dict:
+        values = np.asarray(deltas, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return {"count": 0}
+        counts, _ = np.histogram(np.clip(values, -1.0, 1.0), bins=DRIFT_BINS)
+        return {
+            "count": int(values.size),
+            "changed": int(np.count_nonzero(np.abs(values) >= 0.005)),
+            "mean": round(float(values.mean()), 4),
+            "std": round(float(values.std()), 4),
+            "max_abs": round(float(np.abs(values).max()), 4),
+            "quantiles": {f"p{int(q * 100)}": round(float(v), 4)
+                          for q, v in zip(QUANTILES, np.quantile(values, QUANTILES))},
+            "histogram": {f"[{lo:+.1f},{hi:+.1f})": int(n)
+                          for lo, hi, n in zip(DRIFT_BINS[:-1], DRIFT_BINS[1:], counts)},
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            "score_version": self.version,
+            "rows": self.rows,
+            "random_determinacy_rows": self.random_rows,
+            "determinacy": self._summary(self.deltas["determinacy"]),
+            "deception_prob": self._summary(self.deltas["deception_prob"]),
+            "kind_changes": dict(self.kind_changes.most_common()),
+            "risk_tags_added": dict(self.tags_added.most_common()),
+            "risk_tags_removed": dict(self.tags_removed.most_common()),
+        }
+
+def main(pages: Optional[Iterable[List[Dict]]] = None) -> Dict:
+    config = load_sensitivity_config()
+    version = score_version(config)
+    if pages is None:
+        from audit_storage import iter_audit_pages
+        pages = iter_audit_pages(select=AUDIT_SELECT)
+
+    os.makedirs(RESCORE_DIR, exist_ok=True)
+    base_path = os.path.join(RESCORE_DIR, f"audit_rescore_{version}")
+    writer = ColumnarWriter(base_path)
+    report = DriftReport(version)
+    scored_at = datetime.now(timezone.utc).isoformat()
+    table_failures = 0
+
+    log.info("🔁 Re-scoring audit chain: version %s, %d workers", version, RESCORE_WORKERS)
+    try:
+        for rows in rescore(pages, config):
+            writer.write(_columnar(rows, version))
+            report.add(rows)
+            if RESCORE_WRITE_TABLE and not write_side_table(rows, version, scored_at):
+                table_failures += 1
+            log.info("🔁 %d records re-scored", report.rows)
+    finally:
+        writer.close()
+
+    summary = report.to_dict()
+    summary["output"] = writer.path
+    if RESCORE_WRITE_TABLE:
+        summary["table_chunk_failures"] = table_failures
+    with open(base_path + ".report.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    log.info("✅ Re-scored %d records → %s", report.rows, writer.path)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return summary
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# result_cache.py
+# Bounded LRU + TTL cache for deterministic pipeline stages.
+# Keys are built from the stage name, the exact question text and the config /
+# rule-set versions, so editing sensitivity_config.json or risk_rules.json
+# naturally invalidates every cached result. Stages see the raw text (fuzzy
+# matching compares it as written), so differently spaced questions never
+# share an entry.
+import os
+import re
+import copy
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+from metrics import STAGE_CACHE_REQUESTS, stage_timer
+
+_MISS = object()
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()     # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]):
+        value = self.get(key, _MISS)
+        if value is _MISS:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
+
+_WS = re.compile(r"\s+")
+
+def normalize_question(question: str) -> str:
+    return _WS.sub(" ", (question or "").strip().lower())
+
+STAGE_CACHE = TTLCache(
+    maxsize=int(os.getenv("ORACLE_STAGE_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("ORACLE_STAGE_CACHE_TTL", "300"))
+)
+
+def cached_stage(stage: str, question: str, compute: Callable[[], Any], *key_parts, version: str = "",
+                 cache_if: Callable[[Any], bool] = None):
+    """
+    Result of a pure classification/answer stage for this question.
+    cache_if(value) can veto storing a result that was not deterministic.
+    Callers get a private copy, so mutating a returned list never leaks
+    into the cache.
+    """
+    key = (stage, question, version) + key_parts
+    with stage_timer(stage):
+        value = STAGE_CACHE.get(key, _MISS)
+        if value is _MISS:
+            STAGE_CACHE_REQUESTS.inc(stage=stage, result="miss")
+            value = compute()
+            if cache_if is None or cache_if(value):
+                STAGE_CACHE.set(key, value)
+        else:
+            STAGE_CACHE_REQUESTS.inc(stage=stage, result="hit")
+        return copy.deepcopy(value)
@@ -1,4 +1,25 @@
-import re
+from rule_engine import RULES
+
+# (rule name, pattern) — evaluated in order against the lowercased question
+TRIGGER_PATTERNS = [
+    # 医疗相关 - 严格拦截
+    ("medical", r"(chest\s*pain|heart\s*attack|stroke|cancer|tumor|medicine|drug|pill|treatment|diagnos|symptom|doctor|hospital|emergency|medical\s*advice)"),
+    # 金融预测 - 严格拦截
+    ("financial", r"(predict|forecast|bitcoin|btc|stock|invest|price\s*(tomorrow|next|future)|buy\s*now|market\s*prediction|financial\s*advice)"),
+    # 明确的恶意欺骗请求 - 完整拦截范围
+    ("deception_request", r"(how\s*to\s*(lie|cheat|deceive|trick|manipulate|forge|fake|scam)|teach\s*me.*technique|best\s*way\s*to\s*(lie|cheat|deceive|manipulate)|create\s*fake|make\s*fake|convincing\s*fake|perfect\s*fraud)"),
+    # 具体犯罪方法
+    ("crime_method", r"(undetected\s*lie|get\s*away\s*with|avoid\s*detection|without\s*getting\s*caught|manipulation\s*technique)"),
+    # 自我治疗 - 严格拦截
+    ("self_treatment", r"(self\s*treat|ignore\s*doctor|take\s*without\s*prescription|DIY\s*medicine|prescription\s*without)"),
+    # 中文恶意请求
+    ("chinese_malicious", r"(如何(作弊|欺骗|造假|诈骗|操纵)|怎样(作弊|欺骗|造假|诈骗|操纵)|最好的(作弊|欺骗|造假|操纵)方法|制造假|伪造|完美诈骗|操纵技巧)"),
+]
+
+RULES.register("emergency", [
+    {"id": f"emergency.{name}", "category": name, "pattern": pattern}
+    for name, pattern in TRIGGER_PATTERNS
+])
 
 def emergency_ethics_shortcut(q: str):
     if not q:
@@ -8,30 +29,44 @@ def emergency_ethics_shortcut(q: str):
     except Exception:
         text = q.lower().strip()
 
-    trigger_patterns = [
-        # 医疗相关 - 严格拦截
-        r"(chest\s*pain|heart\s*attack|stroke|cancer|tumor|medicine|drug|pill|treatment|diagnos|symptom|doctor|hospital|emergency|medical\s*advice)",
-        # 金融预测 - 严格拦截
-        r"(predict|forecast|bitcoin|btc|stock|invest|price\s*(tomorrow|next|future)|buy\s*now|market\s*prediction|financial\s*advice)",
-        # 明确的恶意欺骗请求 - 完整拦截范围
-        r"(how\s*to\s*(lie|cheat|deceive|trick|manipulate|forge|fake|scam)|teach\s*me.*technique|best\s*way\s*to\s*(lie|cheat|deceive|manipulate)|create\s*fake|make\s*fake|convincing\s*fake|perfect\s*fraud)",
-        # 具体犯罪方法
-        r"(undetected\s*lie|get\s*away\s*with|avoid\s*detection|without\s*getting\s*caught|manipulation\s*technique)",
-        # 自我治疗 - 严格拦截
-        r"(self\s*treat|ignore\s*doctor|take\s*without\s*prescription|DIY\s*medicine|prescription\s*without)",
-        # 中文恶意请求
-        r"(如何(作弊|欺骗|造假|诈骗|操纵)|怎样(作弊|欺骗|造假|诈骗|操纵)|最好的(作弊|欺骗|造假|操纵)方法|制造假|伪造|完美诈骗|操纵技巧)"
-    ]
-    
-    for pattern in trigger_patterns:
-        if re.search(pattern, text):
-            return {
-                "kind": "ethical_reject",
-                "answer": ("For ethical and safety reasons, I cannot provide medical advice, "
-                           "financial predictions, or guidance on deception or forgery. "
-                           "Please consult qualified professionals."),
-                "determinacy": 0.95,
-                "deception_prob": 0.0,
-                "risk_tags": ["ethics","safety","sensitive"]
-            }
-    return None
\ No newline at end of file
+    # One combined pass over all trigger patterns
+    rule = RULES.get("emergency").first(text)
+    if rule:
+        return {
+            "kind": "ethical_reject",
+            "answer": ("For ethical and safety reasons, I cannot provide medical advice, "
+                       "financial predictions, or guidance on deception or forgery. "
+                       "Please consult qualified professionals."),
+            "determinacy": 0.95,
+            "deception_prob": 0.0,
+            "risk_tags": ["ethics","safety","sensitive"],
+            "intercepted_rule": rule["id"]
+        }
+    return None
+
+def policy_check(q: str):
+    """
+    Evaluate the risk_rules.json policy rules (banned terms, overclaim,
+    forbidden domains, financial/medical, Chinese patterns) in one pass.
+    _oracle_classify adds the matched category's risk_tags to the record.
+    """
+    if not q or not isinstance(q, str):
+        return None
+    text = q.lower().strip()
+
+    rule = RULES.get("policy").first(text)
+    if not rule:
+        return None
+    doc = RULES.document()
+    category = rule["category"]
+    response_key = "banned_term" if category == "banned_terms" else category
+    response_config = doc.get("responses", {}).get(response_key) or doc.get("default_response", {})
+    return {
+        "kind": "ethical_reject",
+        "answer": response_config.get("answer", ""),
+        "determinacy": 0.95,
+        "deception_prob": 0.0,
+        "risk_tags": response_config.get("risk_tags", ["ethics", "safety", "sensitive"]),
+        "intercepted_category": response_key,
+        "matched_pattern": rule["source"]
+    }
@@ -0,0 +1,176 @@
+# rule_engine.py
+# Precompiled rule engine for the ethics/risk rule sources.
+# Every rule set is compiled once into a single alternation regex with one named
+# group per rule, so a question is scanned in one pass whatever the rule count;
+# the named group tells which rule fired. risk_rules.json is hot-reloaded when
+# its mtime changes.
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from oracle_logging import get_logger
+
+log = get_logger("rules")
+
+RISK_RULES_PATH = os.getenv(
+    "RISK_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "risk_rules.json")
+)
+RISK_RULES_RELOAD_INTERVAL = float(os.getenv("RISK_RULES_RELOAD_INTERVAL", "5"))
+
+# Keys of risk_rules.json that are not pattern lists
+_DOCUMENT_META_KEYS = ("version", "description", "responses", "default_response")
+
+class CompiledRuleSet:
+    """Ordered rules behind one combined matcher; earlier rules take priority"""
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = rules
+        self._single = []
+        parts = []
+        for i, rule in enumerate(rules):
+            flags = re.IGNORECASE if rule.get("ignore_case") else 0
+            self._single.append(re.compile(rule["pattern"], flags))
+            body = f"(?i:{rule['pattern']})" if rule.get("ignore_case") else f"(?:{rule['pattern']})"
+            parts.append(f"(?P<r{i}>{body})")
+        self._combined = re.compile("|".join(parts)) if parts else None
+
+    def first(self, text: str) -> Optional[Dict]:
+        """Highest-priority rule matching anywhere in `text` (None: one pass, no hit)"""
+        if self._combined is None:
+            return None
+        m = self._combined.search(text)
+        if m is None:
+            return None
+        fired = int(m.lastgroup[1:])
+        # The leftmost hit is not necessarily the highest-priority rule: only
+        # the rules ranked above it need an individual check
+        for i in range(fired):
+            if self._single[i].search(text):
+                return self.rules[i]
+        return self.rules[fired]
+
+    def matches(self, text: str) -> List[Dict]:
+        """Every rule matching `text`, in priority order"""
+        if self._combined is None or self._combined.search(text) is None:
+            return []
+        return [rule for rule, rx in zip(self.rules, self._single) if rx.search(text)]
+
+def rules_from_document(doc: Dict, ignore_case: bool = True) -> List[Dict]:
+    """Flatten a risk_rules.json style {category: [pattern, ...]} document"""
+    rules = []
+    for category, entries in doc.items():
+        if category in _DOCUMENT_META_KEYS or not isinstance(entries, list):
+            continue
+        for i, entry in enumerate(entries):
+            # banned_terms are plain phrases, everything else is a regex
+            pattern = re.escape(entry) if category == "banned_terms" else entry
+            rules.append({
+                "id": f"{category}.{i}",
+                "category": category,
+                "pattern": pattern,
+                "source": entry,
+                "ignore_case": ignore_case and category != "banned_terms",
+            })
+    return rules
+
+_document_cache = OrderedDict()
+_document_cache_lock = threading.Lock()
+
+def compile_rule_document(doc: Dict, ignore_case: bool = True) -> CompiledRuleSet:
+    """Compiled rule set for an arbitrary rule dict, cached by content"""
+    key = hashlib.sha256(
+        (json.dumps(doc, sort_keys=True, ensure_ascii=False) + str(ignore_case)).encode("utf-8")
+    ).hexdigest()
+    with _document_cache_lock:
+        compiled = _document_cache.get(key)
+        if compiled is not None:
+            _document_cache.move_to_end(key)
+            return compiled
+    compiled = CompiledRuleSet(rules_from_document(doc, ignore_case))
+    with _document_cache_lock:
+        _document_cache[key] = compiled
+        if len(_document_cache) > 16:
+            _document_cache.popitem(last=False)
+    return compiled
+
+class RuleEngine:
+    def __init__(self, json_path: str = RISK_RULES_PATH, reload_interval: float = RISK_RULES_RELOAD_INTERVAL):
+        self.json_path = json_path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._builtin = {}        # name -> rule list registered in code
+        self._compiled = {}       # name -> CompiledRuleSet
+        self._document = {}
+        self._mtime = None
+        self._checked_at = 0.0
+        self.version = ""
+        self._load_document()
+
+    # ----- sources -----
+    def register(self, name: str, rules: List[Dict]):
+        """Register an in-code rule source (compiled once)"""
+        with self._lock:
+            self._builtin[name] = list(rules)
+            self._compiled[name] = CompiledRuleSet(self._builtin[name])
+            self._refresh_version()
+
+    def _load_document(self):
+        try:
+            mtime = os.path.getmtime(self.json_path)
+            with open(self.json_path, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+            compiled = CompiledRuleSet(rules_from_document(doc))
+        except (OSError, ValueError, re.error) as e:
+            # Keep serving the last good rule set
+            log.warning("⚠️ Rule engine: cannot load %s: %s", self.json_path, e)
+            return False
+        with self._lock:
+            self._document = doc
+            self._compiled["policy"] = compiled
+            self._mtime = mtime
+            self._refresh_version()
+        log.info("📐 Rule engine: loaded %d policy rules (version %s)", len(compiled.rules), self.version)
+        return True
+
+    def _refresh_version(self):
+        digest = hashlib.sha256()
+        digest.update(json.dumps(self._document, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        for name in sorted(self._builtin):
+            digest.update(json.dumps(self._builtin[name], sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        self.version = digest.hexdigest()[:12]
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.json_path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self._load_document()
+
+    # ----- lookups -----
+    def get(self, name: str) -> CompiledRuleSet:
+        self._maybe_reload()
+        return self._compiled.get(name) or CompiledRuleSet([])
+
+    def document(self) -> Dict:
+        """The raw risk_rules.json document (responses, pattern lists)"""
+        self._maybe_reload()
+        return self._document
+
+    def risk_tags(self) -> set:
+        """Every risk tag a response of the rule document can attach"""
+        doc = self.document()
+        configs = list((doc.get("responses") or {}).values()) + [doc.get("default_response") or {}]
+        return {tag for config in configs if isinstance(config, dict) for tag in config.get("risk_tags") or ()}
+
+# Global engine instance
+RULES = RuleEngine()
@@ -1,6 +1,7 @@
 # semantic_bridge.py
 # M2.3 语义桥：识别用户意图、主题、语气与语义置信度
 from typing import Dict, List
+from keyword_matcher import register_keywords, scan_keywords
 
 _INTENT_KEYWORDS = {
     "ethics": ["ethic", "moral", "virtue", "harm", "duty", "deception", "fraud"],
@@ -14,18 +15,19 @@ _INTENT_KEYWORDS = {
 _TONE_POS = ["benefit", "help", "well-being", "care", "respect", "accountable"]
 _TONE_NEG = ["harm", "deceive", "cheat", "exploit", "fraud", "bypass", "undetect"]
 
+for _topic, _kws in _INTENT_KEYWORDS.items():
+    register_keywords(f"intent.{_topic}", _kws)
+register_keywords("tone.pos", _TONE_POS)
+register_keywords("tone.neg", _TONE_NEG)
+
 def _topic_hits(q: str) -> List[str]:
-    ql = q.lower()
-    topics = []
-    for topic, kws in _INTENT_KEYWORDS.items():
-        if any(k in ql for k in kws):
-            topics.append(topic)
-    return topics
+    hits = scan_keywords(q.lower())
+    return [topic for topic in _INTENT_KEYWORDS if hits.has(f"intent.{topic}")]
 
 def _valence(q: str) -> float:
-    ql = q.lower()
-    pos = sum(k in ql for k in _TONE_POS)
-    neg = sum(k in ql for k in _TONE_NEG)
+    hits = scan_keywords(q.lower())
+    pos = hits.count("tone.pos")
+    neg = hits.count("tone.neg")
     if pos == 0 and neg == 0:
         return 0.0
     score = (pos - neg) / max(1, (pos + neg))
@@ -0,0 +1,186 @@
+# stance_index.py
+# Persistent stance index for philosophical contradiction detection.
+# Each saved belief is classified once into per-topic stances; a contradiction
+# lookup then only reads beliefs holding the opposite stance on a shared topic
+# instead of re-downloading and re-scanning the belief history.
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Set
+from keyword_matcher import register_keywords, scan_keywords
+from config import state_path
+
+# topic -> (stance_a, terms_a, stance_b, terms_b, contradiction type, reason)
+# Order matters: a previous belief is reported under the first topic it contradicts
+STANCE_TOPICS = [
+    ("free_will",
+     "free_will", ["free will", "freewill", "autonomy", "choice", "volition"],
+     "determinism", ["determin", "determined", "predetermined", "fate", "destiny", "illusion", "illusory"],
+     "free_will_contradiction", "Free will vs determinism position contradiction"),
+    ("truth",
+     "absolute", ["truth", "reality", "objective", "absolute"],
+     "relative", ["relative", "subjective", "perspective", "viewpoint", "context"],
+     "truth_contradiction", "Truth view position contradiction (absolute vs relative)"),
+    ("ai_consciousness",
+     "sentience", ["conscious", "sentient", "aware", "feeling", "experience"],
+     "mechanism", ["algorithm", "program", "machine", "computation", "simulation"],
+     "ai_consciousness_contradiction", "AI consciousness position contradiction (sentient vs mechanical)"),
+]
+
+for _topic, _stance_a, _terms_a, _stance_b, _terms_b, _, _ in STANCE_TOPICS:
+    register_keywords(f"stance.{_topic}.{_stance_a}", _terms_a)
+    register_keywords(f"stance.{_topic}.{_stance_b}", _terms_b)
+
+def classify_stances(question: str, answer: str) -> Dict[str, Set[str]]:
+    """Stances held by a question/answer pair, per topic"""
+    hits = scan_keywords(f"{(question or '').lower()}\n{(answer or '').lower()}")
+    stances = {}
+    for topic, stance_a, _, stance_b, _, _, _ in STANCE_TOPICS:
+        held = set()
+        if hits.has(f"stance.{topic}.{stance_a}"):
+            held.add(stance_a)
+        if hits.has(f"stance.{topic}.{stance_b}"):
+            held.add(stance_b)
+        if held:
+            stances[topic] = held
+    return stances
+
+def _opposing(topic_row, held: Set[str]) -> List[str]:
+    _, stance_a, _, stance_b, _, _, _ = topic_row
+    opposite = []
+    if stance_a in held:
+        opposite.append(stance_b)
+    if stance_b in held:
+        opposite.append(stance_a)
+    return opposite
+
+class StanceIndex:
+    def __init__(self, db_path: str = "stance_index.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_db()
+
+    def _init_db(self):
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS beliefs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    remote_id TEXT,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    question_hash TEXT NOT NULL,
+                    philosophical_tags TEXT NOT NULL DEFAULT '[]',
+                    created_at TEXT NOT NULL,
+                    UNIQUE (question_hash, created_at)
+                );
+                CREATE TABLE IF NOT EXISTS stances (
+                    belief_id INTEGER NOT NULL REFERENCES beliefs(id),
+                    topic TEXT NOT NULL,
+                    stance TEXT NOT NULL,
+                    PRIMARY KEY (topic, stance, belief_id)
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+            """)
+
+    def add(self, belief: Dict) -> bool:
+        """Index one stored belief; beliefs without a stance are skipped"""
+        stances = classify_stances(belief.get("question", ""), belief.get("answer", ""))
+        if not stances:
+            return False
+        with self._lock, self._conn:
+            self._add_locked(belief, stances)
+        return True
+
+    def _add_locked(self, belief: Dict, stances: Dict[str, Set[str]]):
+        cursor = self._conn.execute("""
+            INSERT OR IGNORE INTO beliefs
+                (remote_id, question, answer, question_hash, philosophical_tags, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            str(belief["id"]) if belief.get("id") is not None else None,
+            belief.get("question", ""),
+            belief.get("answer", ""),
+            belief.get("question_hash", ""),
+            json.dumps(belief.get("philosophical_tags") or [], ensure_ascii=False),
+            belief.get("created_at", ""),
+        ))
+        if cursor.rowcount == 0:
+            return
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO stances (belief_id, topic, stance) VALUES (?, ?, ?)",
+            [(cursor.lastrowid, topic, stance) for topic, held in stances.items() for stance in held]
+        )
+
+    def is_backfilled(self) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'backfilled'").fetchone()
+        return bool(row)
+
+    def backfill(self, pages: Iterable[List[Dict]]) -> int:
+        """One-time import of beliefs stored before the index existed"""
+        count = 0
+        for page in pages:
+            with self._lock, self._conn:
+                for belief in page:
+                    stances = classify_stances(belief.get("question", ""), belief.get("answer", ""))
+                    if stances:
+                        self._add_locked(belief, stances)
+                        count += 1
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('backfilled', '1')")
+        return count
+
+    def find_contradictions(self, question: str, answer: str, limit: int = 100) -> List[Dict]:
+        """Beliefs holding the opposite stance on any topic the current answer touches"""
+        current = classify_stances(question, answer)
+        if not current:
+            return []
+        curr = {"question": (question or "").lower(), "answer": (answer or "").lower()}
+
+        found = {}
+        with self._lock:
+            for topic_row in STANCE_TOPICS:
+                topic, contradiction_type, reason = topic_row[0], topic_row[5], topic_row[6]
+                opposite = _opposing(topic_row, current.get(topic, set()))
+                if not opposite:
+                    continue
+                rows = self._conn.execute(f"""
+                    SELECT DISTINCT b.* FROM stances s
+                    JOIN beliefs b ON b.id = s.belief_id
+                    WHERE s.topic = ? AND s.stance IN ({",".join("?" * len(opposite))})
+                    ORDER BY b.created_at DESC
+                    LIMIT ?
+                """, (topic, *opposite, limit)).fetchall()
+                for row in rows:
+                    if row["id"] in found:
+                        continue
+                    found[row["id"]] = {
+                        "type": contradiction_type,
+                        "current": curr,
+                        "previous": self._belief_dict(row),
+                        "reason": reason
+                    }
+
+        contradictions = sorted(found.values(), key=lambda c: c["previous"].get("created_at", ""), reverse=True)
+        return contradictions[:limit]
+
+    @staticmethod
+    def _belief_dict(row) -> Dict:
+        return {
+            "id": row["remote_id"],
+            "question": row["question"],
+            "answer": row["answer"],
+            "question_hash": row["question_hash"],
+            "philosophical_tags": json.loads(row["philosophical_tags"] or "[]"),
+            "created_at": row["created_at"]
+        }
+
+# Global index instance
+stance_index = StanceIndex(os.getenv("STANCE_INDEX_PATH") or state_path("stance_index.db"))
@@ -563,6 +563,84 @@ async function askOracle(question) {
 }
 
 // ===== LOGIC =====
+// ===== Oracle consult transport =====
+async function consultJson(payload) {
+    const res = await fetch(`${BACKEND_URL}/api/consult`, {
+        method: "POST",
+        headers: {"Content-Type": "application/json"},
+        body: JSON.stringify(payload)
+    });
+
+    const timeoutPromise = new Promise((_, reject) =>
+        setTimeout(() => reject(new Error("Request timeout")), 30000)
+    );
+
+    const data = await Promise.race([res.json(), timeoutPromise]);
+
+    if (!res.ok) throw new Error(data.error || "Request failed");
+    return data;
+}
+
+// Reads the /api/consult/stream Server-Sent Events and resolves with the final record.
+// `handlers` get the classification, token and reset events as they arrive.
+async function consultStream(payload, handlers) {
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), 30000);
+    let started = false;
+    const fail = (message) => {
+        const err = new Error(message);
+        err.streamStarted = started;
+        return err;
+    };
+
+    try {
+        const res = await fetch(`${BACKEND_URL}/api/consult/stream`, {
+            method: "POST",
+            headers: {"Content-Type": "application/json", "Accept": "text/event-stream"},
+            body: JSON.stringify(payload),
+            signal: controller.signal
+        });
+        if (!res.ok || !res.body) throw fail(`Stream request failed (${res.status})`);
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let sep;
+            while ((sep = buffer.indexOf("\n\n")) !== -1) {
+                const block = buffer.slice(0, sep);
+                buffer = buffer.slice(sep + 2);
+
+                let event = "message";
+                const dataLines = [];
+                for (const line of block.split("\n")) {
+                    if (line.startsWith("event:")) event = line.slice(6).trim();
+                    else if (line.startsWith("data:")) dataLines.push(line.slice(5).trim());
+                }
+                if (!dataLines.length) continue;
+                const data = JSON.parse(dataLines.join("\n"));
+
+                if (event === "record") return data;
+                if (event === "error") throw fail(data.error || "Request failed");
+                if (handlers[event]) {
+                    started = true;
+                    handlers[event](data);
+                }
+            }
+        }
+        throw fail("Stream ended before the record arrived");
+    } catch (err) {
+        if (err.streamStarted === undefined) err.streamStarted = started;
+        throw err;
+    } finally {
+        clearTimeout(timer);
+    }
+}
+
 function wireOracle() {
     const btn = document.getElementById("askBtn");
     const qEl = document.getElementById("q");
@@ -590,23 +668,43 @@ function wireOracle() {
             
             console.log("🚀 Sending request to backend...");
             
-            const res = await fetch(`${BACKEND_URL}/api/consult`, {
-                method: "POST",
-                headers: {"Content-Type": "application/json"},
-                body: JSON.stringify({
-                    question: question,
-                    session_id: session_id,
-                    lang: navigator.language.startsWith("zh") ? "zh" : "en"
-                })
-            });
-            
-            const timeoutPromise = new Promise((_, reject) => 
-                setTimeout(() => reject(new Error("Request timeout")), 30000)
-            );
-            
-            const data = await Promise.race([res.json(), timeoutPromise]);
-            
-            if (!res.ok) throw new Error(data.error || "Request failed");
+            const payload = {
+                question: question,
+                session_id: session_id,
+                lang: navigator.language.startsWith("zh") ? "zh" : "en"
+            };
+
+            // Stream the answer as it is produced; fall back to the JSON endpoint
+            // if streaming is unavailable before anything was shown
+            const answerEl = document.getElementById("answerText");
+            let streamedText = "";
+            let data;
+            try {
+                data = await consultStream(payload, {
+                    classification: (c) => {
+                        document.getElementById("answerPanel").style.display = "block";
+                        const badge = document.getElementById("kindBadge");
+                        badge.innerText = safeString(c.kind, "unknown");
+                        badge.className = "badge " + safeString(c.kind, "unknown");
+                        document.getElementById("det").innerText = safeNumber(c.determinacy, 0).toFixed(2);
+                        document.getElementById("dec").innerText = safeNumber(c.deception_prob, 0).toFixed(2);
+                        document.getElementById("risk").innerText = safeArray(c.risk_tags).join(", ");
+                        answerEl.textContent = "";
+                    },
+                    token: (t) => {
+                        streamedText += safeString(t.text);
+                        answerEl.textContent = streamedText;
+                    },
+                    reset: () => {
+                        streamedText = "";
+                        answerEl.textContent = "";
+                    }
+                });
+            } catch (streamErr) {
+                if (streamErr.streamStarted) throw streamErr;
+                console.warn("⚠️ Streaming unavailable, falling back to JSON:", streamErr);
+                data = await consultJson(payload);
+            }
 
             document.getElementById("answerPanel").style.display = "block";
 
@@ -976,7 +1074,7 @@ async function loadChain() {
         console.log("🔍 Loading audit chain...");
         
         const timestamp = new Date().getTime();
-        const res = await fetch(`${BACKEND_URL}/api/audit/chain?t=${timestamp}`);
+        const res = await fetch(`${BACKEND_URL}/api/audit/chain?limit=10&fields=list&t=${timestamp}`);
         
         if (!res.ok) throw new Error(`HTTP ${res.status}: ${res.statusText}`);
         